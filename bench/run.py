@@ -0,0 +1,607 @@
+#run.py
+#бенчмарки без обращения к hh.ru: все запросы идут в локальный стенд (bench/server.py).
+#- crawl:  crawl_and_store (потоков --sync-workers) против crawl_and_store_async на разных concurrency (вакансий/сек, запросов/сек)
+#- connector: async-обход с разными настройками пула соединений и транспортом httpx (вакансий/сек, число соединений)
+#- parse:  parse_list_page / parse_vacancy_detail для каждого движка (страниц/сек, МБ/сек) + сверка результатов с bs4
+#- normalize: разбор текста з/п и даты публикации - прежняя реализация против новой (строк/сек) + сверка с bench/normalize_cases.json
+#- startup: холодный старт CLI и импорт зависимостей каждого режима (python -X importtime, мс)
+#- memory: сколько памяти занимают --memory-records пар VacancyBrief/VacancyDetail - прежние записи против компактных
+#  (пиковый RSS отдельного процесса и tracemalloc, МБ на 10 тыс. вакансий)
+#- split: широкий запрос (--split-total вакансий при выдаче до --max-results): сколько вакансий доходит до обхода
+#  без планировщика и с --split в разном порядке фасетов, и сколько запросов списка это стоит (детальные страницы не качаются)
+#- upsert: upsert_vacancy (по строке) и upsert_vacancies (пачкой) на SQLite, вставка и повторная запись (строк/сек)
+#Результат пишется в JSON, чтобы сравнивать коммиты:
+#  python -m bench.run --out before.json
+#  python -m bench.run --out after.json --compare before.json
+from __future__ import annotations
+import argparse
+import asyncio
+import contextlib
+import dataclasses
+import io
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+from .server import StandInServer, add_stand_args, stand_config, list_html, detail_html, _salary, _published
+
+#ключевые метрики для --compare: (секция, поле, больше - лучше)
+_COMPARE_FIELDS = {
+    "crawl": ("vacancies_per_sec", True),
+    "connector": ("vacancies_per_sec", True),
+    "parse": ("pages_per_sec", True),
+    "normalize": ("strings_per_sec", True),
+    "startup": ("wall_ms", False),
+    "memory": ("peak_rss_mb_per_10k", False),
+    "split": ("requests_per_1k", False),
+    "upsert": ("rows_per_sec", True),
+}
+
+def _git_commit()->str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#вывод самих функций обхода (итоги, лимитер) в бенчмарке не нужен
+@contextlib.contextmanager
+def _quiet(verbose: bool):
+    if verbose:
+        yield
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+
+def _count_vacancies(db_path: str)->int:
+    import sqlite3
+    with contextlib.closing(sqlite3.connect(db_path)) as conn:
+        return conn.execute("select count(*) from vacancies").fetchone()[0]
+
+#----------------------------------------crawl----------------------------------------
+def _check_search_url(server: StandInServer):
+    from hh_parser import pipeline, async_pipeline
+    #SEARCH_URL читается из окружения при импорте config - проверяем, что обход пойдет в стенд, а не на hh.ru
+    if pipeline.SEARCH_URL != server.search_url or async_pipeline.SEARCH_URL != server.search_url:
+        raise RuntimeError(f"SEARCH_URL указывает не на стенд: {pipeline.SEARCH_URL}")
+
+#один обход в пустую БД; возвращает строку результата без имени
+def _crawl_once(server: StandInServer, args, mode: str, concurrency: int, **extra)->dict:
+    from hh_parser import pipeline, async_pipeline
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "bench.sqlite3")
+        kw = dict(db_url=f"sqlite:///{db}", text="python", pages=args.pages, per_page=args.per_page,
+                  cache_ttl=0, cache_name=os.path.join(tmp, "http_cache"), rate=args.rate, parser_backend=args.parser)
+        requests_before, connections_before = server.requests, server.connections
+        t0 = time.perf_counter()
+        with _quiet(args.verbose):
+            if mode == "sync": #у sync-обхода concurrency - число потоков (--workers)
+                pipeline.crawl_and_store(workers=concurrency, **kw)
+            else:
+                asyncio.run(async_pipeline.crawl_and_store_async(concurrency=concurrency, **kw, **extra))
+        wall = time.perf_counter() - t0
+        stored = _count_vacancies(db)
+    reqs = server.requests - requests_before
+    return {"mode": mode, "concurrency": concurrency, "wall_sec": round(wall, 3), "vacancies": stored, "requests": reqs,
+            "connections": server.connections - connections_before,
+            "vacancies_per_sec": round(stored / wall, 2), "requests_per_sec": round(reqs / wall, 2)}
+
+def bench_crawl(server: StandInServer, args)->List[dict]:
+    _check_search_url(server)
+    modes = [("sync", int(w)) for w in args.sync_workers.split(",")] + [("async", int(c)) for c in args.concurrency.split(",")]
+    out = []
+    for mode, concurrency in modes:
+        row = {"name": f"{mode}-c{concurrency}", **_crawl_once(server, args, mode, concurrency)}
+        out.append(row)
+        print(f"crawl  {row['name']:<10} {row['wall_sec']:7.2f} сек  {row['vacancies_per_sec']:8.1f} вак/сек  {row['requests_per_sec']:8.1f} запр/сек")
+    return out
+
+#----------------------------------------connector----------------------------------------
+#async-обход с разными настройками пула соединений на одном concurrency: скорость и сколько соединений открыто.
+#Стенд отвечает по http:// без TLS, поэтому рукопожатия здесь дешевые, а httpx идет по HTTP/1.1 (HTTP/2 без TLS
+#не согласуется) - на hh.ru разница в числе соединений стоит заметно дороже, чем на стенде
+def bench_connector(server: StandInServer, args)->List[dict]:
+    from hh_parser.async_http import HttpOptions
+    _check_search_url(server)
+    variants = [
+        ("aiohttp-defaults", HttpOptions(limit=100, limit_per_host=0, keepalive=15, dns_ttl=10)), #как было до настроек
+        ("tuned", HttpOptions()),
+        (f"per-host-{args.limit_per_host}", HttpOptions(limit_per_host=args.limit_per_host)),
+        ("no-keepalive", HttpOptions(keepalive=0)),
+        ("httpx", HttpOptions(http2=True)),
+    ]
+    out = []
+    for name, opts in variants:
+        try:
+            row = {"name": name, "options": dataclasses.asdict(opts),
+                   **_crawl_once(server, args, "async", args.conn_concurrency, http_options=opts)}
+        except RuntimeError as e: #нет httpx
+            print(f"conn   {name:<16} пропущен: {e}")
+            continue
+        row["requests_per_connection"] = round(row["requests"] / row["connections"], 1) if row["connections"] else None
+        out.append(row)
+        print(f"conn   {name:<16} {row['wall_sec']:7.2f} сек  {row['vacancies_per_sec']:8.1f} вак/сек  "
+              f"соединений {row['connections']:5}  ({row['requests_per_connection']} запр/соед)")
+    return out
+
+#----------------------------------------parse----------------------------------------
+#страницы для разбора: записанные (--fixtures) или сгенерированные стендом
+def _sample_pages(server: StandInServer, per_page: int, n_list: int, n_detail: int)->tuple[list[str], list[tuple[str, str]]]:
+    if server.fixtures:
+        lists = list(server.fixtures.lists)
+        details = [(html, f"https://hh.ru/vacancy/{100000 + i}") for i, html in enumerate(server.fixtures.details)]
+        return lists, details
+    lists = [list_html("https://hh.ru", p, per_page, server.cfg) for p in range(n_list)]
+    details = [(detail_html(i, server.cfg), f"https://hh.ru/vacancy/{100000 + i}") for i in range(n_detail)]
+    return lists, details
+
+#сравнение с эталоном bs4 без даты публикации "сегодня" (она берется из текущего времени)
+def _comparable(obj)->tuple:
+    d = dataclasses.asdict(obj)
+    if "published_at" in d:
+        d["published_at"] = d["published_at"].date()
+    return tuple(sorted(d.items(), key=lambda kv: kv[0]))
+
+def _timed(fn, items, min_time: float)->tuple[int, float]:
+    n, t0 = 0, time.perf_counter()
+    while True:
+        for it in items:
+            fn(it)
+        n += len(items)
+        wall = time.perf_counter() - t0
+        if wall >= min_time:
+            return n, wall
+
+def bench_parse(server: StandInServer, args)->List[dict]:
+    from hh_parser.parsing import PARSER_BACKENDS, parse_list_page, parse_vacancy_detail
+    lists, details = _sample_pages(server, args.per_page, 5, 50)
+    briefs = [br for html in lists for br in parse_list_page(html)]
+    brief_for = lambda i: briefs[i % len(briefs)]
+    detail_items = [(html, url, brief_for(i)) for i, (html, url) in enumerate(details)]
+    list_mb = sum(len(h.encode("utf-8")) for h in lists) / 2**20
+    detail_mb = sum(len(h.encode("utf-8")) for h, _, _ in detail_items) / 2**20
+
+    ref_lists = [[_comparable(b) for b in parse_list_page(h, "bs4")] for h in lists]
+    ref_details = [_comparable(parse_vacancy_detail(h, u, b, "bs4")) for h, u, b in detail_items]
+
+    out = []
+    for backend in PARSER_BACKENDS:
+        try:
+            got_lists = [[_comparable(b) for b in parse_list_page(h, backend)] for h in lists]
+            got_details = [_comparable(parse_vacancy_detail(h, u, b, backend)) for h, u, b in detail_items]
+        except ImportError as e: #движок без установленной зависимости (например, lxml)
+            print(f"parse  {backend:<7} пропущен: {e}")
+            continue
+        parity = got_lists == ref_lists and got_details == ref_details
+        for kind, fn, items, mb in (
+            ("list", lambda h: parse_list_page(h, backend), lists, list_mb),
+            ("detail", lambda it: parse_vacancy_detail(*it, backend), detail_items, detail_mb),
+        ):
+            n, wall = _timed(fn, items, args.min_time)
+            row = {"name": f"{backend}-{kind}", "backend": backend, "page": kind, "pages": n, "wall_sec": round(wall, 3),
+                   "pages_per_sec": round(n / wall, 1), "mb_per_sec": round(mb * n / len(items) / wall, 2),
+                   "parity_with_bs4": parity}
+            out.append(row)
+            print(f"parse  {row['name']:<14} {row['pages_per_sec']:8.1f} стр/сек  {row['mb_per_sec']:7.2f} МБ/сек"
+                  f"  {'совпадает с bs4' if parity else 'РАСХОЖДЕНИЕ с bs4'}")
+    return out
+
+#----------------------------------------normalize----------------------------------------
+CASES_PATH = Path(__file__).resolve().parent / "normalize_cases.json"
+
+#прежние parse_salary и parse_published_at (до кэширования и таблиц валют) - эталон для сверки и замера
+_LEGACY_SALARY_RE = re.compile(r"(\d[\d\s\u00A0]*)", re.UNICODE)
+
+def _legacy_parse_salary(s):
+    if not s: return None, None, None
+    cur = "RUR" if "руб" in s else None
+    nums = [int(re.sub(r"\D+", "", m)) for m in _LEGACY_SALARY_RE.findall(s)]
+    if "от" in s and nums:
+        return nums[0], None, cur
+    if "до" in s and nums:
+        return None, nums[0], cur
+    if len(nums) >= 2:
+        return nums[0], nums[1], cur
+    return nums[0], nums[0], cur if nums else (None, None, cur)
+
+def _legacy_parse_published_at(s):
+    if not s: return datetime.now(timezone.utc)
+    lower = s.lower()
+    now = datetime.now(timezone.utc)
+    if "сегодня" in lower: return now
+    if "вчера" in lower: return now - timedelta(days=1)
+    m = re.search(r"(\d{1,2})\s+([а-яё]+)\s+(\d{4})?", lower)
+    months = {"января":1, "февраля":2, "марта":3, "апреля":4, "мая":5, "июня":6, "июля":7, "августа":8, "сентября":9, "октября":10, "ноября":11, "декабря":12}
+    if m:
+        day, mon = int(m.group(1)), months.get(m.group(2))
+        year = int(m.group(3)) if m.group(3) else now.year
+        if mon: return datetime(year, mon, day, tzinfo=timezone.utc)
+    return now
+
+#ожидаемая дата из фикстуры: today/yesterday/now, YYYY-MM-DD или --MM-DD (текущий год)
+def _date_matches(got: datetime, expect: str)->bool:
+    now = datetime.now(timezone.utc)
+    if expect in ("today", "now"):
+        return abs((now - got).total_seconds()) < 60
+    if expect == "yesterday":
+        return abs((now - timedelta(days=1) - got).total_seconds()) < 60
+    if expect.startswith("--"):
+        expect = f"{now.year}{expect[1:]}"
+    return got.date().isoformat() == expect
+
+#сверка с фикстурами: новая реализация должна давать ожидаемое на всех строках, прежняя - на всех, кроме исправленных
+def _normalize_parity()->dict:
+    from hh_parser.parsing import normalize_salary, parse_published_at
+    cases = json.loads(CASES_PATH.read_text(encoding="utf-8"))
+    checks = {
+        "salary": (lambda t: list(normalize_salary(t)) if t else [None] * 4,
+                   lambda t: list(_legacy_parse_salary(t)), lambda got, exp, n: got[:n] == exp[:n]),
+        "published": (parse_published_at, _legacy_parse_published_at, lambda got, exp, n: _date_matches(got, exp)),
+    }
+    out = {}
+    for kind, (new, old, same) in checks.items():
+        bad, legacy_bad, fixed = [], [], 0
+        for case in cases[kind]:
+            text, exp = case["text"], case["expect"]
+            if not same(new(text), exp, 4):
+                bad.append(text)
+            fixed += "fixed" in case
+            try:
+                legacy_ok = same(old(text), exp, 3) #у прежнего parse_salary не было gross/net
+            except (IndexError, ValueError):
+                legacy_ok = False
+            if not legacy_ok and "fixed" not in case:
+                legacy_bad.append(text)
+        out[kind] = {"cases": len(cases[kind]), "mismatches": bad, "legacy_mismatches": legacy_bad, "fixed": fixed}
+        legacy = f"РАСХОЖДЕНИЕ {legacy_bad}" if legacy_bad else f"совпадает, кроме исправленных ({fixed})"
+        print(f"normalize {kind:<9} фикстур {len(cases[kind])}: {'совпадает' if not bad else f'РАСХОЖДЕНИЕ {bad}'}, "
+              f"прежняя реализация: {legacy}")
+    return out
+
+def bench_normalize(server: StandInServer, args)->List[dict]:
+    from hh_parser.parsing import normalize_salary, parse_salary, parse_published_at, _date_parts
+    parity = _normalize_parity()
+    #строки как в потоке вакансий: много повторов при нескольких тысячах различных значений
+    salaries = [t for t in (_salary(i) for i in range(args.rows * 10)) if t]
+    dates = [_published(i) for i in range(args.rows * 10)]
+    variants = (
+        ("salary-legacy", _legacy_parse_salary, salaries, "salary"),
+        ("salary-uncached", normalize_salary.__wrapped__, salaries, "salary"),
+        ("salary-cached", parse_salary, salaries, "salary"),
+        ("date-legacy", _legacy_parse_published_at, dates, "published"),
+        ("date-cached", parse_published_at, dates, "published"),
+    )
+    out = []
+    for name, fn, items, kind in variants:
+        n, wall = _timed(fn, items, args.min_time)
+        row = {"name": name, "strings": n, "distinct": len(set(items)), "wall_sec": round(wall, 3),
+               "strings_per_sec": round(n / wall, 1), "parity": not parity[kind]["mismatches"]}
+        out.append(row)
+        print(f"normalize {name:<16} {row['strings_per_sec']:11.1f} строк/сек  (различных {row['distinct']})")
+    for name, fn in (("salary", normalize_salary), ("date", _date_parts)):
+        info = fn.cache_info()
+        print(f"normalize {name:<16} кэш: попаданий {info.hits}, промахов {info.misses}")
+    return out
+
+#----------------------------------------startup----------------------------------------
+#что запускается в новом интерпретаторе: CLI без работы (--help) и импорт всего, что нужно каждому режиму
+STARTUP_CASES = (
+    ("python", ["-c", "pass"]), #сам интерпретатор - нижняя граница
+    ("main-help", ["-m", "hh_parser.main", "--help"]),
+    ("sync-imports", ["-c", "import hh_parser.main, hh_parser.pipeline"]),
+    ("async-imports", ["-c", "import hh_parser.main, hh_parser.async_pipeline"]),
+)
+
+#разбор вывода -X importtime: "import time: self [us] | cumulative | имя модуля" (вложенность - отступом)
+def _importtime(stderr: str)->tuple[float, list]:
+    top = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name[1:].startswith(" "): #модуль верхнего уровня (импортирован не другим модулем)
+            top.append((name.strip(), int(cumulative) / 1000))
+    return sum(ms for _, ms in top), top
+
+def bench_startup(server: StandInServer, args)->List[dict]:
+    root = str(Path(__file__).resolve().parent.parent)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    out = []
+    for name, argv in STARTUP_CASES:
+        walls, imports = [], []
+        for _ in range(args.startup_runs): #лучший из нескольких запусков: отсекаем шум диска и планировщика
+            t0 = time.perf_counter()
+            proc = subprocess.run([sys.executable, "-X", "importtime", *argv], capture_output=True, text=True, env=env, cwd=root)
+            walls.append((time.perf_counter() - t0) * 1000)
+            if proc.returncode != 0:
+                raise RuntimeError(f"{name}: {proc.stderr[-500:]}")
+            imports.append(_importtime(proc.stderr))
+        import_ms, top = min(imports, key=lambda it: it[0])
+        heaviest = sorted(top, key=lambda it: -it[1])[:5]
+        row = {"name": name, "runs": args.startup_runs, "wall_ms": round(min(walls), 1), "import_ms": round(import_ms, 1),
+               "heaviest": [[n, round(ms, 1)] for n, ms in heaviest]}
+        out.append(row)
+        print(f"startup {name:<14} {row['wall_ms']:8.1f} мс  импорт {row['import_ms']:7.1f} мс  "
+              + ", ".join(f"{n} {ms:.0f}" for n, ms in heaviest[:3]))
+    return out
+
+#----------------------------------------memory----------------------------------------
+#прежние записи (обычный dataclass с __dict__, навыки - список, строки не интернируются) - эталон для сравнения
+@dataclasses.dataclass
+class _LegacyBrief:
+    vacancy_id: int
+    name: str
+    url: str
+    employer_name: str | None
+    area_name: str | None
+    published_at_text: str | None
+    employer_id: str | None = None
+    area_id: int | None = None
+
+@dataclasses.dataclass
+class _LegacyDetail:
+    vacancy_id: int
+    name: str
+    url: str
+    employer_name: str | None
+    area_name: str | None
+    published_at: datetime
+    salary_from: int | None
+    salary_to: int | None
+    salary_currency: str | None
+    schedule: str | None
+    employment: str | None
+    experience: str | None
+    skills: list
+    list_fingerprint: str | None = None
+    employer_id: str | None = None
+    area_id: int | None = None
+    salary_gross: bool | None = None
+    detail_hash: str | None = None
+
+#новая копия строки: у полей, разобранных из разных страниц, разные объекты строк - как на выходе парсера
+def _fresh(v):
+    if isinstance(v, str):
+        return v.encode("utf-8").decode("utf-8")
+    if isinstance(v, list):
+        return [_fresh(x) for x in v]
+    if isinstance(v, dict):
+        return {k: _fresh(x) for k, x in v.items()}
+    return v
+
+#текущий RSS процесса, КБ (Linux: /proc/self/statm; иначе - пиковый, он не меньше текущего)
+def _rss_kb()->int:
+    import resource
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+#выполняется в отдельном процессе (python -c), чтобы пиковый RSS относился только к одному варианту.
+#Печатает JSON: прирост пикового RSS и объем по tracemalloc для n пар (карточка, вакансия)
+def _memory_probe(kind: str, n: int, sample_path: str):
+    import gc
+    import tracemalloc
+    from hh_parser.schemas import VacancyBrief, VacancyDetail
+    brief_cls, detail_cls = (_LegacyBrief, _LegacyDetail) if kind == "legacy" else (VacancyBrief, VacancyDetail)
+    sample = json.loads(Path(sample_path).read_text(encoding="utf-8"))
+    for _, d in sample:
+        d["published_at"] = datetime.fromisoformat(d["published_at"])
+
+    def build()->list:
+        out = []
+        for i in range(n):
+            b, d = sample[i % len(sample)]
+            url = f"https://hh.ru/vacancy/{100000 + i}"
+            out.append((brief_cls(**dict(_fresh(b), vacancy_id=i, url=url)), detail_cls(**dict(_fresh(d), vacancy_id=i, url=url))))
+        return out
+
+    gc.collect()
+    rss0 = _rss_kb() #освобожденная при импорте память может переиспользоваться, поэтому от текущего, а не от пикового
+    records = build()
+    rss1 = _rss_kb() #записи только добавляются, так что после построения RSS и есть пиковый для этого варианта
+    del records
+    gc.collect()
+    tracemalloc.start()
+    records = build()
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(json.dumps({"rss_kb": rss1 - rss0, "traced_bytes": traced}))
+
+def bench_memory(server: StandInServer, args)->List[dict]:
+    from hh_parser.parsing import parse_list_page, parse_vacancy_detail
+    lists, details = _sample_pages(server, args.per_page, 5, 50)
+    briefs = [br for html in lists for br in parse_list_page(html)]
+    sample = []
+    for i, (html, url) in enumerate(details):
+        br = briefs[i % len(briefs)]
+        d = dataclasses.asdict(parse_vacancy_detail(html, url, br))
+        d["published_at"] = d["published_at"].isoformat()
+        d["skills"] = list(d["skills"])
+        sample.append((dataclasses.asdict(br), d))
+    root = str(Path(__file__).resolve().parent.parent)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    per_10k = 10_000 / args.memory_records
+    out = []
+    with tempfile.TemporaryDirectory() as tmp:
+        sample_path = os.path.join(tmp, "sample.json")
+        Path(sample_path).write_text(json.dumps(sample, ensure_ascii=False), encoding="utf-8")
+        for kind in ("legacy", "compact"):
+            code = f"from bench.run import _memory_probe; _memory_probe({kind!r}, {args.memory_records}, {sample_path!r})"
+            proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=root)
+            if proc.returncode != 0:
+                raise RuntimeError(f"memory {kind}: {proc.stderr[-500:]}")
+            res = json.loads(proc.stdout.strip().splitlines()[-1])
+            row = {"name": kind, "records": args.memory_records,
+                   "peak_rss_mb_per_10k": round(res["rss_kb"] / 1024 * per_10k, 1),
+                   "traced_mb_per_10k": round(res["traced_bytes"] / 2**20 * per_10k, 1),
+                   "bytes_per_vacancy": round(res["traced_bytes"] / args.memory_records)}
+            out.append(row)
+            print(f"memory {kind:<8} пиковый RSS {row['peak_rss_mb_per_10k']:7.1f} МБ / 10 тыс. вакансий, "
+                  f"tracemalloc {row['traced_mb_per_10k']:7.1f} МБ ({row['bytes_per_vacancy']} байт на вакансию)")
+    return out
+
+#----------------------------------------split----------------------------------------
+def bench_split(server: StandInServer, args)->List[dict]:
+    from concurrent.futures import ThreadPoolExecutor
+    from hh_parser.http import get_http_session, http_get
+    from hh_parser.jobs import SearchJob
+    from hh_parser.parsing import parse_found_count, parse_list_page
+    from hh_parser.planner import QueryPlanner, parse_facets
+    from hh_parser.ratelimit import AdaptiveRateLimiter
+
+    limiter = AdaptiveRateLimiter(args.rate)
+    total_before = server.cfg.total
+    server.cfg.total = args.split_total
+    root = SearchJob("python")
+    out = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp, get_http_session(os.path.join(tmp, "http_cache"), 0, pool_size=8) as http, \
+                ThreadPoolExecutor(8) as pool:
+            get = lambda job, page: http_get(http, server.search_url, job.search_params(page, args.per_page), limiter, stage="list").text
+            for name in ["no-split"] + args.split_facets.split(";"):
+                requests_before = server.requests
+                t0 = time.perf_counter()
+                first = {} #страница 0 проверенных подзапросов: при обходе ее брал бы http-кэш
+                if name == "no-split": #как раньше: страницы подряд до пустой
+                    jobs, pages = [root], {root: server.cfg.max_results // args.per_page + 1}
+                else:
+                    def probe(job):
+                        first[job] = get(job, 0)
+                        return parse_found_count(first[job])
+                    plan = QueryPlanner(parse_facets(name), args.per_page, 1, cap=server.cfg.max_results).run([root], probe, pool.map)
+                    jobs, pages = plan.jobs, plan.pages
+                htmls = pool.map(lambda jp: first[jp[0]] if jp[1] == 0 and jp[0] in first else get(*jp),
+                                 [(job, p) for job in jobs for p in range(pages[job])])
+                cards = [br.vacancy_id for html in htmls for br in parse_list_page(html, "stream")]
+                requests, unique = server.requests - requests_before, len(set(cards))
+                row = {"name": name, "found": args.split_total, "subqueries": len(jobs), "requests": requests,
+                       "vacancies": unique, "duplicates": len(cards) - unique,
+                       "coverage_pct": round(unique / args.split_total * 100, 1),
+                       "requests_per_1k": round(requests / unique * 1000, 1) if unique else None,
+                       "wall_sec": round(time.perf_counter() - t0, 2)}
+                out.append(row)
+                print(f"split {name:<36} подзапросов {row['subqueries']:>4}, запросов списка {requests:>5}, "
+                      f"вакансий {unique:>6} из {args.split_total} ({row['coverage_pct']:.0f}%), повторов {row['duplicates']}, "
+                      f"{row['requests_per_1k']} запр. на 1000 вакансий")
+    finally:
+        server.cfg.total = total_before
+    return out
+
+#----------------------------------------upsert----------------------------------------
+def bench_upsert(server: StandInServer, args)->List[dict]:
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from hh_parser.models import init_db
+    from hh_parser.parsing import parse_list_page, parse_vacancy_detail
+    from hh_parser.upsert import upsert_vacancy, upsert_vacancies
+    from hh_parser.dimcache import DimensionCache
+
+    cfg = dataclasses.replace(server.cfg, total=args.rows, list_filler=0, detail_filler=0) #балласт для записи не нужен
+    dets = []
+    for p in range((args.rows + args.per_page - 1) // args.per_page):
+        for br in parse_list_page(list_html("https://hh.ru", p, args.per_page, cfg), "stream"):
+            i = br.vacancy_id - 100000
+            dets.append(parse_vacancy_detail(detail_html(i, cfg), br.url, br, "stream"))
+    pages = [dets[i:i + args.per_page] for i in range(0, len(dets), args.per_page)]
+
+    def per_row(sess, cache, page):
+        for d in page:
+            upsert_vacancy(sess, d, cache)
+
+    def batch(sess, cache, page):
+        upsert_vacancies(sess, page, cache)
+
+    out = []
+    for name, write in (("upsert_vacancy", per_row), ("upsert_vacancies", batch)):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}", future=True)
+            init_db(engine)
+            for phase in ("insert", "update"): #вставка в пустую БД, затем повторная запись тех же вакансий
+                with Session(engine) as sess:
+                    cache = DimensionCache().attach(sess)
+                    t0 = time.perf_counter()
+                    for page in pages: #коммит на страницу, как в обходе
+                        write(sess, cache, page)
+                        sess.commit()
+                    wall = time.perf_counter() - t0
+                row = {"name": f"{name}-{phase}", "function": name, "phase": phase, "rows": len(dets),
+                       "wall_sec": round(wall, 3), "rows_per_sec": round(len(dets) / wall, 1)}
+                out.append(row)
+                print(f"upsert {row['name']:<24} {row['rows_per_sec']:9.1f} строк/сек")
+            engine.dispose()
+    return out
+
+#----------------------------------------сравнение----------------------------------------
+def compare(old: dict, new: dict):
+    print(f"\nСравнение с {old['meta'].get('commit')} ({old['meta'].get('started_at')}):")
+    for section, (field, higher_better) in _COMPARE_FIELDS.items():
+        before = {r["name"]: r for r in old.get(section, [])}
+        for r in new.get(section, []):
+            b = before.get(r["name"])
+            if not b or not b.get(field):
+                continue
+            ratio = r[field] / b[field]
+            better = ratio >= 1 if higher_better else ratio <= 1
+            print(f"  {section:<6} {r['name']:<24} {b[field]:>10} -> {r[field]:>10}  x{ratio:.2f}{'' if better else '  (хуже)'}")
+
+BENCHES = {"crawl": bench_crawl, "connector": bench_connector, "parse": bench_parse, "normalize": bench_normalize,
+           "startup": bench_startup, "memory": bench_memory, "split": bench_split, "upsert": bench_upsert}
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки hh_parser на локальном стенде")
+    parser.add_argument("--only", default=",".join(BENCHES), help="Какие бенчмарки запускать: crawl,connector,parse,normalize,startup,memory,split,upsert")
+    parser.add_argument("--out", default="bench_results.json", help="Куда записать результаты (JSON)")
+    parser.add_argument("--compare", help="JSON предыдущего запуска для сравнения")
+    parser.add_argument("--pages", type=int, default=4, help="Страниц поиска в бенчмарке обхода")
+    parser.add_argument("--per-page", type=int, default=50)
+    parser.add_argument("--concurrency", default="1,4,8,16", help="Уровни concurrency для async-обхода")
+    parser.add_argument("--parser", default="bs4", help="Движок разбора в бенчмарках обхода (bs4, lxml, stream)")
+    parser.add_argument("--sync-workers", default="1,4,8", help="Сколько потоков у sync-обхода (--workers)")
+    parser.add_argument("--conn-concurrency", type=int, default=32, help="Concurrency async-обхода в бенчмарке connector")
+    parser.add_argument("--limit-per-host", type=int, default=4, help="Ограничение соединений на хост в варианте per-host")
+    parser.add_argument("--rate", type=float, default=1000.0, help="Частота запросов к стенду (лимитер), запр/сек")
+    parser.add_argument("--rows", type=int, default=1000, help="Сколько вакансий писать в бенчмарке upsert")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Минимальное время замера разбора, сек")
+    parser.add_argument("--startup-runs", type=int, default=5, help="Сколько раз запускать интерпретатор в бенчмарке startup")
+    parser.add_argument("--memory-records", type=int, default=10_000, help="Сколько вакансий держать в памяти в бенчмарке memory")
+    parser.add_argument("--split-total", type=int, default=10_000, help="Сколько вакансий находит широкий запрос в бенчмарке split")
+    parser.add_argument("--split-facets", default="experience,schedule,employment;date,experience,schedule,employment",
+                        help="Порядки фасетов --split через точку с запятой (бенчмарк split)")
+    parser.add_argument("--verbose", action="store_true", help="Не глушить вывод функций обхода")
+    add_stand_args(parser)
+    args = parser.parse_args()
+
+    server = StandInServer(stand_config(args)).start()
+    os.environ["HH_SEARCH_URL"] = server.search_url #до импорта hh_parser.config
+    try:
+        result = {"meta": {
+            "commit": _git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        }}
+        for name in args.only.split(","):
+            result[name] = BENCHES[name](server, args)
+        result["meta"]["stand"] = {"requests": server.requests, "errors": server.errors}
+    finally:
+        server.stop()
+
+    Path(args.out).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Результаты: {args.out}")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+#server.py
+#локальный стенд вместо hh.ru для бенчмарков: aiohttp-сервер отдает страницы поиска и вакансий
+#с настраиваемой задержкой, разбросом и долей ошибок. Страницы берутся либо из записанных html
+#(--fixtures DIR: list_*.html и vacancy_*.html, ссылки на hh.ru переписываются на адрес стенда),
+#либо генерируются детерминированно (та же разметка data-qa, размер близок к настоящим страницам).
+#Как у hh, страница поиска показывает счетчик "Найдено N вакансий", отдает не больше max_results из них
+#и понимает фильтры experience, schedule, employment и date_from/date_to (для планировщика --split)
+#Запуск отдельно: python -m bench.server --port 8080 --latency 50 --jitter 20 --error-rate 0.02
+#и затем HH_SEARCH_URL=http://127.0.0.1:8080/search/vacancy python -m hh_parser.main --text python
+from __future__ import annotations
+import argparse
+import asyncio
+import hashlib
+import random
+import re
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from aiohttp import web
+
+EMPLOYERS = ["Яндекс", "Сбер", "Тинькофф", "VK", "Ozon", "Wildberries", "Авито", "Лаборатория Касперского",
+             "МТС", "Билайн", "X5 Group", "Альфа-Банк", "ООО Ромашка", "Positive Technologies", "JetBrains"]
+AREAS = ["Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Казань", "Нижний Новгород", "Алматы"]
+SKILLS = ["Python", "SQL", "PostgreSQL", "Docker", "Kubernetes", "Git", "Linux", "Django", "FastAPI", "Pandas",
+          "NumPy", "Airflow", "Spark", "Kafka", "Redis", "ClickHouse", "Machine Learning", "PyTorch", "REST API", "CI/CD"]
+EXPERIENCE = ["Нет опыта", "1–3 года", "3–6 лет", "Более 6 лет"]
+EMPLOYMENT = ["Полная занятость", "Частичная занятость", "Проектная работа"]
+SCHEDULE = ["Полный день", "Удаленная работа", "Гибкий график"]
+#коды тех же значений в фильтрах поиска hh (experience=..., schedule=..., employment=...)
+FILTER_CODES = {
+    "experience": ["noExperience", "between1And3", "between3And6", "moreThan6"],
+    "employment": ["full", "part", "project"],
+    "schedule": ["fullDay", "remote", "flexible"],
+}
+MONTHS = ["января", "февраля", "марта", "апреля", "мая", "июня", "июля", "августа", "сентября", "октября", "ноября", "декабря"]
+
+#балласт, с которым страницы по размеру похожи на настоящие (у hh это сотни КБ скриптов, стилей и разметки)
+_FILLER = '<div class="bloko-column bloko-column_xs-4"><span class="magritte-text">' + "x" * 180 + "</span></div>\n"
+
+@dataclass
+class StandConfig:
+    latency_ms: float = 0.0 #базовая задержка ответа
+    jitter_ms: float = 0.0 #случайная добавка к задержке (0..jitter)
+    error_rate: float = 0.0 #доля ответов 503
+    gone_rate: float = 0.0 #доля вакансий, которые отвечают 404 (сняты с публикации)
+    total: int = 500 #сколько всего вакансий в выдаче (дальше - пустые страницы)
+    max_results: int = 2000 #сколько вакансий отдается по одному запросу, как у hh (счетчик при этом показывает все найденные)
+    list_filler: int = 300 #сколько блоков балласта на странице списка
+    detail_filler: int = 200 #сколько блоков балласта на детальной странице
+    seed: int = 1 #сид для задержек и ошибок (страницы от него не зависят)
+    fixtures: Optional[str] = None #каталог с записанными страницами
+    validators: bool = True #отдавать ETag/Last-Modified и 304 на условные запросы (как hh для части страниц)
+
+#детерминированные страницы в разметке hh (поля помечены data-qa)
+def _salary(i: int)->Optional[str]:
+    lo = 60_000 + (i * 7919) % 250_000 // 1000 * 1000
+    kind = i % 5
+    if kind == 0:
+        return None
+    if kind == 1:
+        return f"от {lo:,} до {lo + 50_000:,} ₽ на руки".replace(",", " ")
+    if kind == 2:
+        return f"от {lo:,} ₽ до вычета налогов".replace(",", " ")
+    if kind == 3:
+        return f"до {lo:,} руб.".replace(",", " ")
+    return f"{lo:,} ₽".replace(",", " ")
+
+#даты публикации отсчитываются от запуска стенда и разбросаны на PUBLISHED_SPAN_DAYS назад
+#(часть вакансий старше 30 дней - для окон даты в планировщике --split)
+PUBLISHED_SPAN_DAYS = 40
+STAND_NOW = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+
+def published_at(i: int)->datetime:
+    return STAND_NOW - timedelta(minutes=(i * 7919) % (PUBLISHED_SPAN_DAYS * 24 * 60))
+
+def _published(i: int)->str:
+    d = published_at(i)
+    return f"{d.day} {MONTHS[d.month - 1]}"
+
+#подходит ли вакансия под фильтры поиска (experience, schedule, employment, date_from/date_to - ISO, UTC)
+def _matches(i: int, filters: dict, date_from: Optional[datetime], date_to: Optional[datetime])->bool:
+    if any(codes[i % len(codes)] != filters[k] for k, codes in FILTER_CODES.items() if k in filters):
+        return False
+    d = published_at(i)
+    return (date_from is None or d >= date_from) and (date_to is None or d < date_to)
+
+def _iso(value: Optional[str])->Optional[datetime]:
+    if not value:
+        return None
+    d = datetime.fromisoformat(value)
+    return d if d.tzinfo else d.replace(tzinfo=timezone.utc)
+
+#номера вакансий, найденных запросом с такими фильтрами
+def matching_ids(filters: dict, cfg: "StandConfig")->List[int]:
+    date_from, date_to = _iso(filters.get("date_from")), _iso(filters.get("date_to"))
+    return [i for i in range(cfg.total) if _matches(i, filters, date_from, date_to)]
+
+def card_html(base: str, i: int)->str:
+    return (f'<div class="serp-item" data-qa="vacancy-serp__vacancy">'
+            f'<h2><a data-qa="serp-item__title" href="{base}/vacancy/{100000 + i}?query=python&amp;from=serp">'
+            f'<span>Python разработчик {i}</span></a></h2>'
+            f'<div data-qa="vacancy-serp__vacancy-employer"><a href="/employer/{i % len(EMPLOYERS)}">'
+            f'{EMPLOYERS[i % len(EMPLOYERS)]}</a></div>'
+            f'<div data-qa="vacancy-serp__vacancy-address">{AREAS[i % len(AREAS)]}</div>'
+            f'<span data-qa="vacancy-serp__vacancy-date">{_published(i)}</span></div>\n')
+
+#страница поиска: счетчик найденного и карточки страницы. found - номера найденных вакансий (по умолчанию все),
+#отдаются только первые max_results из них
+def list_html(base: str, page: int, per_page: int, cfg: StandConfig, found: Optional[List[int]] = None)->str:
+    found = range(cfg.total) if found is None else found
+    first = page * per_page
+    ids = found[first:min(first + per_page, cfg.max_results)]
+    body = "".join(card_html(base, i) for i in ids)
+    counter = f'<h1 data-qa="vacancies-search-header">Найдено {len(found):,} вакансий</h1>'.replace(",", "\u00a0")
+    return (f"<html><head><title>Поиск</title></head><body>{counter}"
+            f"{_FILLER * (cfg.list_filler if ids else 0)}{body}</body></html>")
+
+def detail_html(i: int, cfg: StandConfig)->str:
+    skills = "".join(f'<li data-qa="skills-element"><span>{SKILLS[(i + k * 3) % len(SKILLS)]}</span></li>'
+                     for k in range(3 + i % 6))
+    salary = _salary(i)
+    salary_block = f'<div data-qa="vacancy-salary"><span>{salary}</span></div>' if salary else ""
+    return (f"<html><head><title>Вакансия</title></head><body>{_FILLER * cfg.detail_filler}"
+            f'<h1 data-qa="vacancy-title">Python разработчик <span>{i}</span></h1>'
+            f'<a data-qa="vacancy-company-name" href="/employer/{i % len(EMPLOYERS)}"><span>{EMPLOYERS[i % len(EMPLOYERS)]}</span></a>'
+            f'<p data-qa="vacancy-view-location">{AREAS[i % len(AREAS)]}</p>{salary_block}'
+            f'<p>Опыт работы: <span data-qa="vacancy-experience">{EXPERIENCE[i % len(EXPERIENCE)]}</span></p>'
+            f'<p data-qa="vacancy-view-employment-mode">{EMPLOYMENT[i % len(EMPLOYMENT)]}, '
+            f'<span data-qa="vacancy-schedule">{SCHEDULE[i % len(SCHEDULE)]}</span></p>'
+            f'<div data-qa="vacancy-description"><p>Описание вакансии {i}</p></div>'
+            f'<div class="bloko-tag-list">{skills}</div>'
+            f'<p class="vacancy-creation-time-redesigned" data-qa="vacancy-view-creation-time">'
+            f'Вакансия опубликована {_published(i)} {published_at(i).year} в Москве</p></body></html>')
+
+LAST_MODIFIED = "Wed, 01 Oct 2025 00:00:00 GMT" #страницы стенда не меняются
+
+#записанные страницы: ссылки на вакансии переписываются на адрес стенда
+_HH_LINK_RE = re.compile(r"https?://(?:[\w-]+\.)?hh\.ru(?=/vacancy/)")
+
+class Fixtures:
+    def __init__(self, path: str):
+        p = Path(path)
+        self.lists: List[str] = [f.read_text(encoding="utf-8") for f in sorted(p.glob("list_*.html"))]
+        self.details: List[str] = [f.read_text(encoding="utf-8") for f in sorted(p.glob("vacancy_*.html"))]
+        if not self.lists or not self.details:
+            raise FileNotFoundError(f"В {path} нет list_*.html или vacancy_*.html")
+
+class StandInServer:
+    def __init__(self, cfg: StandConfig = StandConfig(), host: str = "127.0.0.1", port: int = 0):
+        self.cfg = cfg
+        self.host = host
+        self.port = port
+        self.fixtures = Fixtures(cfg.fixtures) if cfg.fixtures else None
+        self.rnd = random.Random(cfg.seed)
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0 #ответов 304 на условные запросы
+        self._found: dict = {} #фильтры поиска -> номера найденных вакансий
+        self._peers: set = set() #адреса клиентских сокетов: по ним считаем открытые клиентом соединения
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def base(self)->str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def search_url(self)->str:
+        return f"{self.base}/search/vacancy"
+
+    #сколько TCP-соединений открыли клиенты (keep-alive и HTTP/2 уменьшают их число при том же числе запросов)
+    @property
+    def connections(self)->int:
+        return len(self._peers)
+
+    #задержка и случайная ошибка; True - ответить 503
+    async def _delay(self, req: web.Request)->bool:
+        self.requests += 1
+        if req.transport is not None:
+            self._peers.add(req.transport.get_extra_info("peername"))
+        cfg = self.cfg
+        delay = cfg.latency_ms + (self.rnd.uniform(0, cfg.jitter_ms) if cfg.jitter_ms else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if cfg.error_rate and self.rnd.random() < cfg.error_rate:
+            self.errors += 1
+            return True
+        return False
+
+    #ответ с html: с валидаторами (ETag - хэш содержимого) и 304, если у клиента та же версия
+    def _page(self, req: web.Request, html: str)->web.Response:
+        if not self.cfg.validators:
+            return web.Response(text=html, content_type="text/html")
+        etag = '"' + hashlib.sha1(html.encode("utf-8")).hexdigest()[:20] + '"'
+        headers = {"ETag": etag, "Last-Modified": LAST_MODIFIED}
+        if req.headers.get("If-None-Match") == etag or (
+                "If-None-Match" not in req.headers and req.headers.get("If-Modified-Since") == LAST_MODIFIED):
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+        return web.Response(text=html, content_type="text/html", headers=headers)
+
+    async def _search(self, req: web.Request)->web.Response:
+        if await self._delay(req):
+            return web.Response(status=503)
+        page = int(req.query.get("page", 0))
+        per_page = int(req.query.get("items_on_page", 20))
+        if self.fixtures:
+            if page * per_page >= self.cfg.total:
+                return web.Response(text="<html><body></body></html>", content_type="text/html")
+            html = _HH_LINK_RE.sub(self.base, self.fixtures.lists[page % len(self.fixtures.lists)])
+        else:
+            filters = {k: v for k, v in req.query.items() if k in FILTER_CODES or k in ("date_from", "date_to")}
+            key = (self.cfg.total, *sorted(filters.items()))
+            if key not in self._found:
+                self._found[key] = matching_ids(filters, self.cfg)
+            html = list_html(self.base, page, per_page, self.cfg, self._found[key])
+        return self._page(req, html)
+
+    async def _vacancy(self, req: web.Request)->web.Response:
+        if await self._delay(req):
+            return web.Response(status=503)
+        i = int(req.match_info["id"])
+        if self.cfg.gone_rate and (i * 2654435761) % 1000 < self.cfg.gone_rate * 1000: #одни и те же id всегда 404
+            return web.Response(status=404)
+        if self.fixtures:
+            html = self.fixtures.details[i % len(self.fixtures.details)]
+        else:
+            html = detail_html(i - 100000, self.cfg)
+        return self._page(req, html)
+
+    def app(self)->web.Application:
+        app = web.Application()
+        app.add_routes([web.get("/search/vacancy", self._search), web.get("/vacancy/{id}", self._vacancy)])
+        return app
+
+    async def start_async(self):
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1] #port=0 - порт выбирает система
+
+    async def stop_async(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    #запуск в фоновом потоке со своим event loop (чтобы в том же процессе можно было гонять и sync, и async клиент)
+    def start(self)->"StandInServer":
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start_async())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop_async())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="stand-in-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def add_stand_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=20.0, help="Задержка ответа стенда, мс")
+    parser.add_argument("--jitter", type=float, default=10.0, help="Случайная добавка к задержке, мс")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 503 (0..1)")
+    parser.add_argument("--gone-rate", type=float, default=0.0, help="Доля вакансий, отвечающих 404 (0..1)")
+    parser.add_argument("--total", type=int, default=500, help="Сколько вакансий в выдаче стенда")
+    parser.add_argument("--max-results", type=int, default=2000, help="Сколько вакансий стенд отдает по одному запросу (как у hh)")
+    parser.add_argument("--fixtures", help="Каталог с записанными страницами (list_*.html, vacancy_*.html)")
+    parser.add_argument("--no-validators", dest="validators", action="store_false",
+                        help="Не отдавать ETag/Last-Modified (проверка отката на сравнение содержимого)")
+    parser.add_argument("--seed", type=int, default=1)
+
+def stand_config(args)->StandConfig:
+    return StandConfig(latency_ms=args.latency, jitter_ms=args.jitter, error_rate=args.error_rate, gone_rate=args.gone_rate,
+                       total=args.total, max_results=args.max_results, fixtures=args.fixtures, seed=args.seed, validators=args.validators)
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный стенд hh.ru для бенчмарков")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    add_stand_args(parser)
+    args = parser.parse_args()
+    server = StandInServer(stand_config(args), args.host, args.port)
+    print(f"Стенд: {server.base}/search/vacancy (HH_SEARCH_URL)")
+    web.run_app(server.app(), host=args.host, port=args.port, print=None, access_log=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#archive.py
+#архив скачанных html-страниц для повторного разбора без сети.
+#Http-кэш (httpcache.py) хранит только последний ответ, протухает через --cache-ttl и вытесняется по размеру,
+#поэтому после правки селекторов в parsing.py раньше приходилось обходить все заново.
+#Архив - отдельный файл SQLite:
+#- blobs: сжатое содержимое страницы по sha256 (zstd, если установлен пакет zstandard, иначе gzip).
+#  Одинаковые страницы хранятся один раз, поэтому повторные обходы архив почти не увеличивают
+#- pages: какая страница когда скачана (детальные - по vacancy_id вместе с полями карточки из списка,
+#  страницы списка - по параметрам поиска) и ссылка на blob
+#По архиву таблица vacancies пересобирается командой python -m hh_parser.reparse (см. reparse.py)
+from __future__ import annotations
+import gzip
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import urlencode
+
+from .schemas import VacancyBrief
+
+ARCHIVE_CODECS = ("zstd", "gzip")
+COMMIT_EVERY = 100 #сколько страниц записывать между коммитами
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,      -- sha256 несжатого html
+    codec TEXT NOT NULL,        -- zstd / gzip
+    size INTEGER NOT NULL,      -- размер до сжатия, байт
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,         -- detail / list
+    key TEXT NOT NULL,          -- vacancy_id или параметры поиска
+    hash TEXT NOT NULL REFERENCES blobs(hash),
+    url TEXT NOT NULL,
+    fetched_at REAL NOT NULL,   -- unix time последнего скачивания этой версии
+    vacancy_id INTEGER,         -- поля карточки из списка (нужны parse_vacancy_detail)
+    name TEXT,
+    employer_name TEXT,
+    area_name TEXT,
+    published_at_text TEXT,
+    employer_id TEXT,           -- id работодателя и региона на hh из ссылок карточки
+    area_id INTEGER,
+    UNIQUE (kind, key, hash)
+);
+CREATE INDEX IF NOT EXISTS ix_pages_vacancy ON pages (vacancy_id);
+"""
+#колонки pages, добавленные после первой версии архива (в старые файлы досоздаются при открытии на запись)
+_ADDED_COLUMNS = (("employer_id", "TEXT"), ("area_id", "INTEGER"))
+
+#zstd заметно быстрее gzip при лучшем сжатии, но это необязательная зависимость
+def default_codec()->str:
+    try:
+        import zstandard  # noqa: F401
+        return "zstd"
+    except ImportError:
+        return "gzip"
+
+def compress(data: bytes, codec: str)->bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    raise ValueError(f"Неизвестный формат сжатия: {codec} (доступны: {', '.join(ARCHIVE_CODECS)})")
+
+def decompress(data: bytes, codec: str)->bytes:
+    if codec == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("Страница в архиве сжата zstd - нужен пакет zstandard (pip install zstandard)") from None
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+class HtmlArchive:
+    def __init__(self, path: str, codec: Optional[str] = None, readonly: bool = False):
+        self.path = path
+        self.codec = codec or default_codec()
+        if self.codec not in ARCHIVE_CODECS:
+            raise ValueError(f"Неизвестный формат сжатия: {self.codec} (доступны: {', '.join(ARCHIVE_CODECS)})")
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(pages)")}
+        for name, type_ in _ADDED_COLUMNS:
+            if name not in columns and not readonly:
+                self.conn.execute(f"ALTER TABLE pages ADD COLUMN {name} {type_}")
+                columns.add(name)
+        self._columns = columns
+        self._lock = threading.Lock() #архив может писаться из нескольких потоков
+        self._uncommitted = 0
+        self.stored = 0 #сколько страниц записано за этот запуск
+        self.new_blobs = 0 #сколько из них оказались новыми (не дубликатами)
+
+    #сохраняет страницу: новое содержимое сжимается и пишется в blobs, запись в pages обновляет время скачивания
+    def _put(self, kind: str, key: str, url: str, html: str, brief: Optional[VacancyBrief] = None)->str:
+        raw = html.encode("utf-8")
+        h = hashlib.sha256(raw).hexdigest()
+        with self._lock:
+            if self.conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (h,)).fetchone() is None:
+                self.conn.execute("INSERT INTO blobs (hash, codec, size, data) VALUES (?, ?, ?, ?)",
+                                  (h, self.codec, len(raw), compress(raw, self.codec)))
+                self.new_blobs += 1
+            b = brief
+            self.conn.execute(
+                "INSERT INTO pages (kind, key, hash, url, fetched_at, vacancy_id, name, employer_name, area_name, published_at_text,"
+                " employer_id, area_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (kind, key, hash) DO UPDATE SET fetched_at = excluded.fetched_at,"
+                " employer_id = excluded.employer_id, area_id = excluded.area_id",
+                (kind, key, h, url, time.time(),
+                 b.vacancy_id if b else None, b.name if b else None, b.employer_name if b else None,
+                 b.area_name if b else None, b.published_at_text if b else None,
+                 b.employer_id if b else None, b.area_id if b else None),
+            )
+            self.stored += 1
+            self._uncommitted += 1
+            if self._uncommitted >= COMMIT_EVERY:
+                self.conn.commit()
+                self._uncommitted = 0
+        return h
+
+    def put_detail(self, brief: VacancyBrief, html: str)->str:
+        return self._put("detail", str(brief.vacancy_id), brief.url, html, brief)
+
+    def put_list(self, url: str, params: dict, html: str)->str:
+        return self._put("list", urlencode(sorted(params.items())), url, html)
+
+    def get(self, h: str)->str:
+        codec, data = self.conn.execute("SELECT codec, data FROM blobs WHERE hash = ?", (h,)).fetchone()
+        return decompress(data, codec).decode("utf-8")
+
+    #последняя скачанная версия каждой детальной страницы: (hash, url, VacancyBrief).
+    #В архиве старого формата (открытом только на чтение) колонок id нет - там они None
+    def latest_details(self)->Iterator[tuple[str, str, VacancyBrief]]:
+        ids = ", ".join(f"p.{name}" if name in self._columns else "NULL" for name, _ in _ADDED_COLUMNS)
+        rows = self.conn.execute(
+            "SELECT p.hash, p.url, p.vacancy_id, p.name, p.employer_name, p.area_name, p.published_at_text, " + ids +
+            " FROM pages p JOIN (SELECT vacancy_id, MAX(fetched_at) AS at FROM pages WHERE kind = 'detail' GROUP BY vacancy_id) last"
+            " ON p.vacancy_id = last.vacancy_id AND p.fetched_at = last.at"
+            " WHERE p.kind = 'detail' ORDER BY p.vacancy_id"
+        )
+        seen = set()
+        for h, url, v_id, name, emp, area, pub, emp_id, area_id in rows:
+            if v_id in seen: #две версии с одинаковым временем - берем первую
+                continue
+            seen.add(v_id)
+            yield h, url, VacancyBrief(v_id, name, url, emp, area, pub, emp_id, area_id)
+
+    def stats(self)->dict:
+        pages, = self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()
+        blobs, raw, stored = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blobs").fetchone()
+        return {"pages": pages, "blobs": blobs, "raw_bytes": raw, "stored_bytes": stored}
+
+    def report(self):
+        s = self.stats()
+        ratio = s["raw_bytes"] / s["stored_bytes"] if s["stored_bytes"] else 0
+        print(f"Архив html: за запуск {self.stored} страниц (новых {self.new_blobs}), всего {s['pages']} версий, "
+              f"{s['blobs']} уникальных, {s['raw_bytes'] / 2**20:.1f} МБ -> {s['stored_bytes'] / 2**20:.1f} МБ (x{ratio:.1f}, {self.codec})")
+
+    def flush(self):
+        with self._lock:
+            self.conn.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
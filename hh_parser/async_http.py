@@ -3,18 +3,36 @@
 
 from __future__ import annotations
 import asyncio
-from datetime import timedelta
+import time
 #tenacity нужно для добавления повторных попыток при выполнении http-запроса (т.к. операция не стабильная)
-from tenacity import retry, stop_after_attempt, wait_exponential_jitter, AsyncRetrying
-from .config import HEADERS
-from typing import Optional, Dict
-import http.cookiejar as cookiejar
+from tenacity import retry_if_exception, stop_after_attempt, wait_exponential_jitter, AsyncRetrying
+from .config import (HEADERS, DEFAULT_CONN_LIMIT, DEFAULT_LIMIT_PER_HOST, DEFAULT_KEEPALIVE, DEFAULT_DNS_TTL,
+                     DEFAULT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT, DEFAULT_HTTP_CACHE_MAX_MB, DEFAULT_CACHE_NAME)
+from . import metrics
+from .httpcache import CachedResponse, HttpCache
+from .errors import GONE_STATUSES, GoneError, is_transient_status
+from .ratelimit import AdaptiveRateLimiter, get_default_limiter
+from dataclasses import dataclass
 from pathlib import Path
 import aiohttp
-from aiohttp_client_cache import CachedSession, SQLiteBackend
 import json
+from multidict import CIMultiDict, CIMultiDictProxy
 from yarl import URL
 
+#настройки пула соединений и таймаутов async-клиента
+#(--conn-limit, --limit-per-host, --keepalive, --dns-ttl, --timeout, --connect-timeout, --http2).
+#По умолчанию aiohttp держит до 100 соединений без ограничения на хост, помнит DNS 10 сек и закрывает простаивающее
+#соединение через 15 сек: после пауз (Retry-After, предохранитель) соединения к hh заново проходят TLS
+@dataclass
+class HttpOptions:
+    limit: int = DEFAULT_CONN_LIMIT #всего соединений (0 - без ограничения)
+    limit_per_host: int = DEFAULT_LIMIT_PER_HOST #соединений к одному хосту (0 - без ограничения)
+    keepalive: float = DEFAULT_KEEPALIVE #сколько секунд держать простаивающее соединение (0 - закрывать после ответа)
+    dns_ttl: int = DEFAULT_DNS_TTL #сколько секунд помнить адрес хоста (0 - без кэша DNS)
+    timeout: float = DEFAULT_TIMEOUT #таймаут запроса целиком (0 - без таймаута)
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT #таймаут установки соединения (0 - без таймаута)
+    http2: bool = False #HTTP/2 через httpx: много запросов в полете по одному соединению
+
 def load_cookies_from_file_async(
     path: str,
     default_domain: str = ".hh.ru",
@@ -24,8 +42,9 @@ def load_cookies_from_file_async(
     Загружает cookies из файла (поддерживает:
     1) JSON-масиив [{name, value, domain. path, secure, ....}]
     2) Netscape cookies.txt)
-    Возвращает aiohttp.CookieJar, готовый к использованию в aiohttp/CachedSession
+    Возвращает aiohttp.CookieJar, готовый к использованию в aiohttp/httpx
     """
+    import http.cookiejar as cookiejar #нужен только при --cookies-file
     p = Path(path)
     if not p.exists():
         raise FileNotFoundError(f"Cookies file not found: {path}")
@@ -85,17 +104,19 @@ def load_cookies_from_file_async(
 #обновленный get_http_session (создает и настраивает асинхронную http-сессию 
 #c кэшированием, пользовательскими заголовками и куками (авторизацией), если указаны cookies.txt)
 async def get_http_session_async(
-    cache_name: str = ".cache/http_cache_by_async.sqlite", 
+    cache_name: str = DEFAULT_CACHE_NAME, #файл кэша общий с синхронной сессией (get_http_session)
     cache_ttl_minutes: int = 60,
     cookies_file: str | None = None,
-)->CachedSession:
+    options: HttpOptions | None = None, #пул соединений и таймауты (по умолчанию - из config.py)
+    cache_max_mb: float = DEFAULT_HTTP_CACHE_MAX_MB, #предел размера http-кэша
+)->CachedAsyncSession:
     """
-    Возвращает aiohttp_client_cache.Cachedsession - это аналог request.Session, но асинхронный
+    Возвращает CachedAsyncSession - aiohttp.ClientSession (или httpx при --http2) с общим http-кэшем,
+    тем же, что у синхронной сессии (см. httpcache.py)
     cache_ttl_minutes - время жизни кэша
     """
-    backend = SQLiteBackend( #создаем файл кэша для сохранения http ответов
-        cache_name, expire_after = timedelta(minutes=cache_ttl_minutes)
-    )
+    options = options or HttpOptions()
+    cache = HttpCache(cache_name, cache_ttl_minutes * 60, cache_max_mb) #файл кэша для сохранения http ответов
 
     #создаем контейнер для кук
     if cookies_file:
@@ -105,37 +126,228 @@ async def get_http_session_async(
     else:
         jar = aiohttp.CookieJar() #иначе создаем пустой контейнер
 
-    #создаем асинхронную сессию с кэшированием (аналог request.Session)
-    s = CachedSession(
-        cache = backend, #хранилище кэша
+    if options.http2:
+        return CachedAsyncSession(Http2Session(jar, options), cache)
+
+    #пул соединений: keepalive 0 - соединение закрывается после каждого ответа
+    keepalive = {"keepalive_timeout": options.keepalive} if options.keepalive > 0 else {"force_close": True}
+    connector = aiohttp.TCPConnector(
+        limit = options.limit,
+        limit_per_host = options.limit_per_host,
+        use_dns_cache = options.dns_ttl > 0,
+        ttl_dns_cache = options.dns_ttl or None,
+        **keepalive,
+    )
+    #таймауты на всю сессию (раньше - timeout=30 в каждом запросе)
+    timeout = aiohttp.ClientTimeout(total = options.timeout or None, sock_connect = options.connect_timeout or None)
+
+    #создаем асинхронную сессию (аналог request.Session)
+    s = aiohttp.ClientSession(
         headers = HEADERS, #заголовки (User-Agent и тд)
-        cookies_jar = jar, #куки для авторизации
+        cookie_jar = jar, #куки для авторизации
+        connector = connector,
+        timeout = timeout,
     )
 
-    return s
+    return CachedAsyncSession(s, cache)
+
+#ответ, тело которого уже прочитано: из кэша или только что скачанный и сохраненный в кэш
+class _BufferedResponse:
+    def __init__(self, url: str, status: int, headers, body: bytes, from_cache: bool, not_modified: bool = False):
+        self.url = url
+        self.status = status
+        self.headers = CIMultiDictProxy(CIMultiDict(headers))
+        self._body = body
+        self.from_cache = from_cache
+        self.not_modified = not_modified #304 на условный запрос: тело из кэша, но запрос к сайту был
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            url = URL(self.url)
+            info = aiohttp.RequestInfo(url, "GET", CIMultiDictProxy(CIMultiDict()), url)
+            raise aiohttp.ClientResponseError(info, (), status = self.status, headers = self.headers)
+
+    async def read(self)->bytes:
+        return self._body
+
+    async def text(self)->str:
+        ctype = self.headers.get("Content-Type", "")
+        charset = ctype.split("charset=", 1)[1].split(";")[0].strip(' "') if "charset=" in ctype else "utf-8"
+        return self._body.decode(charset, errors = "replace")
+
+#общий http-кэш поверх aiohttp или httpx: GET сначала ищется в кэше, успешный ответ читается целиком и сохраняется.
+#По протухшей записи запрос уходит условным (If-None-Match / If-Modified-Since), 304 отдает тело из кэша.
+#before_send (корутина) ждется перед каждым реальным запросом к сайту - там http_get_async берет токен лимитера.
+#Обращения к SQLite идут в потоке (asyncio.to_thread), чтобы запись кэша или ожидание блокировки
+#другим процессом не останавливали event loop
+class CachedAsyncSession:
+    def __init__(self, session, cache: HttpCache):
+        self.session = session #aiohttp.ClientSession или Http2Session
+        self.cache = cache
+
+    async def get(self, url: str, params: dict | None = None, before_send = None):
+        entry: CachedResponse | None = None
+        if self.cache.enabled:
+            entry = await asyncio.to_thread(self.cache.get, url, params)
+            if entry is not None and entry.fresh:
+                return _BufferedResponse(entry.url, entry.status, entry.headers, entry.body, True)
+        if before_send:
+            await before_send()
+        resp = await self.session.get(url, params = params, headers = entry.validators() if entry is not None else None)
+        if resp.status == 304 and entry is not None: #страница не менялась - продлеваем запись
+            async with resp:
+                pass
+            await asyncio.to_thread(self.cache.refresh, url, params, entry)
+            return _BufferedResponse(entry.url, entry.status, entry.headers, entry.body, False, True)
+        if resp.status != 200 or not self.cache.enabled: #ошибки не кэшируются - ответ отдаем как есть
+            return resp
+        async with resp: #тело читаем сразу, соединение возвращается в пул
+            body = await resp.read()
+        await asyncio.to_thread(self.cache.put, url, params, resp.status, resp.headers, body)
+        return _BufferedResponse(str(resp.url), resp.status, resp.headers, body, False)
+
+    async def close(self):
+        await self.session.close()
+        self.cache.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+#ответ httpx в том виде, в каком его ждет http_get_async (как у aiohttp)
+class _Http2Response:
+    from_cache = False #кэш - снаружи, в CachedAsyncSession
+
+    def __init__(self, r):
+        self._r = r
+        self.status = r.status_code
+        self.headers = r.headers
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    #ошибка статуса - тем же исключением, что у aiohttp (по нему is_transient_async решает, повторять ли)
+    def raise_for_status(self):
+        if self.status >= 400:
+            url = URL(str(self._r.url))
+            info = aiohttp.RequestInfo(url, "GET", CIMultiDictProxy(CIMultiDict()), url)
+            raise aiohttp.ClientResponseError(info, (), status = self.status, message = self._r.reason_phrase,
+                                              headers = self.headers)
+
+    async def read(self)->bytes:
+        return self._r.content
+
+    async def text(self)->str:
+        return self._r.text
+
+#необязательный HTTP/2-транспорт на httpx (pip install 'httpx[http2]').
+#По HTTP/2 все запросы к хосту идут потоками одного соединения: одно TLS-рукопожатие на десятки запросов в полете.
+#Отличия от aiohttp: нет ограничения на хост (limit_per_host только уменьшает общий limit,
+#ведь обход ходит на один хост), DNS резолвит система. Без TLS (локальный стенд по http://) httpx работает по HTTP/1.1
+class Http2Session:
+    def __init__(self, jar: aiohttp.CookieJar, options: HttpOptions):
+        try:
+            import httpx
+            limits = [n for n in (options.limit, options.limit_per_host) if n > 0]
+            cookies = httpx.Cookies()
+            for c in jar:
+                cookies.set(c.key, c.value, domain = c["domain"], path = c["path"] or "/")
+            self.client = httpx.AsyncClient(
+                http2 = True,
+                headers = HEADERS,
+                cookies = cookies,
+                follow_redirects = True,
+                limits = httpx.Limits(max_connections = min(limits) if limits else None,
+                                      max_keepalive_connections = None if options.keepalive > 0 else 0,
+                                      keepalive_expiry = options.keepalive or None),
+                timeout = httpx.Timeout(options.timeout or None, connect = options.connect_timeout or None),
+            )
+        except ImportError: #нет httpx или h2
+            raise RuntimeError("Для --http2 нужен пакет httpx с поддержкой HTTP/2 (pip install 'httpx[http2]')") from None
+        self._httpx = httpx
+
+    async def get(self, url: str, params: dict | None = None, headers: dict | None = None)->_Http2Response:
+        #ошибки сети - теми же исключениями, что у aiohttp (повторы, лимитер и метрики работают без изменений)
+        try:
+            r = await self.client.get(url, params = params, headers = headers)
+        except self._httpx.TimeoutException as e:
+            raise asyncio.TimeoutError(str(e)) from e
+        except self._httpx.TransportError as e:
+            raise aiohttp.ClientConnectionError(str(e)) from e
+        return _Http2Response(r)
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
 
-#асинхронная безопасная пауза между запросами. Не блокирует другие запросы - она просто "усыпляет" только одну конкретную задачу
-#например, если скачивается 10 вакансий одновременно и из них часть страниц уже есть в кэше, то они обработаются мгновенно, 
-#а остальные с паузой между запросами 0.4 сек
-async def safe_sleep_async(from_cache: bool, delay: float = 0.4):
-    if not from_cache:
-        await asyncio.sleep(delay)
+#повторяем только временные сбои: таймауты, обрывы соединения, 429 и 5xx (как is_transient в http.py)
+def is_transient_async(exc: BaseException)->bool:
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return is_transient_status(exc.status)
+    return isinstance(exc, (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError))
 
 #асинхронно получает html-страницу с помощью aiohttp + кэширования + повторов
-async def http_get_async(session: CachedSession, #объект из get_http_session_async
+async def http_get_async(session: CachedAsyncSession, #объект из get_http_session_async
                          url: str, #адрес страницы 
-                         params: dict | None = None)->str: #словарь параметров запроса
+                         params: dict | None = None, #словарь параметров запроса
+                         limiter: AdaptiveRateLimiter | None = None, #ограничитель частоты (по умолчанию общий)
+                         *, stage: str = "http")->str: #стадия для метрик ("list" или "detail")
+    limiter = limiter or get_default_limiter()
+    m = metrics.get()
     #повторяем запрос при временных сбоях до 5 раз
     async for attempt in AsyncRetrying(
-        wait = wait_exponential_jitter(initial=0.5, max = 4), #между попытками экспоненциальная пауза + небольшой случайный разброс
+        retry = retry_if_exception(is_transient_async), #404/410, 403 и прочие 4xx не повторяем
+        wait = wait_exponential_jitter(multiplier=0.5, max = 4), #между попытками экспоненциальная пауза + небольшой случайный разброс
         stop = stop_after_attempt(5), #максимум 5 попыток
         reraise = True,
     ):
         with attempt:
-            async with session.get(url, params = params, timeout = 30) as resp: #отправляет get-запрос
-                resp.raise_for_status() #проверка успешного выполнения (выбросит исключение, если статус 4хх/5хх)
-                html = await resp.text() #асинхронно читает тело ответа как текст, затем это передается в BeautifulSoup
-                await safe_sleep_async(getattr(resp, "from_cache", False)) #пауза
+            if attempt.retry_state.attempt_number > 1:
+                m.inc("http_retries", 1, stage)
+            await limiter.wait_pause_async() #если сервер просил подождать (Retry-After) - ждем
+            t0 = time.perf_counter()
+            #токен общего лимитера (частота на весь процесс, см. ratelimit.py) берется до отправки каждого реального запроса
+            #и каждого повтора. Ожидание усыпляет только эту задачу: из 10 одновременных вакансий те, что есть в кэше,
+            #обработаются мгновенно, а остальные уходят на сайт с целевой частотой
+            async def acquire():
+                nonlocal t0
+                await limiter.acquire_async()
+                t0 = time.perf_counter() #ожидание токена в задержку ответа не входит (оно в метрике ratelimit_wait)
+            try:
+                resp = await session.get(url, params = params, before_send = acquire) #отправляет get-запрос (таймауты заданы в сессии)
+            except (asyncio.TimeoutError, aiohttp.ClientError):
+                limiter.on_error() #таймаут или обрыв - учитывает предохранитель
+                raise
+            async with resp: #по выходу соединение возвращается в пул
+                from_cache = getattr(resp, "from_cache", False)
+                not_modified = getattr(resp, "not_modified", False)
+                if not from_cache: #по реальному ответу лимитер подстраивает частоту (429/503 - тормозим)
+                    limiter.on_response(resp.status, resp.headers.get("Retry-After"))
+                body = b""
+                try:
+                    if resp.status in GONE_STATUSES: #вакансия удалена - повторять бессмысленно
+                        raise GoneError(url, resp.status)
+                    resp.raise_for_status() #проверка успешного выполнения (выбросит исключение, если статус 4хх/5хх)
+                    body = await resp.read() #тело читается один раз, text() берет его из буфера
+                    html = await resp.text() #асинхронно читает тело ответа как текст, затем это передается в BeautifulSoup
+                finally:
+                    m.http_response(stage, time.perf_counter() - t0, from_cache, len(body), not_modified) #ответы с ошибкой тоже считаем
                 return html #возвращаем строку для парсинга
 
 
@@ -3,77 +3,308 @@ from __future__ import annotations
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
-from .config import SEARCH_URL
-from .models import Base
-from .parsing import parse_list_page
+from .config import SEARCH_URL, DEFAULT_PREFETCH, DEFAULT_PARSER_BACKEND, DEFAULT_DIM_CACHE_SIZE, DEFAULT_SINK, DEFAULT_FLUSH_INTERVAL
+from . import checkpoint
+from .archive import HtmlArchive
+from .dimcache import DimensionCache
+from .errors import GoneError
+from .incremental import filter_changed, stored_hashes, unchanged
+from .jobs import SearchJob
+from .models import init_db
+from .parse_pool import HtmlParser
+from .parsing import parse_found_count
+from .planner import QueryPlanner, parse_facets
 from .schemas import VacancyBrief
-from .upsert import upsert_vacancy
-from .parsing import parse_vacancy_detail
-from tenacity import retry, stop_after_attempt, wait_exponential_jitter, AsyncRetrying
+from .sinks import Sink, open_sinks
+from .upsert import record_matches
+from .writer import DbWriter
 
-import requests
 from typing import Optional, List
+from collections import deque
+from dataclasses import dataclass, field
 
 import asyncio
-from .async_http import get_http_session_async, http_get_async
+import time
+from .async_http import HttpOptions, get_http_session_async, http_get_async
+from .ratelimit import AdaptiveRateLimiter
+from .config import DEFAULT_RATE, DEFAULT_CONCURRENCY, DEFAULT_CACHE_NAME, DEFAULT_HTTP_CACHE_MAX_MB
 
-#асинхронное пролистывание страниц. Грузит страницы из списка последовательно, 
-#но детали вакансий - параллельно с лимитом на одновременные запросы
-async def fetch_vacancy_detail_async(session, brief: VacancyBrief)->tuple[VacancyBrief, str]:
-    html = await http_get_async(session, brief.url)
-    return (brief, html)
+#метка конца потока для очередей (воркер, получивший ее, завершает работу)
+_DONE = object()
+
+#асинхронное пролистывание страниц устроено как конвейер (producer/consumer):
+#1) producer по очереди обходит поисковые задания (запрос, регион), качает страницы списка с опережением (prefetch)
+#   и кладет карточки в очередь заданий. Вакансия, уже встреченная в другом запросе, второй раз не качается.
+#   С --split задания - подзапросы планировщика (planner.py), и страниц у каждого столько, сколько показал счетчик
+#2) fetch-воркеры (их concurrency штук) забирают карточки и качают детальные страницы
+#   и сразу отдают html на разбор (в пул процессов, если задан --parse-workers)
+#3) готовые VacancyDetail уходят в поток записи (writer.py), который пишет их пачками и не держит event loop
+#прогресс (страницы списка и еще не сохраненные карточки) пишется в crawl_state/crawl_items (см. checkpoint.py),
+#а не скачавшиеся страницы после основного прохода повторяются отдельными проходами того же конвейера
+#так семафор не простаивает ни в конце каждой страницы, ни во время записи в БД.
+#html в памяти держится только до разбора: дальше по конвейеру едут компактные VacancyBrief/VacancyDetail (см. schemas.py)
+
+#Crawl, run_pass, produce_job и produce_items - публичные: из них же собран воркер распределенного обхода (coordinator.py)
+
+#общее состояние одного обхода, которое нужно всем стадиям конвейера
+@dataclass
+class Crawl:
+    http: object #асинхронная http-сессия
+    parser: HtmlParser #разбор html (в пуле процессов или на месте)
+    limiter: AdaptiveRateLimiter #ограничитель частоты запросов
+    engine: object #подключение к БД (прогресс обхода, --incremental)
+    incremental: bool = False #качать детальные страницы только для новых/изменившихся вакансий
+    archive: Optional[HtmlArchive] = None #архив html (--archive)
+    sink: Optional[Sink] = None #куда пишутся вакансии (--sink)
+    writer: Optional[DbWriter] = None #поток записи в БД
+    saved: int = 0 #сколько вакансий writer сохранил к концу предыдущего прохода
+    skipped: int = 0 #сколько детальных страниц не качали в режиме --incremental
+    skip_unchanged: bool = False #не разбирать и не писать страницы, совпавшие с сохраненными (только приемник db)
+    stored: dict = field(default_factory=dict) #vacancy_id -> (list_fingerprint, detail_hash) из БД для карточек в очереди
+    unchanged: int = 0 #сколько страниц совпало с сохраненными
+    seen: set = field(default_factory=set) #vacancy_id, уже поставленные в очередь (дедупликация между запросами)
+    cards: int = 0 #сколько карточек пришло со страниц списка по всем запросам
+
+#скачивание страницы с учетом времени ожидания сети (для оценки соотношения CPU/IO)
+async def _timed_get(c: Crawl, url: str, params: dict | None = None, stage: str = "detail")->str:
+    t0 = time.perf_counter()
+    html = await http_get_async(c.http, url, params, c.limiter, stage=stage)
+    c.parser.timings.net_time += time.perf_counter() - t0
+    c.parser.timings.requests += 1
+    return html
+
+#--incremental: какие карточки новые или изменились (чтение из БД - в отдельном потоке, не в event loop)
+def _filter_changed(engine, briefs: List[VacancyBrief])->List[VacancyBrief]:
+    with Session(engine) as sess:
+        return filter_changed(sess, briefs)
+
+#сохраненные отпечатки карточек страницы (см. incremental.stored_hashes)
+def _stored_hashes(engine, briefs: List[VacancyBrief])->dict:
+    with Session(engine) as sess:
+        return stored_hashes(sess, briefs)
+
+#обходит страницы списка одного задания начиная с first_page: страницы качаются с опережением на prefetch штук,
+#но обрабатываются строго по порядку. Новые карточки кладутся в очередь tasks.
+#Возвращает True, если выдача задания закончилась (пришла пустая страница)
+async def produce_job(c: Crawl, tasks: asyncio.Queue, job: SearchJob, first_page: int, pages: int, per_page: int, prefetch: int)->bool:
+    def start(p: int)->asyncio.Task:
+        return asyncio.create_task(_timed_get(c, SEARCH_URL, job.search_params(p, per_page), "list"))
+
+    pending: deque[asyncio.Task] = deque(start(p) for p in range(first_page, min(first_page + prefetch, pages)))
+    page = first_page
+    next_page = first_page + len(pending)
+    try:
+        while pending:
+            list_html = await pending.popleft() #html очередной страницы поиска
+            if c.archive is not None: #сжатие и запись в SQLite архива - в потоке, как у http-кэша (event loop не ждет диск)
+                await asyncio.to_thread(c.archive.put_list, SEARCH_URL, job.search_params(page, per_page), list_html)
+            briefs = await c.parser.list_page(list_html) #парсим список карточек вакансий
+            del list_html #пока карточки ждут места в очереди, страницу списка не держим
+            if not briefs: #если пусто - дальше страниц нет, выходим
+                await c.writer.call(checkpoint.mark_finished, job)
+                return True
+            if next_page < pages: #освободилось место в окне опережения - запускаем следующую страницу
+                pending.append(start(next_page))
+                next_page += 1
+
+            c.cards += len(briefs)
+            await c.writer.call(record_matches, [(br.vacancy_id, job) for br in briefs]) #запоминаем, какой запрос нашел вакансию
+            briefs = [br for br in briefs if br.vacancy_id not in c.seen] #уже взятые другим запросом не качаем
+            c.seen.update(br.vacancy_id for br in briefs)
+            if c.incremental: #один запрос по индексу vacancy_id на страницу
+                todo = await asyncio.to_thread(_filter_changed, c.engine, briefs)
+                c.skipped += len(briefs) - len(todo)
+                briefs = todo
+            if c.skip_unchanged:
+                c.stored.update(await asyncio.to_thread(_stored_hashes, c.engine, briefs))
+            await c.writer.call(checkpoint.mark_page, job, page, briefs) #карточки страницы - в хвост, страница считается пройденной
+            page += 1
+            for br in briefs:
+                await tasks.put(br) #очередь ограничена, поэтому producer не убегает далеко вперед
+        return False
+    finally:
+        for t in pending: #страницы, скачанные "на вырост" после пустой, не нужны
+            t.cancel()
+
+#ставит в очередь карточки из хвоста прошлого запуска или прохода (crawl_items)
+async def produce_items(c: Crawl, tasks: asyncio.Queue, items: List[tuple[VacancyBrief, SearchJob]]):
+    await c.writer.call(record_matches, [(br.vacancy_id, job) for br, job in items])
+    for br, job in items:
+        c.seen.add(br.vacancy_id)
+        await tasks.put(br)
+
+#producer основного прохода: сначала хвост (при --resume), потом задания с сохраненной страницы.
+#job_pages - сколько страниц у каждого задания (подзапросы --split - по счетчику), остальные - pages
+async def _produce_briefs(c: Crawl, tasks: asyncio.Queue, jobs: List[SearchJob], first_pages: dict, items: list,
+                          pages: int, per_page: int, prefetch: int, job_pages: Optional[dict] = None):
+    await produce_items(c, tasks, items)
+    for job in jobs:
+        first = first_pages.get(job, 0)
+        last = (job_pages or {}).get(job, pages)
+        if first is not None and first < last: #None - выдача задания уже пройдена до конца
+            await produce_job(c, tasks, job, first, last, per_page, prefetch)
+
+#первая страница запроса для планировщика (--split): сколько вакансий нашел hh.
+#Страница остается в http-кэше, и обход подзапроса начнется с попадания. sem - сколько страниц качать одновременно
+async def _count_found(c: Crawl, job: SearchJob, per_page: int, sem: asyncio.Semaphore)->Optional[int]:
+    async with sem:
+        return parse_found_count(await _timed_get(c, SEARCH_URL, job.search_params(0, per_page), "list"))
+
+#fetch-воркер: качает и разбирает детальные страницы, пока не получит метку конца, и отдает их в поток записи.
+#Возвращает, сколько страниц не скачалось (удаленные с сайта не считаются - их не повторяем)
+async def _fetch_worker(c: Crawl, tasks: asyncio.Queue)->int:
+    failures = 0
+    while True:
+        brief = await tasks.get()
+        if brief is _DONE:
+            return failures
+        try:
+            html = await _timed_get(c, brief.url)
+            if c.archive is not None: #в архив - до разбора, чтобы страницу можно было разобрать заново (в потоке)
+                await asyncio.to_thread(c.archive.put_detail, brief, html)
+            if unchanged(c.stored.pop(brief.vacancy_id, None), brief, html): #страница та же, что в БД - только отмечаем
+                del html
+                c.unchanged += 1
+                await c.writer.call(checkpoint.mark_done, [brief.vacancy_id])
+                continue
+            det = await c.parser.vacancy_detail(html, brief.url, brief) #детальный парсинг каждой вакансии
+            del html #пока запись ждет места в очереди, страницу не держим
+        except asyncio.CancelledError:
+            raise
+        except Exception as e: #если страница не загрузилась, программа не падает - вакансия уходит на повтор
+            await c.writer.fail(brief, e)
+            failures += not isinstance(e, GoneError)
+            continue
+        await c.writer.write(det) #дальше едет уже разобранный VacancyDetail, html больше не держим
+
+#один проход конвейера: produce(tasks) наполняет очередь карточками, fetch-воркеры качают, поток записи пишет.
+#Проход заканчивается, когда все записанное зафиксировано. Возвращает (сохранено, не скачалось)
+async def run_pass(c: Crawl, produce, concurrency: int)->tuple[int, int]:
+    #очередь ограничена, чтобы память не росла, если список качается быстрее детальных страниц
+    tasks: asyncio.Queue = asyncio.Queue(maxsize = concurrency * 2)
+
+    async def producer():
+        await produce(tasks)
+        for _ in range(concurrency): #сообщаем fetch-воркерам, что работы больше не будет
+            await tasks.put(_DONE)
+
+    workers = [asyncio.create_task(producer())] + [asyncio.create_task(_fetch_worker(c, tasks)) for _ in range(concurrency)]
+    try:
+        #если одна из задач упала (в том числе из-за ошибки записи в БД) - останавливаем весь конвейер
+        _, *failures = await asyncio.gather(*workers)
+        total = await c.writer.sync()
+    finally:
+        for t in workers:
+            t.cancel()
+    saved, c.saved = total - c.saved, total
+    return saved, sum(failures)
 
 #сюда внесены изменения (теперь передаем файл с куки)
 async def crawl_and_store_async(
     db_url: str, #
-    text: str, #поисковая строка
+    text: Optional[str], #поисковая строка (может быть None, если переданы jobs)
     pages: int = 1, #сколько страниц пройти (у hh нумерация с 0)
     per_page: int = 50, #сколько вакансий на странице (обычно от 10 до 100)
     area: Optional[int] = None, #необязательный id региона
     cache_ttl: int = 60, #время жизни кэша запросов в минутах
-    cache_name: str = ".cache/http_cache_bs_async.sqlite", #путь к файлу кэша
+    cache_name: str = DEFAULT_CACHE_NAME, #путь к файлу кэша (общий с sync, см. httpcache.py)
     cookies_file: Optional[str] = None, #путь к файлу с куки
-    concurrency: int = 8, #максимум одновременных запросов к сайту
+    concurrency: int = DEFAULT_CONCURRENCY, #максимум одновременных запросов к сайту
+    prefetch: int = DEFAULT_PREFETCH, #на сколько страниц списка качать вперед
+    parse_workers: int = 0, #сколько процессов выделить под разбор html (0 - разбирать в event loop)
+    parser_backend: str = DEFAULT_PARSER_BACKEND, #движок извлечения полей из html (bs4, lxml, stream)
+    dim_cache_size: int = DEFAULT_DIM_CACHE_SIZE, #размер кэша справочников (0 - без кэша)
+    incremental: bool = False, #качать детальные страницы только для новых/изменившихся вакансий
+    rate: float = DEFAULT_RATE, #целевая частота запросов к сайту, запр/сек
+    jobs: Optional[List[SearchJob]] = None, #пакетный режим: список заданий (запрос, регион) вместо text/area
+    resume: bool = False, #продолжить прерванный обход с сохраненного места (crawl_state/crawl_items)
+    archive_path: Optional[str] = None, #путь к архиву html (None - не архивировать)
+    sink_spec: str = DEFAULT_SINK, #куда писать вакансии (см. sinks.py)
+    flush_interval: float = DEFAULT_FLUSH_INTERVAL, #не дольше скольких секунд записи ждут коммита
+    http_options: Optional[HttpOptions] = None, #пул соединений, таймауты, HTTP/2 (см. async_http.py)
+    cache_max_mb: float = DEFAULT_HTTP_CACHE_MAX_MB, #предел размера http-кэша, МБ
+    split: Optional[str] = None, #делить не помещающиеся в выдачу запросы на подзапросы по этим фасетам (см. planner.py)
 ):
-    http = await get_http_session_async(cache_name, cache_ttl, cookies_file) #создаем асинхронную http-сессия с кэшем
+    jobs = jobs or [SearchJob(text, area)]
+    job_pages: dict = {} #сколько страниц у подзапросов --split (у остальных заданий - pages)
+    http = await get_http_session_async(cache_name, cache_ttl, cookies_file, http_options, cache_max_mb) #создаем асинхронную http-сессия с кэшем
     engine = create_engine(db_url, future = True) #подключаемся к БД
-    Base.metadata.create_all(engine) #создаем таблицы при первом запуске
-    
-    total = 0
-    sem = asyncio.Semaphore(concurrency) #ограничиваем число одновременных запросов
-    
-    async with http: #открываем транзакцию
-        for p in range(pages): #цикл по страницам
-            #1) страница списка
-            list_html = await http_get_async(http, SEARCH_URL, {
-                "text": text, "page": p, "items_on_page": per_page, "area": area
-            }) #извлекаем html текущей страницы поиска
-
-            briefs = parse_list_page(list_html) #парсим список карточек вакансий
-            if not briefs: #если пусто выходим
-                break
-
-            #2) асинхронная загрузка деталей вакансии
-            async def fetch(brief: VacancyBrief):
-                async with sem:
-                    return await fetch_vacancy_detail_async(http, brief)
-
-            #для каждой вакансии создаем asyncio.Task, которая скачивает ее детальную страницу   
-            tasks = [asyncio.create_task(fetch(br)) for br in briefs]
-            #отбираем результаты (если какая-то страница не загрузилась, программа не падает - ошибки сохраняются в result в виде Exception)
-            results = await asyncio.gather(*tasks, return_exceptions = True)
-
-            #3) запись в БД (синхронно)
-            with Session(engine) as sess:
-                for res in results:
-                    if isinstance(res, Exception):
-                        continue
-                    brief, html = res
-                    det = parse_vacancy_detail(html, brief.url, brief) #детальный парсинг каждой вакансии
-                    upsert_vacancy(sess, det)  #сохраняем (обновляем) в БД, включая работодателя, регион, навыки
-                    total += 1
-                sess.commit() #фиксация изменения
+    init_db(engine) #создаем таблицы (и недостающие индексы) при первом запуске
 
-        print(f"Сохранено вакансий (async HTTP): {total}")
+    parser = HtmlParser(parse_workers, parser_backend) #пул процессов для BeautifulSoup (или разбор на месте)
+    cache = DimensionCache(dim_cache_size)
+    c = Crawl(http, parser, AdaptiveRateLimiter(rate), engine, incremental, HtmlArchive(archive_path) if archive_path else None,
+               open_sinks(sink_spec, cache))
+    c.skip_unchanged = all(s.name == "db" for s in c.sink.sinks) #файловым приемникам нужна каждая запись
+
+    with Session(engine) as sess:
+        cache.warm(sess) #прогрев кэша справочников из БД
+    start = time.perf_counter()
 
+    async with http: #открываем сессию
+        try:
+            if split: #запросы, не помещающиеся в выдачу hh, делим на подзапросы (первые страницы уровня - одновременно)
+                sem = asyncio.Semaphore(concurrency)
+                plan = await QueryPlanner(parse_facets(split), per_page, pages).run_async(
+                    jobs, lambda job: _count_found(c, job, per_page, sem))
+                plan.report()
+                jobs, job_pages = plan.jobs, plan.pages
+            with Session(engine) as sess:
+                if resume: #продолжаем: хвост прошлого запуска + страницы после сохраненной
+                    checkpoint.rearm_failed(sess, jobs)
+                    items = checkpoint.load_items(sess, jobs)
+                    first_pages = {job: checkpoint.start_page(sess, job) for job in jobs}
+                else: #новый обход: прогресс прошлых запусков этих заданий забываем
+                    checkpoint.reset(sess, jobs)
+                    items, first_pages = [], {}
+                sess.commit()
+            if resume:
+                print(f"Продолжение обхода: в хвосте {len(items)} вакансий, страницы: "
+                      + ", ".join(f"{j.key} - {'пройдено' if p is None else p}" for j, p in first_pages.items()))
+            c.writer = DbWriter(engine, c.sink, cache, per_page, flush_interval) #запись - пачками по странице или по времени
 
+            total, failures = await run_pass(
+                c, lambda tasks: _produce_briefs(c, tasks, jobs, first_pages, items, pages, per_page, max(1, prefetch), job_pages),
+                concurrency,
+            )
+            #повторные проходы по не скачавшимся страницам (у каждой не больше checkpoint.MAX_ATTEMPTS попыток)
+            while failures:
+                with Session(engine) as sess:
+                    retry = checkpoint.load_items(sess, jobs, only_failed = True)
+                if not retry:
+                    break
+                print(f"Повторный проход: {len(retry)} вакансий не скачались")
+                saved, failures = await run_pass(c, lambda tasks: produce_items(c, tasks, retry), concurrency)
+                total += saved
+        finally:
+            parser.close()
+            if c.writer is not None:
+                await c.writer.close() #фиксирует остаток, если обход прервался
+            c.sink.close()
+            if c.archive is not None:
+                await asyncio.to_thread(c.archive.flush)
+
+        with Session(engine) as sess:
+            left = len(checkpoint.load_items(sess, jobs))
+            gone = checkpoint.count_gone(sess, jobs)
+        print(f"Сохранено вакансий (async HTTP): {total}")
+        if len(jobs) > 1:
+            print(f"Запросов: {len(jobs)}, карточек в выдаче: {c.cards}, уникальных вакансий: {len(c.seen)} "
+                  f"(повторов между запросами: {c.cards - len(c.seen)})")
+        if incremental:
+            print(f"Пропущено без изменений (детальные страницы не качали): {c.skipped}")
+        if c.unchanged:
+            print(f"Страница вакансии не изменилась (разбор и запись пропущены): {c.unchanged}")
+        if gone:
+            print(f"Удалены с сайта (404/410, не повторялись): {gone}")
+        if left:
+            print(f"Не удалось скачать: {left} вакансий (остались в crawl_items, повторятся при --resume)")
+        parser.timings.report(time.perf_counter() - start, parse_workers)
+        cache.report()
+        c.sink.report()
+        if c.archive is not None:
+            c.archive.report()
+            c.archive.close()
+        http.cache.report()
+        print(f"Лимитер: итоговая частота {c.limiter.rate:.2f} запр/с, просьб притормозить (429/503): {c.limiter.throttled}, "
+              f"срабатываний предохранителя: {c.limiter.breaker.trips}")
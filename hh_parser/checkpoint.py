@@ -0,0 +1,119 @@
+#checkpoint.py
+#контрольные точки долгого обхода: если обход упал на 22-й странице из 30 (обрыв сети, кончились повторы в http_get, kill),
+#с --resume он продолжается с места остановки, а не со страницы 0.
+#В БД хранится:
+#- crawl_state: для каждого задания (запрос, регион) последняя обработанная страница списка и признак конца выдачи
+#- crawl_items: карточки, детальные страницы которых еще не сохранены - стоящие в очереди (pending),
+#  не скачавшиеся (failed) и удаленные с сайта (gone: 404/410, такие не повторяются). Строка удаляется в той же транзакции, в которой сохраняется вакансия,
+#  поэтому после падения в crawl_items остается ровно то, что не успели записать
+#Не скачавшиеся страницы повторяются отдельными проходами в конце обхода (до MAX_ATTEMPTS раз)
+from __future__ import annotations
+from typing import Iterable, List, Optional
+
+from sqlalchemy import select, delete, update, func, tuple_
+from sqlalchemy.orm import Session
+
+from .errors import GoneError
+from .jobs import SearchJob
+from .models import CrawlState, CrawlItem
+from .schemas import VacancyBrief
+from .upsert import insert_missing
+
+MAX_ATTEMPTS = 3 #сколько раз пробуем скачать детальную страницу, прежде чем оставить ее до следующего --resume
+
+#ключ задания в таблицах (NULL в уникальном индексе не работает, поэтому "без региона" - это 0).
+#Подзапросы планировщика (--split) ведутся отдельно: у каждого свой прогресс по страницам
+def _key(job: SearchJob)->tuple[str, int]:
+    return job.query, job.area or 0
+
+def _job_filter(cols, jobs: Iterable[SearchJob]):
+    return tuple_(*cols).in_([_key(j) for j in jobs])
+
+def _get_state(sess: Session, job: SearchJob)->Optional[CrawlState]:
+    query, area = _key(job)
+    return sess.execute(
+        select(CrawlState).where(CrawlState.query == query, CrawlState.area == area)
+    ).scalar_one_or_none()
+
+#строка прогресса задания. Вставка через ON CONFLICT DO NOTHING: задание могут одновременно вести несколько
+#процессов (coordinator.py), и обычный INSERT у второго упал бы на уникальном индексе
+def _ensure_state(sess: Session, job: SearchJob)->CrawlState:
+    st = _get_state(sess, job)
+    if st is None:
+        query, area = _key(job)
+        insert_missing(sess, CrawlState, [{"query": query, "area": area, "last_page": -1, "finished": False}])
+        st = _get_state(sess, job)
+    return st
+
+#новый обход без --resume: забываем прогресс и хвосты прошлых запусков этих заданий
+def reset(sess: Session, jobs: List[SearchJob]):
+    sess.execute(delete(CrawlState).where(_job_filter((CrawlState.query, CrawlState.area), jobs)))
+    sess.execute(delete(CrawlItem).where(_job_filter((CrawlItem.query, CrawlItem.area), jobs)))
+
+#с какой страницы продолжать задание (None - выдача уже пройдена до конца)
+def start_page(sess: Session, job: SearchJob)->Optional[int]:
+    st = _get_state(sess, job)
+    if st is None:
+        return 0
+    return None if st.finished else st.last_page + 1
+
+#страница списка обработана: ее карточки поставлены в очередь (pending), прогресс сдвигается на page
+def mark_page(sess: Session, job: SearchJob, page: int, briefs: List[VacancyBrief]):
+    query, area = _key(job)
+    ids = [br.vacancy_id for br in briefs]
+    known = set(sess.execute(select(CrawlItem.vacancy_id).where(CrawlItem.vacancy_id.in_(ids))).scalars()) if ids else set()
+    #уже известные карточки пропускаем (и здесь, и на уровне БД - ее мог только что вставить соседний процесс)
+    insert_missing(sess, CrawlItem, [dict(
+        vacancy_id = br.vacancy_id, query = query, area = area, name = br.name, url = br.url,
+        employer_name = br.employer_name, area_name = br.area_name, published_at_text = br.published_at_text,
+        employer_id = br.employer_id, area_id = br.area_id, status = "pending", attempts = 0,
+    ) for br in briefs if br.vacancy_id not in known])
+    st = _ensure_state(sess, job)
+    st.last_page = max(st.last_page, page)
+
+#выдача задания закончилась (пришла пустая страница)
+def mark_finished(sess: Session, job: SearchJob):
+    _ensure_state(sess, job).finished = True
+
+#вакансии сохранены - убираем их из хвоста (вызывать в той же транзакции, что и запись вакансий)
+def mark_done(sess: Session, vacancy_ids: List[int]):
+    if vacancy_ids:
+        sess.execute(delete(CrawlItem).where(CrawlItem.vacancy_id.in_(vacancy_ids)))
+
+#детальная страница не скачалась (или не разобралась) - оставляем ее на повтор.
+#Удаленная вакансия (GoneError) получает статус gone и больше не повторяется
+def mark_failed(sess: Session, brief: VacancyBrief, error: BaseException):
+    status = "gone" if isinstance(error, GoneError) else "failed"
+    sess.execute(
+        update(CrawlItem).where(CrawlItem.vacancy_id == brief.vacancy_id)
+        .values(status = status, attempts = CrawlItem.attempts + 1, error = repr(error)[:512])
+    )
+
+#сколько вакансий заданий оказались удалены с сайта
+def count_gone(sess: Session, jobs: List[SearchJob])->int:
+    return sess.execute(
+        select(func.count()).select_from(CrawlItem)
+        .where(_job_filter((CrawlItem.query, CrawlItem.area), jobs), CrawlItem.status == "gone")
+    ).scalar_one()
+
+#хвост заданий: карточки из crawl_items вместе с заданием, которое их нашло.
+#only_failed - только не скачавшиеся и еще не исчерпавшие MAX_ATTEMPTS (для повторных проходов)
+def load_items(sess: Session, jobs: List[SearchJob], only_failed: bool = False)->List[tuple[VacancyBrief, SearchJob]]:
+    by_key = {_key(j): j for j in jobs}
+    stmt = (select(CrawlItem).where(_job_filter((CrawlItem.query, CrawlItem.area), jobs), CrawlItem.status != "gone")
+            .order_by(CrawlItem.vacancy_id))
+    if only_failed:
+        stmt = stmt.where(CrawlItem.status == "failed", CrawlItem.attempts < MAX_ATTEMPTS)
+    return [
+        (VacancyBrief(it.vacancy_id, it.name, it.url, it.employer_name, it.area_name, it.published_at_text,
+                      it.employer_id, it.area_id),
+         by_key[(it.query, it.area)])
+        for it in sess.execute(stmt).scalars()
+    ]
+
+#--resume: не скачавшиеся в прошлых запусках страницы снова получают MAX_ATTEMPTS попыток
+def rearm_failed(sess: Session, jobs: List[SearchJob]):
+    sess.execute(
+        update(CrawlItem).where(_job_filter((CrawlItem.query, CrawlItem.area), jobs), CrawlItem.status == "failed")
+        .values(attempts = 0)
+    )
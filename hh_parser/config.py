@@ -1,9 +1,10 @@
+import os
 from datetime import timedelta
 
 #-------------------------------------------
 # Константы
 #--------------------------------------------
-SEARCH_URL = "https://hh.ru/search/vacancy"
+SEARCH_URL = os.environ.get("HH_SEARCH_URL", "https://hh.ru/search/vacancy") #переопределяется для локального стенда (bench/server.py)
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; HHParserBot/1.0; +https://example.com/bot)",
@@ -12,6 +13,28 @@ HEADERS = {
 
 DEFAULT_CACHE_NAME = ".cache/http_cache_bs"
 DEFAULT_CACHE_TTL_MIN = 60
+DEFAULT_HTTP_CACHE_MAX_MB = 512 #предел размера http-кэша (сжатые тела ответов), МБ; 0 - без ограничения
 DEFAULT_DB_URL = "sqlite:///hh_bs.sqlite3"
 DEFAULT_PER_PAGE = 50
+SEARCH_RESULTS_CAP = 2000 #сколько вакансий hh отдает по одному запросу: дальше страницы выдачи пустые, хотя счетчик показывает больше
+SPLIT_FACETS = ("date", "experience", "schedule", "employment") #по чему планировщик делит запросы (--split, см. planner.py)
+DEFAULT_SPLIT = ",".join(SPLIT_FACETS) #порядок фасетов по умолчанию: сначала окна даты публикации, потом фильтры hh
 
+PARSER_BACKENDS = ("bs4", "lxml", "stream") #движки извлечения полей из html (см. parsing.py)
+DEFAULT_PARSER_BACKEND = "bs4" #движок извлечения полей из html (bs4, lxml, stream)
+DEFAULT_DIM_CACHE_SIZE = 50_000 #сколько имен каждого справочника (работодатели, регионы, навыки) держать в памяти
+DEFAULT_RATE = 5.0 #целевая частота запросов к сайту (запр/сек на весь процесс)
+DEFAULT_PREFETCH = 2 #на сколько страниц поиска async-конвейер качает список вперед
+DEFAULT_FLUSH_INTERVAL = 1.0 #async: не дольше скольких секунд записи ждут коммита, если пачка еще не набралась
+DEFAULT_SINK = "db" #куда писать вакансии (--sink): db, ndjson:ФАЙЛ, parquet:ФАЙЛ, arrow:ФАЙЛ через запятую
+DEFAULT_UNIT_PAGES = 5 #coordinator: сколько страниц списка в одной единице работы
+DEFAULT_LEASE_SECONDS = 120 #coordinator: срок аренды единицы работы воркером, сек
+DEFAULT_ARCHIVE_PATH = ".cache/html_archive.sqlite" #архив html для повторного разбора (--archive, reparse)
+DEFAULT_CONCURRENCY = 8 #async: максимум одновременных запросов к сайту
+#пул соединений async-клиента (см. HttpOptions в async_http.py)
+DEFAULT_CONN_LIMIT = 100 #всего открытых соединений (0 - без ограничения)
+DEFAULT_LIMIT_PER_HOST = 0 #соединений к одному хосту (0 - без ограничения, фактически их не больше concurrency)
+DEFAULT_KEEPALIVE = 30.0 #сколько секунд держать простаивающее соединение открытым (0 - закрывать после ответа)
+DEFAULT_DNS_TTL = 300 #сколько секунд помнить адрес хоста (0 - резолвить каждый раз)
+DEFAULT_TIMEOUT = 30.0 #таймаут запроса целиком, сек
+DEFAULT_CONNECT_TIMEOUT = 10.0 #таймаут установки TCP-соединения, сек (ожидание свободного соединения в пуле входит в DEFAULT_TIMEOUT)
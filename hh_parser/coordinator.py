@@ -0,0 +1,342 @@
+#coordinator.py
+#распределенный обход: большой набор заданий (запросы x регионы x страницы) делится на единицы работы,
+#которые разбирают воркеры - несколько процессов на одной машине или на разных машинах с общей БД.
+#Очередь единиц - таблица work_units в той же БД, куда пишутся вакансии (см. models.WorkUnit):
+#- plan раскладывает задания на единицы по --unit-pages страниц списка (повторный plan ничего не дублирует)
+#- воркер берет свободную единицу в аренду на --lease секунд и продлевает аренду, пока работает.
+#  Если воркер умер, аренда истекает и единицу забирает другой (но не больше MAX_UNIT_ATTEMPTS раз - дальше failed)
+#- захват единицы - условный UPDATE по (id, attempts): из двух воркеров, выбравших одну единицу, ее получит один
+#- когда в выдаче задания пришла пустая страница, следующие единицы этого задания помечаются skipped
+#Вакансии всех воркеров сливаются в одну таблицу без дублей: запись идет через upsert по vacancy_id,
+#справочники и служебные таблицы вставляются с ON CONFLICT DO NOTHING.
+#Для нескольких машин нужна общая БД (PostgreSQL); SQLite подходит для нескольких процессов на одной машине.
+#
+#python -m hh_parser.coordinator plan --db URL --jobs jobs.txt --pages 40 [--unit-pages 5]
+#python -m hh_parser.coordinator work --db URL [--processes 4] [--rate 2]   (на каждой машине)
+#python -m hh_parser.coordinator status --db URL
+from __future__ import annotations
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import create_engine, select, update, func, or_, and_
+from sqlalchemy.orm import Session
+
+from . import checkpoint
+from .async_http import HttpOptions, get_http_session_async
+from .async_pipeline import Crawl, run_pass, produce_job, produce_items
+from .config import (
+    DEFAULT_DB_URL, DEFAULT_CACHE_NAME, DEFAULT_CACHE_TTL_MIN, DEFAULT_PER_PAGE, DEFAULT_PREFETCH, DEFAULT_PARSER_BACKEND,
+    DEFAULT_DIM_CACHE_SIZE, DEFAULT_RATE, DEFAULT_UNIT_PAGES, DEFAULT_LEASE_SECONDS, DEFAULT_CONCURRENCY,
+    DEFAULT_CONN_LIMIT, DEFAULT_LIMIT_PER_HOST, DEFAULT_KEEPALIVE, DEFAULT_DNS_TTL, DEFAULT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_HTTP_CACHE_MAX_MB,
+)
+from .dimcache import DimensionCache
+from .jobs import SearchJob, load_jobs
+from .models import WorkUnit, init_db
+from .parse_pool import HtmlParser
+from .parsing import PARSER_BACKENDS
+from .ratelimit import AdaptiveRateLimiter
+from .sinks import open_sinks
+from .upsert import insert_missing
+from .writer import DbWriter
+
+MAX_UNIT_ATTEMPTS = 3 #сколько раз единицу можно взять в работу (воркер упал, аренда истекла), прежде чем она станет failed
+WRITER_RESTARTS = 3 #сколько раз подряд пересоздавать упавший поток записи в БД, прежде чем остановить воркер
+
+#взятая в аренду единица работы
+@dataclass(frozen=True)
+class Lease:
+    id: int
+    job: SearchJob
+    page_from: int
+    page_to: int
+    attempts: int
+
+#SQLite под несколькими процессами: WAL (читатели не ждут писателя) и долгое ожидание блокировки вместо "database is locked"
+def make_engine(db_url: str):
+    if db_url.startswith("sqlite"):
+        engine = create_engine(db_url, future = True, connect_args = {"timeout": 60})
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        return engine
+    return create_engine(db_url, future = True)
+
+def _owner()->str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+#--------------------------------очередь единиц--------------------------------
+#раскладывает задания на единицы по unit_pages страниц. Возвращает, сколько единиц в плане по этим заданиям
+def plan(engine, jobs: List[SearchJob], pages: int, unit_pages: int = DEFAULT_UNIT_PAGES)->int:
+    unit_pages = max(1, unit_pages)
+    rows = [{"query": job.text, "area": job.area or 0, "page_from": p, "page_to": min(p + unit_pages, pages),
+             "status": "pending", "attempts": 0, "saved": 0}
+            for job in jobs for p in range(0, pages, unit_pages)]
+    with Session(engine) as sess:
+        insert_missing(sess, WorkUnit, rows) #уже запланированные единицы не трогаем
+        sess.commit()
+    return len(rows)
+
+#берет в аренду свободную единицу или единицу с истекшей арендой (None - работы не осталось)
+def lease(engine, owner: str, lease_seconds: float)->Optional[Lease]:
+    with Session(engine) as sess:
+        while True:
+            now = time.time()
+            row = sess.execute(
+                select(WorkUnit.id, WorkUnit.query, WorkUnit.area, WorkUnit.page_from, WorkUnit.page_to, WorkUnit.attempts)
+                .where(or_(WorkUnit.status == "pending", and_(WorkUnit.status == "leased", WorkUnit.lease_until < now)))
+                .order_by(WorkUnit.id).limit(1)
+            ).first()
+            if row is None:
+                return None
+            if row.attempts >= MAX_UNIT_ATTEMPTS: #брошенная слишком много раз - дальше не пытаемся
+                sess.execute(update(WorkUnit).where(WorkUnit.id == row.id, WorkUnit.attempts == row.attempts)
+                             .values(status = "failed", owner = None, lease_until = None,
+                                     error = "аренда истекла у всех попыток (воркер падал или завис)"))
+                sess.commit()
+                continue
+            #attempts работает как версия строки: если единицу успел взять другой воркер, условие не выполнится
+            got = sess.execute(
+                update(WorkUnit).where(WorkUnit.id == row.id, WorkUnit.attempts == row.attempts)
+                .values(status = "leased", owner = owner, lease_until = now + lease_seconds, attempts = row.attempts + 1)
+            ).rowcount
+            sess.commit()
+            if got:
+                return Lease(row.id, SearchJob(row.query, row.area or None), row.page_from, row.page_to, row.attempts + 1)
+
+#продлевает аренду. False - единицу уже забрал другой воркер (наша аренда истекла)
+def renew(engine, unit: Lease, owner: str, lease_seconds: float)->bool:
+    with Session(engine) as sess:
+        got = sess.execute(
+            update(WorkUnit).where(WorkUnit.id == unit.id, WorkUnit.owner == owner, WorkUnit.status == "leased")
+            .values(lease_until = time.time() + lease_seconds)
+        ).rowcount
+        sess.commit()
+    return bool(got)
+
+#единица пройдена. exhausted - выдача задания закончилась, следующие единицы задания не нужны
+def complete(engine, unit: Lease, owner: str, saved: int, exhausted: bool):
+    with Session(engine) as sess:
+        sess.execute(
+            update(WorkUnit).where(WorkUnit.id == unit.id, WorkUnit.owner == owner)
+            .values(status = "done", lease_until = None, saved = saved, error = None)
+        )
+        if exhausted:
+            sess.execute(
+                update(WorkUnit).where(WorkUnit.query == unit.job.text, WorkUnit.area == (unit.job.area or 0),
+                                       WorkUnit.page_from > unit.page_from, WorkUnit.status == "pending")
+                .values(status = "skipped", error = f"выдача закончилась до страницы {unit.page_to}")
+            )
+        sess.commit()
+
+#единица не пройдена: возвращаем ее в очередь (или failed, если попытки кончились)
+def release(engine, unit: Lease, owner: str, error: BaseException):
+    with Session(engine) as sess:
+        sess.execute(
+            update(WorkUnit).where(WorkUnit.id == unit.id, WorkUnit.owner == owner)
+            .values(status = "failed" if unit.attempts >= MAX_UNIT_ATTEMPTS else "pending",
+                    owner = None, lease_until = None, error = repr(error)[:512])
+        )
+        sess.commit()
+
+def status(engine):
+    with Session(engine) as sess:
+        rows = sess.execute(
+            select(WorkUnit.status, func.count(), func.coalesce(func.sum(WorkUnit.saved), 0))
+            .group_by(WorkUnit.status).order_by(WorkUnit.status)
+        ).all()
+        owners = sess.execute(
+            select(WorkUnit.owner, WorkUnit.query, WorkUnit.area, WorkUnit.page_from, WorkUnit.page_to, WorkUnit.lease_until)
+            .where(WorkUnit.status == "leased").order_by(WorkUnit.owner)
+        ).all()
+    if not rows:
+        print("Единиц работы нет (сначала plan)")
+        return
+    print("Единицы работы: " + ", ".join(f"{st} {n}" for st, n, _ in rows)
+          + f"; сохранено вакансий: {sum(saved for _, _, saved in rows)}")
+    now = time.time()
+    for owner, query, area, p_from, p_to, until in owners:
+        print(f"  {owner}: {SearchJob(query, area or None).key}, страницы {p_from}-{p_to - 1}, "
+              + (f"аренда еще {until - now:.0f} сек" if until > now else "аренда истекла"))
+
+#--------------------------------воркер--------------------------------
+#продлевает аренду, пока единица в работе
+async def _heartbeat(engine, unit: Lease, owner: str, lease_seconds: float):
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        if not await asyncio.to_thread(renew, engine, unit, owner, lease_seconds):
+            print(f"Аренда единицы {unit.id} потеряна (ее забрал другой воркер) - дубли не появятся, но работа повторится")
+            return
+
+#одна единица: страницы [page_from, page_to) задания через общий конвейер async_pipeline. Возвращает (сохранено, выдача закончилась)
+async def _run_unit(c: Crawl, unit: Lease, per_page: int, concurrency: int, prefetch: int)->tuple[int, bool]:
+    exhausted = False
+
+    async def produce(tasks):
+        nonlocal exhausted
+        exhausted = await produce_job(c, tasks, unit.job, unit.page_from, unit.page_to, per_page, prefetch)
+
+    saved, _ = await run_pass(c, produce, concurrency)
+    return saved, exhausted
+
+async def work_async(
+    db_url: str,
+    owner: Optional[str] = None, #имя воркера в work_units (по умолчанию хост:pid)
+    lease_seconds: float = DEFAULT_LEASE_SECONDS, #срок аренды единицы (продлевается каждую треть срока)
+    per_page: int = DEFAULT_PER_PAGE,
+    cache_ttl: int = DEFAULT_CACHE_TTL_MIN,
+    cache_name: str = DEFAULT_CACHE_NAME,
+    cookies_file: Optional[str] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    prefetch: int = DEFAULT_PREFETCH,
+    parse_workers: int = 0,
+    parser_backend: str = DEFAULT_PARSER_BACKEND,
+    dim_cache_size: int = DEFAULT_DIM_CACHE_SIZE,
+    rate: float = DEFAULT_RATE, #частота запросов этого воркера (у каждого процесса свой лимитер)
+    http_options: Optional[HttpOptions] = None, #пул соединений, таймауты, HTTP/2 (см. async_http.py)
+    cache_max_mb: float = DEFAULT_HTTP_CACHE_MAX_MB, #предел размера http-кэша (файл общий для всех процессов)
+)->int:
+    owner = owner or _owner()
+    engine = make_engine(db_url)
+    init_db(engine)
+    http = await get_http_session_async(cache_name, cache_ttl, cookies_file, http_options, cache_max_mb)
+    parser = HtmlParser(parse_workers, parser_backend)
+    cache = DimensionCache(dim_cache_size)
+    with Session(engine) as sess:
+        cache.warm(sess)
+    c = Crawl(http, parser, AdaptiveRateLimiter(rate), engine, sink = open_sinks("db", cache), skip_unchanged = True)
+    c.writer = DbWriter(engine, c.sink, cache, per_page)
+    total, units, jobs = 0, 0, set()
+    restarts = 0 #перезапуски потока записи подряд (сбрасываются пройденной единицей)
+    start = time.perf_counter()
+
+    async with http:
+        try:
+            while (unit := await asyncio.to_thread(lease, engine, owner, lease_seconds)) is not None:
+                jobs.add(unit.job)
+                hb = asyncio.create_task(_heartbeat(engine, unit, owner, lease_seconds))
+                try:
+                    saved, exhausted = await _run_unit(c, unit, per_page, concurrency, prefetch)
+                except Exception as e: #единица вернется в очередь, воркер берет следующую
+                    print(f"[{owner}] единица {unit.id} ({unit.job.key}, страницы {unit.page_from}-{unit.page_to - 1}) не пройдена: {e!r}")
+                    await asyncio.to_thread(release, engine, unit, owner, e)
+                    #упавший поток записи (например, "database is locked" при нескольких процессах на одном SQLite) сам не оживет:
+                    #с ним сразу упала бы каждая следующая единица, и воркер прогнал бы всю очередь до failed, ничего не скачав.
+                    #Поэтому поток пересоздается, а если запись не восстанавливается - воркер останавливается
+                    if c.writer.error is not None:
+                        restarts += 1
+                        if restarts > WRITER_RESTARTS:
+                            print(f"[{owner}] запись в БД не восстановилась после {WRITER_RESTARTS} перезапусков - воркер останавливается")
+                            raise
+                        print(f"[{owner}] поток записи в БД упал ({c.writer.error!r}), перезапуск {restarts}/{WRITER_RESTARTS}")
+                        await c.writer.close()
+                        cache.rollback() #id из незафиксированной транзакции упавшего потока в кэш не попадут
+                        c.writer, c.saved = DbWriter(engine, c.sink, cache, per_page), 0 #счетчик нового потока - с нуля
+                    continue
+                finally:
+                    hb.cancel()
+                await asyncio.to_thread(complete, engine, unit, owner, saved, exhausted)
+                restarts = 0
+                total += saved
+                units += 1
+                print(f"[{owner}] {unit.job.key}, страницы {unit.page_from}-{unit.page_to - 1}: сохранено {saved}")
+
+            #единицы кончились - повторяем не скачавшиеся детальные страницы своих заданий
+            #(если то же делает соседний воркер, страница скачается дважды, но запишется один раз)
+            while jobs:
+                with Session(engine) as sess:
+                    retry = checkpoint.load_items(sess, list(jobs), only_failed = True)
+                if not retry:
+                    break
+                print(f"[{owner}] повторный проход: {len(retry)} вакансий не скачались")
+                saved, _ = await run_pass(c, lambda tasks: produce_items(c, tasks, retry), concurrency)
+                total += saved
+        finally:
+            parser.close()
+            await c.writer.close()
+            c.sink.close()
+
+    print(f"[{owner}] единиц пройдено: {units}, сохранено вакансий: {total} (страница не изменилась: {c.unchanged}) "
+          f"за {time.perf_counter() - start:.1f} сек, частота лимитера {c.limiter.rate:.2f} запр/с")
+    http.cache.report()
+    return total
+
+#точка входа дочернего процесса. Файл http-кэша у всех процессов общий (WAL, см. httpcache.py):
+#страница, скачанная одним воркером, - попадание для остальных
+def _work_process(index: int, kwargs: dict):
+    asyncio.run(work_async(**kwargs))
+
+def work(processes: int = 1, **kwargs):
+    if processes <= 1:
+        return asyncio.run(work_async(**kwargs))
+    procs = [multiprocessing.Process(target = _work_process, args = (i, kwargs), name = f"hh-worker-{i}") for i in range(processes)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Распределенный обход hh.ru: очередь единиц работы в общей БД")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_plan = sub.add_parser("plan", help="Разложить задания на единицы работы")
+    p_plan.add_argument("--db", default=DEFAULT_DB_URL)
+    p_plan.add_argument("--text", help="Поисковый запрос (если нет --jobs)")
+    p_plan.add_argument("--area", type=int)
+    p_plan.add_argument("--jobs", help="Файл заданий: строки 'запрос;регион1,регион2' или JSON (как у hh_parser.main)")
+    p_plan.add_argument("--pages", type=int, default=1, help="Сколько страниц списка пройти в каждом задании")
+    p_plan.add_argument("--unit-pages", type=int, default=DEFAULT_UNIT_PAGES, help="Сколько страниц списка в одной единице работы")
+
+    p_work = sub.add_parser("work", help="Разбирать единицы работы, пока они не кончатся")
+    p_work.add_argument("--db", dest="db_url", default=DEFAULT_DB_URL)
+    p_work.add_argument("--processes", type=int, default=1, help="Сколько процессов-воркеров запустить на этой машине")
+    p_work.add_argument("--lease", dest="lease_seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="Срок аренды единицы, сек: после падения воркера единицу заберет другой не раньше этого")
+    p_work.add_argument("--per-page", type=int, default=DEFAULT_PER_PAGE)
+    p_work.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Частота запросов одного процесса, запр/сек")
+    p_work.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Одновременных запросов в одном процессе")
+    p_work.add_argument("--conn-limit", type=int, default=DEFAULT_CONN_LIMIT, help="Всего открытых соединений (0 - без ограничения)")
+    p_work.add_argument("--limit-per-host", type=int, default=DEFAULT_LIMIT_PER_HOST, help="Соединений к одному хосту (0 - без ограничения)")
+    p_work.add_argument("--keepalive", type=float, default=DEFAULT_KEEPALIVE, help="Сколько секунд держать простаивающее соединение")
+    p_work.add_argument("--dns-ttl", type=int, default=DEFAULT_DNS_TTL, help="Сколько секунд помнить адрес хоста")
+    p_work.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Таймаут запроса целиком, сек")
+    p_work.add_argument("--connect-timeout", type=float, default=DEFAULT_CONNECT_TIMEOUT, help="Таймаут установки соединения, сек")
+    p_work.add_argument("--http2", action="store_true", help="HTTP/2 через httpx (pip install 'httpx[http2]')")
+    p_work.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH)
+    p_work.add_argument("--cache-ttl", type=int, default=DEFAULT_CACHE_TTL_MIN)
+    p_work.add_argument("--cache-name", default=DEFAULT_CACHE_NAME)
+    p_work.add_argument("--cache-max-mb", type=float, default=DEFAULT_HTTP_CACHE_MAX_MB, help="Предел размера http-кэша, МБ (0 - без ограничения)")
+    p_work.add_argument("--cookies-file")
+    p_work.add_argument("--parser", dest="parser_backend", choices=PARSER_BACKENDS, default=DEFAULT_PARSER_BACKEND)
+    p_work.add_argument("--parse-workers", type=int, default=0)
+    p_work.add_argument("--dim-cache-size", type=int, default=DEFAULT_DIM_CACHE_SIZE)
+
+    p_status = sub.add_parser("status", help="Сколько единиц в каком состоянии и кто что держит")
+    p_status.add_argument("--db", default=DEFAULT_DB_URL)
+
+    args = parser.parse_args()
+    if args.command == "plan":
+        if not args.text and not args.jobs:
+            p_plan.error("нужно указать --text или --jobs")
+        jobs = load_jobs(args.jobs) if args.jobs else [SearchJob(args.text, args.area)]
+        engine = make_engine(args.db)
+        init_db(engine)
+        n = plan(engine, jobs, args.pages, args.unit_pages)
+        print(f"Заданий: {len(jobs)}, единиц работы: {n} (по {args.unit_pages} стр.)")
+        status(engine)
+    elif args.command == "work":
+        kwargs = vars(args)
+        kwargs.pop("command")
+        kwargs["http_options"] = HttpOptions(*(kwargs.pop(k) for k in (
+            "conn_limit", "limit_per_host", "keepalive", "dns_ttl", "timeout", "connect_timeout", "http2")))
+        work(**kwargs)
+    else:
+        status(make_engine(args.db))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#dimcache.py
+#кэш справочников (работодатели, регионы, навыки) на все время обхода.
+#Одни и те же "Python", "SQL", "Москва" повторяются тысячи раз, поэтому вместо запроса к БД на каждое имя
+#держим в памяти соответствие имя -> id. Кэш прогревается из БД при старте и ограничен по размеру (LRU).
+#
+#Корректность при нескольких процессах, пишущих в одну БД:
+#- в кэш попадают только пары имя -> id, которые уже есть в БД. Строки справочников не удаляются и не переименовываются,
+#  поэтому такая пара не может "протухнуть", даже если ее записал другой процесс
+#- id, полученные внутри еще не зафиксированной транзакции, лежат отдельно (pending) и переносятся в кэш только после commit.
+#  При rollback они выбрасываются, чтобы в кэше не остались id строк, которых в БД так и не появилось
+#- при промахе имя всегда ищется в БД, а после вставки недостающих строк id перечитываются,
+#  так что строка, которую успел вставить соседний процесс, тоже будет найдена
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Iterable
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from .models import Employer, Area, Skill
+
+#LRU-словарь имя -> id для одного справочника со счетчиками попаданий/промахов
+class LruIdCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, name):
+        id_ = self.data.get(name)
+        if id_ is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.data.move_to_end(name) #недавно использованные уходят в конец, вытесняются самые старые
+        return id_
+
+    def put(self, name, id_):
+        if self.maxsize <= 0:
+            return
+        self.data[name] = id_
+        self.data.move_to_end(name)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+#набор кэшей для всех справочников + буфер id из незафиксированной транзакции
+class DimensionCache:
+    def __init__(self, maxsize: int = 50_000):
+        self.maxsize = maxsize
+        self.employers = LruIdCache(maxsize)
+        self.areas = LruIdCache(maxsize)
+        self.skills = LruIdCache(maxsize)
+        self.pending: list[tuple[LruIdCache, str, object]] = []
+
+    #ищет имена в кэше: возвращает найденные {name: id} и множество имен, которые надо искать в БД
+    def lookup(self, kind: LruIdCache, names: Iterable[str])->tuple[dict, set]:
+        found, missing = {}, set()
+        for n in names:
+            id_ = kind.get(n)
+            if id_ is None:
+                missing.add(n)
+            else:
+                found[n] = id_
+        return found, missing
+
+    #запоминает id, прочитанные из БД в текущей транзакции (в кэш они попадут после commit)
+    def remember(self, kind: LruIdCache, pairs: dict):
+        self.pending.extend((kind, n, id_) for n, id_ in pairs.items())
+
+    def commit(self):
+        for kind, n, id_ in self.pending:
+            kind.put(n, id_)
+        self.pending.clear()
+
+    def rollback(self):
+        self.pending.clear()
+
+    #привязывает кэш к сессии: commit/rollback сессии переносят или выбрасывают pending
+    def attach(self, sess: Session)->"DimensionCache":
+        event.listen(sess, "after_commit", lambda s: self.commit())
+        event.listen(sess, "after_soft_rollback", lambda s, prev: self.rollback())
+        return self
+
+    #прогрев из БД: загружаем до maxsize записей каждого справочника
+    def warm(self, sess: Session)->"DimensionCache":
+        if self.maxsize <= 0:
+            return self
+        for kind, key_col, id_col in (
+            (self.employers, Employer.id, Employer.id), #у работодателя ключ кэша - сам id (см. ids.py)
+            (self.areas, Area.name, Area.id),
+            (self.skills, Skill.name, Skill.id),
+        ):
+            for name, id_ in sess.execute(select(key_col, id_col).limit(self.maxsize)):
+                kind.put(name, id_)
+        return self
+
+    def report(self):
+        parts = []
+        for title, kind in (("работодатели", self.employers), ("регионы", self.areas), ("навыки", self.skills)):
+            total = kind.hits + kind.misses
+            ratio = kind.hits / total * 100 if total else 0
+            parts.append(f"{title} {kind.hits}/{total} ({ratio:.0f}%, в кэше {len(kind)})")
+        print("Кэш справочников, попаданий: " + ", ".join(parts))
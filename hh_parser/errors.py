@@ -0,0 +1,23 @@
+#errors.py
+#классификация ошибок http: какие стоит повторять, а какие нет.
+#Раньше любой статус 4xx/5xx после raise_for_status повторялся 5 раз с экспоненциальной паузой,
+#и каждая удаленная вакансия (404) съедала несколько секунд ожидания, а волна капчи/бана (403) получала еще больше запросов.
+#Теперь повторяются только временные сбои: таймауты, обрывы соединения, 429 и 5xx.
+#404/410 - вакансия удалена (GoneError), такие страницы не повторяются вовсе
+from __future__ import annotations
+
+GONE_STATUSES = frozenset((404, 410)) #вакансия снята с публикации или удалена
+
+#статус, при котором имеет смысл повторить запрос позже
+def is_transient_status(status: int)->bool:
+    return status == 429 or status >= 500
+
+#статус, который говорит о проблеме на стороне сайта или о блокировке (учитывается предохранителем)
+def is_error_status(status: int)->bool:
+    return is_transient_status(status) or status == 403
+
+class GoneError(Exception):
+    def __init__(self, url: str, status: int):
+        super().__init__(f"{status} {url}")
+        self.url = url
+        self.status = status
@@ -1,43 +1,160 @@
-from datetime import timedelta
-import time
+import json
+import http.cookiejar as cookiejar
+from pathlib import Path
 import requests
-import requests_cache
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+import time
 #tenacity нужно для добавления повторных попыток при выполнении http-запроса (т.к. операция не стабильная)
-from tenacity import retry, stop_after_attempt, wait_exponential_jitter 
-from .config import HEADERS
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+from .config import HEADERS, DEFAULT_HTTP_CACHE_MAX_MB, DEFAULT_CACHE_NAME
+from . import metrics
+from .httpcache import CachedResponse, HttpCache
+from .errors import GONE_STATUSES, GoneError, is_transient_status
+from .ratelimit import AdaptiveRateLimiter, get_default_limiter
+
+#сессия requests с общим http-кэшем (см. httpcache.py): GET сначала ищется в кэше, успешный ответ сохраняется.
+#Тот же файл кэша читает и пишет async-клиент, так что страница, скачанная одним режимом, - попадание для другого.
+#По протухшей записи запрос уходит с If-None-Match / If-Modified-Since; на 304 отдается тело из кэша
+#с from_cache=False (запрос к сайту был) и not_modified=True.
+#before_send вызывается перед каждым реальным запросом к сайту (ответ из кэша его не вызывает) - там http_get берет токен лимитера
+class CachedHttpSession(requests.Session):
+    def __init__(self, cache: HttpCache):
+        super().__init__()
+        self.cache = cache
+
+    def get(self, url, params=None, before_send=None, **kwargs)->requests.Response:
+        entry = self.cache.get(url, params)
+        if entry is not None and entry.fresh:
+            return _cached_response(entry, True)
+        if entry is not None:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **entry.validators()}
+        if before_send:
+            before_send()
+        resp = super().get(url, params=params, **kwargs)
+        if resp.status_code == 304 and entry is not None:
+            self.cache.refresh(url, params, entry)
+            return _cached_response(entry, False, True)
+        resp.from_cache = False
+        resp.not_modified = False
+        self.cache.put(url, params, resp.status_code, resp.headers, resp.content)
+        return resp
+
+    def close(self):
+        super().close()
+        self.cache.close()
+
+#ответ из кэша в виде requests.Response (text, content, headers, raise_for_status работают как обычно)
+def _cached_response(entry: CachedResponse, from_cache: bool, not_modified: bool = False)->requests.Response:
+    r = requests.Response()
+    r.status_code = entry.status
+    r.reason = "OK"
+    r.url = entry.url
+    r.headers = CaseInsensitiveDict(entry.headers)
+    r.encoding = get_encoding_from_headers(r.headers)
+    r._content = entry.body
+    r.from_cache = from_cache
+    r.not_modified = not_modified
+    return r
 
 #данная функция создает и настраивает http-сессию с кэшем.Без кэша
 #каждый раз при парсинге скрипт отправляет запросы на сайт. Если страниц много, то
 #это нагружает сервер, замедляет работу, может привести к блокировке по ip
 #в данном случае делается один реальный запрос, а далее читаются данные из локального кэша.
 #Следовательно эконмится трафик и ускоряется обработка
-def get_http_session(cache_name: str = ".cache/http_cache", cache_ttl_minutes: int = 60)->requests.Session:
+#Кэш - у самой сессии, а не install_cache, который подменял requests во всем процессе.
+#Сессию можно использовать из нескольких потоков (--workers): кэш потокобезопасен,
+#а пул соединений рассчитан на pool_size одновременных запросов (иначе лишние соединения закрываются после ответа)
+def get_http_session(cache_name: str = DEFAULT_CACHE_NAME, cache_ttl_minutes: int = 60, cookies_file: str | None = None,
+                     pool_size: int = DEFAULT_POOLSIZE, cache_max_mb: float = DEFAULT_HTTP_CACHE_MAX_MB)->CachedHttpSession:
     """
-    Возвращает request Session с кэшированием (requests_cache)
+    Возвращает request Session с кэшированием (httpcache.HttpCache)
     cache_ttl_minutes - время жизни кэша
+    cache_max_mb - предел размера кэша
     """
-    requests_cache.install_cache(cache_name = cache_name, expire_after = timedelta(minutes=cache_ttl_minutes)) #создаем файл кэша
-    #создаем http-сессию (этот объект хранит cookie, заголовки и настройки между запросами, а также переиспользует соединение)
-    s = requests.Session() 
+    #создаем http-сессию с файлом кэша (этот объект хранит cookie, заголовки и настройки между запросами, а также переиспользует соединение)
+    s = CachedHttpSession(HttpCache(cache_name, cache_ttl_minutes * 60, cache_max_mb))
+    adapter = HTTPAdapter(pool_maxsize = max(pool_size, DEFAULT_POOLSIZE))
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
     #добавляем стандартные заголовки
     s.headers.update(HEADERS)
+    #если указан файл с куки - загружаем их, чтобы парсер работал в залогиненном состоянии
+    if cookies_file:
+        load_cookies_from_file(s, cookies_file)
 
     return s
 
-#отвечает за паузу между запросами
-def safe_sleep(resp):
-    #проверяем, если данные из кэша, то паузу не делаем, если запрос реальный - то пауза 0.4 сек
-    if not getattr(resp, "from_cache", False): time.sleep(0.4)  
+#загружает cookies из файла в сессию (JSON-массив [{name, value, domain, path, ...}] или Netscape cookies.txt)
+def load_cookies_from_file(session: requests.Session, path: str, default_domain: str = ".hh.ru"):
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"Cookies file not found: {path}")
+
+    text = p.read_text(encoding="utf-8", errors="ignore").lstrip()
+    if text.startswith("["): #JSON формат
+        data = json.loads(text)
+        for c in data:
+            session.cookies.set(c.get("name"), c.get("value", ""), domain=c.get("domain") or default_domain, path=c.get("path", "/"))
+        print(f"Загружено {len(data)} cookies в формате JSON: {path}")
+        return
+
+    cj = cookiejar.MozillaCookieJar() #Netscape формат
+    try:
+        cj.load(str(p), ignore_expires=True, ignore_discard=True)
+    except cookiejar.LoadError:
+        raise ValueError(f"Не удалось прочитать файл с куки: {path}")
+    session.cookies.update(cj)
+    print(f"Загружено {len(cj)} cookies в формате Netscape: {path}")
+
+#повторяем только временные сбои: таймауты, обрывы соединения, 429 и 5xx.
+#404/410 (GoneError), 403 и прочие 4xx сразу уходят наверх
+def is_transient(exc: BaseException)->bool:
+    if isinstance(exc, (requests.Timeout, requests.ConnectionError)):
+        return True
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return is_transient_status(exc.response.status_code)
+    return False
+
+#считает повторы http_get в метриках (stage берется из аргументов вызова)
+def _count_retry(retry_state):
+    metrics.get().inc("http_retries", 1, retry_state.kwargs.get("stage", "http"))
 
 #отвечает за выполнение http-запроса
-#этот декоратор для безопасных повторов. Делает до 5 попыток, если запрос завершился с ошибкой
-@retry(wait=wait_exponential_jitter(initial=0.5, max=4), stop=stop_after_attempt(5)) 
-def http_get(session: requests.Session, url: str, params: dict | None = None)->requests.Response:
-    resp = session.get(url, params=params, timeout=30) #выполнение запроса с таймаутом 30 сек
+#этот декоратор для безопасных повторов. Делает до 5 попыток, если запрос завершился временной ошибкой (см. is_transient)
+@retry(retry=retry_if_exception(is_transient), wait=wait_exponential_jitter(multiplier=0.5, max=4), stop=stop_after_attempt(5),
+       before_sleep=_count_retry, reraise=True)
+def http_get(session: requests.Session, url: str, params: dict | None = None,
+             limiter: AdaptiveRateLimiter | None = None, *, stage: str = "http")->requests.Response:
+    limiter = limiter or get_default_limiter()
+    limiter.wait_pause() #если сервер просил подождать (Retry-After) - ждем
+    t0 = time.perf_counter()
+    #каждый реальный запрос (и каждый повтор) сначала берет токен общего лимитера (см. ratelimit.py): так частоту держат
+    #и первые запросы --workers потоков, и повторы. Ответы из кэша токен не тратят
+    def acquire():
+        nonlocal t0
+        limiter.acquire()
+        t0 = time.perf_counter() #ожидание токена в задержку ответа не входит (оно в метрике ratelimit_wait)
+    try:
+        if isinstance(session, CachedHttpSession):
+            resp = session.get(url, params=params, timeout=30, before_send=acquire) #выполнение запроса с таймаутом 30 сек
+        else: #сессия без кэша - каждый запрос реальный
+            acquire()
+            resp = session.get(url, params=params, timeout=30)
+    except requests.RequestException:
+        limiter.on_error() #таймаут или обрыв - учитывает предохранитель
+        raise
+    m = metrics.get()
+    if m.enabled: #stage - "list" или "detail", чтобы в метриках разделить страницы поиска и вакансий
+        m.http_response(stage, time.perf_counter() - t0, getattr(resp, "from_cache", False), len(resp.content),
+                        getattr(resp, "not_modified", False))
+    if not getattr(resp, "from_cache", False): #по реальному ответу лимитер подстраивает частоту (429/503 - тормозим)
+        limiter.on_response(resp.status_code, resp.headers.get("Retry-After"))
+    if resp.status_code in GONE_STATUSES: #вакансия удалена - повторять бессмысленно
+        raise GoneError(url, resp.status_code)
     #проверка кода ответа.
-    #если статус не 200, то выбрасываем исключение и декоратор @retry автоматически сделает новую попытку
+    #если статус не 200, то выбрасываем исключение, и декоратор @retry повторит запрос, если ошибка временная
     resp.raise_for_status()
-    #пауза, если ответ не из кэша
-    safe_sleep(resp)
     
     return resp
\ No newline at end of file
@@ -0,0 +1,225 @@
+#httpcache.py
+#общий http-кэш синхронного (requests) и асинхронного (aiohttp/httpx) клиентов.
+#Раньше sync кэшировал через requests_cache в .cache/http_cache_bs, а async - через aiohttp_client_cache
+#в отдельный файл другого формата: страница, скачанная одним режимом, для другого была промахом,
+#а несколько обходов на одном файле упирались в блокировки SQLite.
+#Теперь кэш один:
+#- ключ - sha1 нормализованного адреса: параметры из url и params сливаются и сортируются, пустые (area=None)
+#  и метки переходов (hhtmFrom, utm_*) отбрасываются, схема и хост - в нижнем регистре
+#- SQLite в режиме WAL: читатели не ждут писателя, несколько процессов и потоков пишут в один файл
+#  (короткие транзакции, busy_timeout вместо ошибки "database is locked")
+#- хранятся только ответы 200, тело сжато zlib; срок жизни - --cache-ttl
+#- протухший ответ не выбрасывается: вместе с ним хранятся валидаторы (ETag, Last-Modified), и запрос уходит
+#  условным (If-None-Match / If-Modified-Since). Ответ 304 без тела продлевает запись - страница не качается заново
+#- размер ограничен (--cache-max-mb): при превышении удаляются давно не читавшиеся ответы
+#- счетчики попаданий/промахов за запуск печатаются в конце обхода
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .config import DEFAULT_HTTP_CACHE_MAX_MB
+
+NOISE_PARAMS = {"hhtmFrom", "hhtmFromLabel"} #метки, откуда пришел переход - на содержимое страницы не влияют
+NOISE_PREFIXES = ("utm_",)
+#заголовки, которые описывают передачу, а не тело (тело в кэше уже распаковано)
+SKIP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive", "set-cookie"}
+BUSY_TIMEOUT_MS = 30_000 #сколько ждать, пока другой процесс допишет свою транзакцию
+TOUCH_INTERVAL = 60 #время последнего чтения обновляется не чаще раза в минуту (каждое попадание не превращается в запись)
+CHECK_EVERY = 200 #раз в сколько записей сверять размер с файлом (в него пишут и другие процессы)
+EVICT_TO = 0.9 #вытеснение освобождает место до 90% лимита, чтобы не запускаться на каждой записи
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS http_responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_http_responses_accessed ON http_responses (accessed);
+"""
+
+def _noise(name: str)->bool:
+    return name in NOISE_PARAMS or name.startswith(NOISE_PREFIXES)
+
+#адрес запроса в каноническом виде: одинаковые запросы дают одну строку, как бы ни были переданы параметры
+def normalize_url(url: str, params: Optional[dict] = None)->str:
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if not _noise(k)]
+    for k, v in (params or {}).items():
+        if v is None or v == "" or _noise(k):
+            continue
+        for item in (v if isinstance(v, (list, tuple)) else (v,)):
+            query.append((k, str(item)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", urlencode(sorted(query)), ""))
+
+def cache_key(url: str, params: Optional[dict] = None)->str:
+    return hashlib.sha1(normalize_url(url, params).encode("utf-8")).hexdigest()
+
+#путь к файлу кэша: --cache-name без расширения (как было у requests_cache) получает .sqlite
+def cache_path(cache_name: str)->str:
+    return cache_name if cache_name.endswith((".sqlite", ".sqlite3", ".db")) else cache_name + ".sqlite"
+
+#колонки, добавленные после первой версии таблицы (в старые файлы кэша дописываются при открытии)
+_ADDED_COLUMNS = {"etag": "TEXT", "last_modified": "TEXT"}
+
+#ответ из кэша. fresh=False - срок жизни вышел, ответ можно только подтвердить условным запросом
+@dataclass
+class CachedResponse:
+    url: str
+    status: int
+    headers: dict
+    body: bytes
+    fresh: bool = True
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    #заголовки условного запроса (пусто, если сервер не прислал валидаторов)
+    def validators(self)->dict:
+        h = {}
+        if self.etag:
+            h["If-None-Match"] = self.etag
+        if self.last_modified:
+            h["If-Modified-Since"] = self.last_modified
+        return h
+
+class HttpCache:
+    def __init__(self, cache_name: str, ttl_seconds: float, max_mb: float = DEFAULT_HTTP_CACHE_MAX_MB):
+        self.path = cache_path(cache_name)
+        self.ttl = ttl_seconds
+        self.max_bytes = int(max_mb * 2**20) if max_mb > 0 else 0 #0 - без ограничения
+        self.enabled = ttl_seconds > 0 #--cache-ttl 0 отключает кэш
+        self.hits = self.misses = self.stores = self.evicted = 0
+        self.stale = 0 #протухшие записи, по которым ушел запрос (условный, если есть валидаторы)
+        self.not_modified = 0 #из них подтверждены ответом 304
+        self.bytes_saved = 0 #тела, которые не пришлось качать благодаря 304
+        self._lock = threading.Lock() #одно соединение на все потоки (--workers, asyncio.to_thread)
+        self._size = 0 #примерный размер тел в файле, байт
+        self._puts = 0
+        self.conn: Optional[sqlite3.Connection] = None
+        if self.enabled:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            #isolation_level=None - каждая запись фиксируется сразу, блокировка на файл держится миллисекунды
+            self.conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False)
+            self.conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL") #кэш можно потерять при сбое питания, зато запись без fsync
+            self.conn.executescript(_SCHEMA)
+            existing = {row[1] for row in self.conn.execute("PRAGMA table_info(http_responses)")}
+            for col, type_ in _ADDED_COLUMNS.items():
+                if col not in existing:
+                    self.conn.execute(f"ALTER TABLE http_responses ADD COLUMN {col} {type_}")
+            self._size = self._disk_size()
+
+    def _disk_size(self)->int:
+        size, = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_responses").fetchone()
+        return size
+
+    #запись кэша: свежая (fresh=True) отдается без запроса, протухшая - для условного запроса. None - промах
+    def get(self, url: str, params: Optional[dict] = None)->Optional[CachedResponse]:
+        if not self.enabled:
+            return None
+        key = cache_key(url, params)
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT url, status, headers, body, accessed, created, etag, last_modified FROM http_responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            fresh = row[5] > now - self.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale += 1
+            if fresh and now - row[4] > TOUCH_INTERVAL:
+                self.conn.execute("UPDATE http_responses SET accessed = ? WHERE key = ?", (now, key))
+        return CachedResponse(row[0], row[1], json.loads(row[2]), zlib.decompress(row[3]), fresh, row[6], row[7])
+
+    #304 на условный запрос: запись снова свежая, тело остается прежним
+    def refresh(self, url: str, params: Optional[dict], entry: CachedResponse):
+        now = time.time()
+        with self._lock:
+            self.conn.execute("UPDATE http_responses SET created = ?, accessed = ? WHERE key = ?", (now, now, cache_key(url, params)))
+            self.not_modified += 1
+            self.bytes_saved += len(entry.body)
+
+    #сохраняет успешный ответ (ошибки и удаленные вакансии не кэшируются - их нужно перепроверять)
+    def put(self, url: str, params: Optional[dict], status: int, headers, body: bytes):
+        if not self.enabled or status != 200:
+            return
+        key = cache_key(url, params)
+        data = zlib.compress(body, 6)
+        hdrs = {k: v for k, v in headers.items() if k.lower() not in SKIP_HEADERS}
+        lower = {k.lower(): v for k, v in hdrs.items()}
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO http_responses (key, url, status, headers, body, size, created, accessed, etag, last_modified)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, normalize_url(url, params), status, json.dumps(hdrs, ensure_ascii=False), data, len(data), now, now,
+                 lower.get("etag"), lower.get("last-modified")),
+            )
+            self.stores += 1
+            self._size += len(data)
+            self._puts += 1
+            if self._puts % CHECK_EVERY == 0:
+                self._size = self._disk_size()
+            if self.max_bytes and self._size > self.max_bytes:
+                self._evict()
+
+    #вытеснение: удаляются давно не читавшиеся ответы, пока размер не станет меньше EVICT_TO лимита.
+    #Протухшие записи не удаляются сразу - по ним идут условные запросы
+    def _evict(self):
+        before, = self.conn.execute("SELECT COUNT(*) FROM http_responses").fetchone()
+        self._size = self._disk_size()
+        target = int(self.max_bytes * EVICT_TO)
+        if self._size > target:
+            #порог по времени чтения: самая свежая запись, после удаления которой (и всех более старых) размер уложится в лимит
+            row = self.conn.execute(
+                "SELECT accessed FROM (SELECT accessed, SUM(size) OVER (ORDER BY accessed DESC) AS kept FROM http_responses)"
+                " WHERE kept > ? ORDER BY accessed DESC LIMIT 1",
+                (target,),
+            ).fetchone()
+            if row is not None:
+                self.conn.execute("DELETE FROM http_responses WHERE accessed <= ?", (row[0],))
+            self._size = self._disk_size()
+        after, = self.conn.execute("SELECT COUNT(*) FROM http_responses").fetchone()
+        self.evicted += before - after
+
+    def stats(self)->dict:
+        return {"hits": self.hits, "stale": self.stale, "not_modified": self.not_modified, "bytes_saved": self.bytes_saved,
+                "misses": self.misses, "stores": self.stores, "evicted": self.evicted, "size_bytes": self._size}
+
+    def report(self):
+        if self.ttl <= 0:
+            return
+        lookups = self.hits + self.stale + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0
+        limit = f" из {self.max_bytes / 2**20:.0f}" if self.max_bytes else ""
+        revalidated = (f", протухших {self.stale} (304 - {self.not_modified}, не скачано {self.bytes_saved / 2**20:.1f} МБ)"
+                       if self.stale else "")
+        print(f"HTTP-кэш: попаданий {self.hits} из {lookups} ({rate:.0f}%){revalidated}, записано {self.stores}, "
+              f"вытеснено {self.evicted}, размер {self._size / 2**20:.1f}{limit} МБ ({self.path})")
+
+    def close(self):
+        if self.conn is not None:
+            with self._lock:
+                self.conn.close()
+                self.conn = None
+                self.enabled = False
@@ -0,0 +1,46 @@
+#ids.py
+#устойчивые id справочников. Раньше id региона считался как abs(hash(name)) % 10**9, а hash строк в Python
+#случаен в каждом процессе (PYTHONHASHSEED): один и тот же город получал новый id в каждом запуске и у каждого воркера.
+#Id работодателя был его названием.
+#Теперь:
+#- работодатель: id с hh из ссылки /employer/<id> (есть и в карточке списка, и на странице вакансии),
+#  если ссылки нет - "n" + sha1 названия (не пересекается с числовыми id hh)
+#- регион: id с hh, если он есть в ссылке (?area=<id>), иначе sha1 названия в диапазоне [HASHED_AREA_BASE, 2 * HASHED_AREA_BASE)
+#  (id регионов hh намного меньше, так что пересечений нет, и все умещается в 32-битный INTEGER PostgreSQL)
+#Одинаковые входные данные дают одинаковый id в любом процессе и на любой машине
+from __future__ import annotations
+import hashlib
+import re
+from typing import Optional
+
+EMPLOYER_ID_RE = re.compile(r"/employer/(\d+)")
+AREA_ID_RE = re.compile(r"[?&]area=(\d+)")
+HASHED_AREA_BASE = 10**9
+
+#хэш берется от названия как есть: натуральный ключ справочников - точное название
+def _sha1(name: str)->bytes:
+    return hashlib.sha1(name.encode("utf-8")).digest()
+
+#id работодателя с hh из ссылки (None, если ссылки нет или она не на работодателя)
+def hh_employer_id(href: Optional[str])->Optional[str]:
+    m = EMPLOYER_ID_RE.search(href) if href else None
+    return m.group(1) if m else None
+
+def hh_area_id(href: Optional[str])->Optional[int]:
+    m = AREA_ID_RE.search(href) if href else None
+    return int(m.group(1)) if m else None
+
+#ключ работодателя в таблице employers
+def employer_key(name: Optional[str], hh_id: Optional[str] = None)->Optional[str]:
+    if hh_id:
+        return hh_id
+    if not name:
+        return None
+    return "n" + _sha1(name).hex()[:31]
+
+#id нового региона: с hh, если известен, иначе устойчивый хэш названия.
+#probe > 0 - следующий кандидат, если хэш совпал с id другого региона (при тысячах регионов это редкость, но возможно)
+def area_id(name: str, hh_id: Optional[int] = None, probe: int = 0)->int:
+    if hh_id is not None and not probe:
+        return hh_id
+    return HASHED_AREA_BASE + (int.from_bytes(_sha1(name)[:8], "big") + probe) % HASHED_AREA_BASE
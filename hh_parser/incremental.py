@@ -0,0 +1,40 @@
+#incremental.py
+#инкрементальный обход (--incremental): детальные страницы качаются только для новых или изменившихся вакансий.
+#Карточка из списка (id, название, работодатель, текст даты) сворачивается в отпечаток (VacancyBrief.fingerprint),
+#который сохраняется вместе с вакансией. На каждой странице списка одним запросом по индексу vacancy_id
+#достаем сохраненные отпечатки и пропускаем карточки, у которых он не изменился.
+#Без --incremental детальные страницы качаются (для большинства это 304 или попадание в http-кэш), но если
+#и карточка, и сама страница (detail_hash) те же, что у сохраненной записи, разбор и запись пропускаются
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import Vacancy
+from .parsing import page_hash
+from .schemas import VacancyBrief
+
+#возвращает карточки, для которых нужно качать детальную страницу (новые или изменившиеся)
+def filter_changed(sess: Session, briefs: List[VacancyBrief])->List[VacancyBrief]:
+    if not briefs:
+        return []
+    stored = dict(sess.execute(
+        select(Vacancy.vacancy_id, Vacancy.list_fingerprint)
+        .where(Vacancy.vacancy_id.in_([br.vacancy_id for br in briefs]))
+    ).all())
+    return [br for br in briefs if stored.get(br.vacancy_id) != br.fingerprint()]
+
+#сохраненные отпечатки карточки и страницы для карточек списка: vacancy_id -> (list_fingerprint, detail_hash)
+def stored_hashes(sess: Session, briefs: List[VacancyBrief])->Dict[int, Tuple[str, str]]:
+    if not briefs:
+        return {}
+    rows = sess.execute(
+        select(Vacancy.vacancy_id, Vacancy.list_fingerprint, Vacancy.detail_hash)
+        .where(Vacancy.vacancy_id.in_([br.vacancy_id for br in briefs]), Vacancy.detail_hash.is_not(None))
+    ).all()
+    return {v_id: (fp, h) for v_id, fp, h in rows}
+
+#скачанная страница совпадает с той, из которой разобрана сохраненная запись (stored - из stored_hashes)
+def unchanged(stored: Optional[Tuple[str, str]], brief: VacancyBrief, html: str)->bool:
+    return stored is not None and stored == (brief.fingerprint(), page_hash(html))
@@ -0,0 +1,68 @@
+#jobs.py
+#описание поисковых заданий для пакетного режима (--jobs): один процесс обходит сразу много пар (запрос, регион)
+#на общей http-сессии и одном подключении к БД
+from __future__ import annotations
+import json
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+@dataclass(frozen=True)
+class SearchJob:
+    text: str #поисковая строка
+    area: Optional[int] = None #id региона (None - без ограничения по региону)
+    filters: Tuple[Tuple[str, str], ...] = () #доп. параметры поиска подзапроса (experience, date_from, ...), см. planner.py
+
+    #строка задания в служебных таблицах (crawl_state, crawl_items): у подзапроса к тексту дописываются его фильтры
+    @property
+    def query(self)->str:
+        return f"{self.text} [{'&'.join(f'{k}={v}' for k, v in self.filters)}]" if self.filters else self.text
+
+    #ключ задания (для логов и для таблицы совпадений vacancy_queries)
+    @property
+    def key(self)->str:
+        return f"{self.query} [area={self.area}]" if self.area is not None else self.query
+
+    #подзапрос с дополнительными (или замененными) фильтрами; None убирает фильтр
+    def refine(self, **params)->"SearchJob":
+        filters = dict(self.filters)
+        filters.update(params)
+        return replace(self, filters=tuple((k, v) for k, v in filters.items() if v is not None))
+
+    #параметры поиска hh без пустых значений (aiohttp не умеет передавать None)
+    def search_params(self, page: int, per_page: int)->dict:
+        params = {"text": self.text, "page": page, "items_on_page": per_page, "area": self.area, **dict(self.filters)}
+        return {k: v for k, v in params.items() if v is not None}
+
+def _areas(value)->List[Optional[int]]:
+    if value is None or value == "":
+        return [None]
+    if isinstance(value, (list, tuple)):
+        return [int(a) for a in value] or [None]
+    return [int(a) for a in str(value).split(",") if a.strip()] or [None]
+
+#читает файл заданий. Поддерживаются два формата:
+#1) JSON-массив [{"text": "Python", "areas": [1, 2]}, {"text": "SQL", "area": 1}, ...]
+#2) текст: по заданию на строку "запрос;регион1,регион2" (регионы необязательны, # - комментарий)
+#регионы раскрываются в отдельные задания, повторяющиеся задания выкидываются
+def load_jobs(path: str)->List[SearchJob]:
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"Jobs file not found: {path}")
+    text = p.read_text(encoding="utf-8").lstrip("\ufeff").strip()
+
+    jobs: List[SearchJob] = []
+    if text.startswith("["):
+        for item in json.loads(text):
+            for area in _areas(item.get("areas", item.get("area"))):
+                jobs.append(SearchJob(item["text"], area))
+    else:
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            query, _, areas = line.partition(";")
+            for area in _areas(areas.strip()):
+                jobs.append(SearchJob(query.strip(), area))
+
+    return list(dict.fromkeys(jobs)) #убираем дубли, сохраняя порядок
@@ -1,27 +1,90 @@
 import argparse
-from .config import DEFAULT_DB_URL, DEFAULT_CACHE_NAME, DEFAULT_CACHE_TTL_MIN, DEFAULT_PER_PAGE
-from .pipeline import crawl_and_store
+from .config import DEFAULT_DB_URL, DEFAULT_CACHE_NAME, DEFAULT_CACHE_TTL_MIN, DEFAULT_PER_PAGE, DEFAULT_PREFETCH, DEFAULT_FLUSH_INTERVAL, DEFAULT_PARSER_BACKEND, DEFAULT_ARCHIVE_PATH, DEFAULT_SINK, DEFAULT_DIM_CACHE_SIZE, DEFAULT_RATE
+from .config import DEFAULT_CONCURRENCY, DEFAULT_CONN_LIMIT, DEFAULT_LIMIT_PER_HOST, DEFAULT_KEEPALIVE, DEFAULT_DNS_TTL, DEFAULT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT
+from .config import PARSER_BACKENDS, DEFAULT_HTTP_CACHE_MAX_MB, DEFAULT_SPLIT, SPLIT_FACETS, SEARCH_RESULTS_CAP
+#на уровне модуля - только argparse и config: SQLAlchemy, requests/aiohttp, bs4 и прочее импортируются
+#после разбора аргументов и только для выбранного режима (--help и ошибки в аргументах обходятся без них,
+#async-запуск не грузит requests, sync - aiohttp). Время старта: python -m bench.run --only startup
 
 import time
 
 def main():
     parser = argparse.ArgumentParser(description="HTML-парсер вакансий hh.ru (BeautifulSoup)")
-    parser.add_argument("--text", required=True, help="Поисковый запрос (например, 'ML Engineer')") #поисковый запрос (обязательное поле)
+    parser.add_argument("--text", help="Поисковый запрос (например, 'ML Engineer')") #поисковый запрос (обязательное поле, если нет --jobs)
     parser.add_argument("--area", type=int, help="ID региона (например, 1 - Москва, 2 - СПБ и тд)") #id региона
     parser.add_argument("--pages", type=int, default=1, help="Количество страниц") #кол-во страниц для парсинга
     parser.add_argument("--per-page", type=int, default=DEFAULT_PER_PAGE) #кол-во вакансий на странице
     parser.add_argument("--db", default=DEFAULT_DB_URL) #строка подключения к БД
     parser.add_argument("--cache-ttl", type=int, default=DEFAULT_CACHE_TTL_MIN) #срок жизни кэша запросов (в мин)
     parser.add_argument("--cache-name", default=DEFAULT_CACHE_NAME)
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_HTTP_CACHE_MAX_MB,
+                        help="Предел размера http-кэша, МБ: при превышении вытесняются давно не читавшиеся ответы (0 - без ограничения)")
     parser.add_argument("--cookies-file", help="Путь к cookies.txt (для аутентификации)")
+    parser.add_argument("--jobs", help="Файл заданий для пакетного режима: строки 'запрос;регион1,регион2' или JSON (всегда async)")
+    parser.add_argument("--split", nargs="?", const=DEFAULT_SPLIT, default=None,
+                        help=f"Делить запрос, который не помещается в выдачу hh (больше {SEARCH_RESULTS_CAP} вакансий по счетчику), "
+                             f"на подзапросы по фасетам через запятую: {', '.join(SPLIT_FACETS)} (по умолчанию {DEFAULT_SPLIT}). "
+                             f"Страниц в подзапросе - по счетчику, --pages - только для страниц без счетчика")
     parser.add_argument("--async", dest="use_async", action = "store_true", help = "Асинхронная загрузка деталей вакансий")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help="Целевая частота запросов к сайту, запр/сек (при 429/503 снижается и потом восстанавливается)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Продолжить прерванный обход с сохраненной страницы и докачать не скачавшиеся вакансии")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Качать детальные страницы только для новых или изменившихся вакансий")
+    parser.add_argument("--dim-cache-size", type=int, default=DEFAULT_DIM_CACHE_SIZE,
+                        help="Сколько имен работодателей/регионов/навыков держать в памяти (0 - без кэша)")
+    parser.add_argument("--parser", dest="parser_backend", choices=PARSER_BACKENDS, default=DEFAULT_PARSER_BACKEND,
+                        help="Движок извлечения полей: bs4 (BeautifulSoup), lxml, stream (потоковый html.parser)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Сколько потоков качают детальные страницы без --async (1 - по одной; для сред, где нельзя asyncio)")
+    parser.add_argument("--parse-workers", type=int, default=0, help="Сколько процессов выделить под разбор html (только --async, 0 - в event loop)")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH, help="На сколько страниц списка качать вперед (только --async)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Максимум одновременных запросов к сайту (только --async)")
+    #пул соединений async-клиента
+    parser.add_argument("--conn-limit", type=int, default=DEFAULT_CONN_LIMIT, help="Всего открытых соединений (только --async, 0 - без ограничения)")
+    parser.add_argument("--limit-per-host", type=int, default=DEFAULT_LIMIT_PER_HOST,
+                        help="Соединений к одному хосту (только --async, 0 - без ограничения)")
+    parser.add_argument("--keepalive", type=float, default=DEFAULT_KEEPALIVE,
+                        help="Сколько секунд держать простаивающее соединение открытым (только --async, 0 - закрывать после ответа)")
+    parser.add_argument("--dns-ttl", type=int, default=DEFAULT_DNS_TTL, help="Сколько секунд помнить адрес хоста (только --async, 0 - без кэша DNS)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Таймаут запроса целиком, сек (только --async)")
+    parser.add_argument("--connect-timeout", type=float, default=DEFAULT_CONNECT_TIMEOUT, help="Таймаут установки соединения, сек (только --async)")
+    parser.add_argument("--http2", action="store_true",
+                        help="HTTP/2 через httpx: все запросы по одному соединению (только --async, pip install 'httpx[http2]')")
+    parser.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL,
+                        help="Не дольше скольких секунд записи ждут коммита в БД, если пачка еще не набралась (только --async)")
+    parser.add_argument("--sink", default=DEFAULT_SINK,
+                        help="Куда писать вакансии, через запятую: db, ndjson:ФАЙЛ[.gz], parquet:ФАЙЛ, arrow:ФАЙЛ (parquet/arrow - нужен pyarrow)")
+    parser.add_argument("--archive", nargs="?", const=DEFAULT_ARCHIVE_PATH, default=None,
+                        help=f"Сохранять скачанные страницы в сжатый архив для повторного разбора (по умолчанию {DEFAULT_ARCHIVE_PATH})")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Собирать метрики по стадиям (сеть, лимитер, разбор, запись в БД) и напечатать сводку")
+    parser.add_argument("--metrics-out", help="Записать метрики в файл: *.json - JSON, иначе текстовый формат Prometheus")
     args = parser.parse_args()
+    if not args.text and not args.jobs:
+        parser.error("нужно указать --text или --jobs")
+    from .sinks import parse_sink_spec
+    try:
+        parse_sink_spec(args.sink)
+        if args.split:
+            from .planner import parse_facets
+            parse_facets(args.split)
+    except ValueError as e:
+        parser.error(str(e))
+
+    m = None
+    if args.metrics or args.metrics_out: #без флагов метрики выключены и почти ничего не стоят
+        from . import metrics
+        m = metrics.enable()
 
     start = time.time() #запоминаем текущее время
 
-    if args.use_async:
+    if args.use_async or args.jobs: #пакетный режим работает на общей асинхронной сессии
         import asyncio
+        from .async_http import HttpOptions
         from .async_pipeline import crawl_and_store_async
+        from .jobs import load_jobs
         asyncio.run(crawl_and_store_async(
             db_url = args.db, 
             text = args.text, 
@@ -30,10 +93,26 @@ def main():
             area = args.area,
             cache_ttl = args.cache_ttl,
             cache_name = args.cache_name,
+            cache_max_mb = args.cache_max_mb,
             cookies_file = args.cookies_file,
-            concurrency = 8,
+            concurrency = args.concurrency,
+            prefetch = args.prefetch,
+            flush_interval = args.flush_interval,
+            parse_workers = args.parse_workers,
+            parser_backend = args.parser_backend,
+            dim_cache_size = args.dim_cache_size,
+            incremental = args.incremental,
+            rate = args.rate,
+            resume = args.resume,
+            archive_path = args.archive,
+            sink_spec = args.sink,
+            jobs = load_jobs(args.jobs) if args.jobs else None,
+            split = args.split,
+            http_options = HttpOptions(args.conn_limit, args.limit_per_host, args.keepalive, args.dns_ttl,
+                                       args.timeout, args.connect_timeout, args.http2),
         ))
     else:
+        from .pipeline import crawl_and_store
         crawl_and_store(
             db_url = args.db,
             text = args.text,
@@ -42,11 +121,27 @@ def main():
             area = args.area,
             cache_ttl = args.cache_ttl,
             cache_name = args.cache_name,
+            cache_max_mb = args.cache_max_mb,
             cookies_file = args.cookies_file,
+            parser_backend = args.parser_backend,
+            dim_cache_size = args.dim_cache_size,
+            incremental = args.incremental,
+            rate = args.rate,
+            resume = args.resume,
+            archive_path = args.archive,
+            sink_spec = args.sink,
+            workers = args.workers,
+            split = args.split,
         )
 
     end = time.time() #тек. время после выполнения
 
+    if m is not None:
+        m.report()
+        if args.metrics_out:
+            m.write(args.metrics_out)
+            print(f"Метрики записаны в {args.metrics_out}")
+
     print(f"Время работы: {end - start: .2f} сек.")
 
 #конструкция ниже нужна для того, чтобы:
@@ -0,0 +1,214 @@
+#metrics.py
+#метрики обхода по стадиям: когда запуск медленный, по ним видно, куда ушло время -
+#страницы списка, детальные страницы, повторы, ожидание лимитера, разбор html или запись в БД.
+#Собираются гистограммы задержек, запросы/попадания в http-кэш, повторы, скачанные байты и записанные строки.
+#В конце обхода печатается сводная таблица, по --metrics-out пишется файл в формате Prometheus (text) или JSON.
+#
+#По умолчанию метрики выключены: get() возвращает заглушку, у которой все методы пустые,
+#а timed() не оборачивает вызов в замер - накладные расходы сводятся к одной проверке
+from __future__ import annotations
+import contextlib
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Optional
+
+#границы корзин гистограммы, сек (как у клиентов Prometheus, с запасом на долгие повторы)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+#подписи стадий в сводной таблице
+STAGE_TITLES = {
+    "list": "страницы списка (сеть)",
+    "detail": "детальные страницы (сеть)",
+    "ratelimit_wait": "ожидание лимитера",
+    "parse_list": "разбор списка",
+    "parse_detail": "разбор вакансии",
+    "upsert_row": "запись в БД (по строке)",
+    "upsert_batch": "запись в БД (пачкой)",
+}
+
+class Histogram:
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) #последняя корзина - +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    #оценка квантиля по корзинам (линейная интерполяция внутри корзины, как histogram_quantile в Prometheus)
+    def quantile(self, q: float)->float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if seen + c >= rank and c:
+                lo = self.buckets[i - 1] if i > 0 else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(self.max, lo + (hi - lo) * (rank - seen) / c)
+            seen += c
+        return self.max
+
+class Metrics:
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock() #метрики пишутся и из потоков (sync-режим), и из event loop
+        self.histograms: dict[str, Histogram] = {}
+        self.counters: dict[tuple[str, str], float] = {} #(имя, стадия) -> значение
+        self.started = time.perf_counter()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            h = self.histograms.get(stage)
+            if h is None:
+                h = self.histograms[stage] = Histogram()
+            h.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, stage: str = ""):
+        with self._lock:
+            self.counters[(name, stage)] = self.counters.get((name, stage), 0) + value
+
+    def counter(self, name: str, stage: str = "")->float:
+        return self.counters.get((name, stage), 0)
+
+    #замер блока кода: with get().timer("parse_list"): ...
+    @contextlib.contextmanager
+    def timer(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    #один http-ответ: задержка, попадание в кэш, размер тела.
+    #not_modified - ответ 304 на условный запрос: тело взято из кэша, по сети оно не шло
+    def http_response(self, stage: str, seconds: float, from_cache: bool, size: int, not_modified: bool = False):
+        self.inc("http_requests", 1, stage)
+        if from_cache:
+            self.inc("http_cache_hits", 1, stage)
+        else:
+            self.observe(stage, seconds) #задержку сети считаем только для реальных запросов
+        if not_modified:
+            self.inc("http_not_modified", 1, stage)
+            self.inc("http_bytes_saved", size, stage)
+        else:
+            self.inc("http_bytes", size, stage)
+
+    #--------------------------------вывод--------------------------------
+    def report(self):
+        wall = time.perf_counter() - self.started
+        print(f"Метрики по стадиям (время суммарное по всем задачам, в async стадии идут параллельно; обход {wall:.2f} сек):")
+        print(f"  {'стадия':<28}{'кол-во':>8}{'всего, с':>10}{'сред, мс':>10}{'p50, мс':>9}{'p95, мс':>9}{'p99, мс':>9}{'max, мс':>9}")
+        for stage in sorted(self.histograms, key=lambda s: -self.histograms[s].sum):
+            h = self.histograms[stage]
+            print(f"  {STAGE_TITLES.get(stage, stage):<28}{h.count:>8}{h.sum:>10.2f}{h.sum / h.count * 1000:>10.1f}"
+                  f"{h.quantile(0.5) * 1000:>9.1f}{h.quantile(0.95) * 1000:>9.1f}{h.quantile(0.99) * 1000:>9.1f}{h.max * 1000:>9.1f}")
+        for stage in ("list", "detail"):
+            reqs = self.counter("http_requests", stage)
+            if not reqs:
+                continue
+            hits = self.counter("http_cache_hits", stage)
+            not_modified = self.counter("http_not_modified", stage)
+            revalidated = (f", 304 {not_modified:.0f} (не скачано {self.counter('http_bytes_saved', stage) / 2**20:.2f} МБ)"
+                           if not_modified else "")
+            print(f"  http {stage}: {reqs:.0f} ответов, из кэша {hits:.0f} ({hits / reqs * 100:.0f}%){revalidated}, "
+                  f"повторов {self.counter('http_retries', stage):.0f}, скачано {self.counter('http_bytes', stage) / 2**20:.2f} МБ")
+        rows = {stage: v for (name, stage), v in self.counters.items() if name == "rows_written"}
+        if rows:
+            print("  записано строк: " + ", ".join(f"{STAGE_TITLES.get(s, s)} {v:.0f}" for s, v in rows.items()))
+
+    def to_json(self)->dict:
+        return {
+            "histograms": {stage: {
+                "count": h.count, "sum": h.sum, "max": h.max,
+                "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99),
+                "buckets": {str(le): c for le, c in zip(self.buckets_le(), h.counts)},
+            } for stage, h in self.histograms.items()},
+            "counters": [{"name": name, "stage": stage, "value": v} for (name, stage), v in self.counters.items()],
+        }
+
+    @staticmethod
+    def buckets_le()->list:
+        return [*BUCKETS, "+Inf"]
+
+    #текстовый формат Prometheus (для node_exporter textfile collector или pushgateway)
+    def to_prometheus(self, prefix: str = "hh_parser")->str:
+        lines = [f"# TYPE {prefix}_stage_seconds histogram"]
+        for stage, h in self.histograms.items():
+            cum = 0
+            for le, c in zip(self.buckets_le(), h.counts):
+                cum += c #в Prometheus корзины накопительные
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cum}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {h.sum}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {h.count}')
+        for name in sorted({name for name, _ in self.counters}):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for (n, stage), v in self.counters.items():
+                if n == name:
+                    lines.append(f'{prefix}_{name}_total{{stage="{stage}"}} {v:g}')
+        return "\n".join(lines) + "\n"
+
+    #формат файла по расширению: .json - JSON, иначе Prometheus text
+    def write(self, path: str):
+        p = Path(path)
+        if p.parent:
+            p.parent.mkdir(parents=True, exist_ok=True)
+        if p.suffix == ".json":
+            p.write_text(json.dumps(self.to_json(), ensure_ascii=False, indent=2), encoding="utf-8")
+        else:
+            p.write_text(self.to_prometheus(), encoding="utf-8")
+
+#заглушка на случай выключенных метрик: ничего не считает и не хранит
+class _NullMetrics:
+    enabled = False
+    _null_timer = contextlib.nullcontext()
+
+    def observe(self, stage: str, seconds: float): pass
+    def inc(self, name: str, value: float = 1, stage: str = ""): pass
+    def http_response(self, stage: str, seconds: float, from_cache: bool, size: int, not_modified: bool = False): pass
+    def timer(self, stage: str): return self._null_timer
+    def report(self): pass
+
+_NULL = _NullMetrics()
+_active: Optional[Metrics] = None
+
+#текущий реестр метрик (или заглушка, если метрики выключены)
+def get():
+    return _active if _active is not None else _NULL
+
+#включает сбор метрик для процесса (--metrics / --metrics-out) и возвращает реестр
+def enable()->Metrics:
+    global _active
+    _active = Metrics()
+    return _active
+
+def disable():
+    global _active
+    _active = None
+
+#декоратор замера функции. Пока метрики выключены, вызов идет напрямую
+def timed(stage: str):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            m = _active
+            if m is None:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                m.observe(stage, time.perf_counter() - t0)
+        return wrapper
+    return deco
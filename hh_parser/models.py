@@ -4,7 +4,7 @@ from typing import Optional, List
 
 
 from sqlalchemy import (
-    String, Integer, DateTime, ForeignKey, UniqueConstraint, func 
+    String, Integer, Boolean, DateTime, Float, ForeignKey, Index, UniqueConstraint, func, inspect, select, text, update, delete
 )
 
 from sqlalchemy.orm import(
@@ -21,22 +21,24 @@ class Base(DeclarativeBase): #базовый класс
 #таблица с данными о работодателях
 class Employer(Base): 
     __tablename__ = "employers"
-    id: Mapped[str] = mapped_column(String(32), primary_key=True) #уникальный id работодателя
-    name: Mapped[str] = mapped_column(String(512), index=True) #название компании
+    id: Mapped[str] = mapped_column(String(32), primary_key=True) #id работодателя на hh или хэш названия (см. ids.py)
+    name: Mapped[str] = mapped_column(String(512), index=True) #название компании (не уникально: у разных компаний на hh бывают одинаковые)
     vacancies: Mapped[List["Vacancy"]] = relationship(back_populates="employer") #список связанных вакансий (двухсторонняя связь с таблицей вакансий)
     
 #таблица с регионами
 class Area(Base): 
     __tablename__ = "areas"
-    id: Mapped[int] = mapped_column(Integer, primary_key=True) #id региона в API HH.ru
-    name: Mapped[str] = mapped_column(String(256)) #название региона
+    __table_args__ = (Index("uq_area_name", "name", unique=True),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True) #id региона на hh или устойчивый хэш названия (см. ids.py)
+    name: Mapped[str] = mapped_column(String(256)) #название региона (натуральный ключ, по нему ищем при upsert)
     vacancies: Mapped[List["Vacancy"]] = relationship(back_populates="area") #у каждой вакансии есть ссылка на area_id (связь один ко многим)
 
 #таблица с навыками
 class Skill(Base): 
     __tablename__ = "skills"
+    __table_args__ = (Index("uq_skill_name", "name", unique=True),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True) #уникальный id навыка
-    name: Mapped[str] = mapped_column(String(256)) #название навыка
+    name: Mapped[str] = mapped_column(String(256)) #название навыка (натуральный ключ, по нему ищем при upsert)
     vacancy_links: Mapped[List["VacancySkill"]] = relationship(back_populates="skill") #связь многие ко многим через таблицу VacancySkill
 
 
@@ -54,12 +56,15 @@ class Vacancy(Base):
     salary_from: Mapped[Optional[int]] = mapped_column(Integer, nullable=True) #диапазон з/п
     salary_to: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     salary_currency: Mapped[Optional[str]] = mapped_column(String(8), nullable=True)
+    salary_gross: Mapped[Optional[bool]] = mapped_column(Boolean, nullable=True) #до вычета налогов (True) или на руки (False)
 
     schedule: Mapped[Optional[str]] = mapped_column(String(64), nullable=True) #тип занятости (удаленная, офис, гибрид)
     employment: Mapped[Optional[str]] = mapped_column(String(64), nullable=True) #формат занятости (полная, частичная и тд)
     experience: Mapped[Optional[str]] = mapped_column(String(64), nullable=True) #требуемый опыт
 
     url: Mapped[str] = mapped_column(String(1024)) #здесь хранится адрес вакансии на hh
+    list_fingerprint: Mapped[Optional[str]] = mapped_column(String(40), nullable=True) #отпечаток карточки из списка (для --incremental)
+    detail_hash: Mapped[Optional[str]] = mapped_column(String(40), nullable=True) #sha1 детальной страницы, из которой разобрана запись
 
     employer_id: Mapped[Optional[str]] = mapped_column(String(32), ForeignKey("employers.id"), nullable=True) #ссылка на работодателя
     area_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("areas.id"), nullable=True, index=True) #ссылка на регион
@@ -82,5 +87,137 @@ class VacancySkill(Base):
     skill: Mapped["Skill"] = relationship(back_populates = "vacancy_links") #объектная ссылка на навыки
 
 
-    
-
+#какие поисковые запросы нашли вакансию (одна и та же вакансия попадает в выдачу многих запросов)
+class VacancyQuery(Base):
+    __tablename__ = "vacancy_queries"
+    __table_args__ = (UniqueConstraint("vacancy_id", "query", "area", name="uq_vacancy_query"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    vacancy_id: Mapped[int] = mapped_column(Integer, index=True) #id вакансии на hh (как Vacancy.vacancy_id)
+    query: Mapped[str] = mapped_column(String(512)) #поисковая строка
+    area: Mapped[int] = mapped_column(Integer, default=0) #id региона поиска (0 - без региона, NULL сломал бы уникальность)
+
+
+#прогресс обхода по каждому заданию (запрос, регион) - для продолжения после падения (--resume)
+class CrawlState(Base):
+    __tablename__ = "crawl_state"
+    __table_args__ = (UniqueConstraint("query", "area", name="uq_crawl_state"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    query: Mapped[str] = mapped_column(String(512)) #поисковая строка
+    area: Mapped[int] = mapped_column(Integer, default=0) #id региона поиска (0 - без региона)
+    last_page: Mapped[int] = mapped_column(Integer, default=-1) #последняя полностью обработанная страница списка
+    finished: Mapped[bool] = mapped_column(Boolean, default=False) #выдача закончилась (пустая страница)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+#карточки, детальные страницы которых еще не сохранены: поставленные в очередь (pending) или не скачавшиеся (failed).
+#Полей карточки достаточно, чтобы при повторе не качать страницу списка заново
+class CrawlItem(Base):
+    __tablename__ = "crawl_items"
+
+    vacancy_id: Mapped[int] = mapped_column(Integer, primary_key=True) #id вакансии на hh
+    query: Mapped[str] = mapped_column(String(512)) #задание, которое нашло вакансию
+    area: Mapped[int] = mapped_column(Integer, default=0)
+    name: Mapped[str] = mapped_column(String(512))
+    url: Mapped[str] = mapped_column(String(1024))
+    employer_name: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
+    area_name: Mapped[Optional[str]] = mapped_column(String(256), nullable=True)
+    published_at_text: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    #id работодателя и региона на hh из ссылок карточки: без них повтор и --resume дали бы вакансии, у которой на странице
+    #нет ссылок, хэш названия вместо id с hh, и работодатель раздвоился бы (см. ids.py)
+    employer_id: Mapped[Optional[str]] = mapped_column(String(32), nullable=True)
+    area_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    status: Mapped[str] = mapped_column(String(16), default="pending", index=True) #pending / failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0) #сколько раз страница не скачалась
+    error: Mapped[Optional[str]] = mapped_column(String(512), nullable=True) #последняя ошибка
+
+#единица работы распределенного обхода (coordinator.py): страницы [page_from, page_to) одного задания.
+#Воркер берет единицу в аренду (lease_until) и продлевает ее, пока работает; просроченную аренду забирает другой воркер
+class WorkUnit(Base):
+    __tablename__ = "work_units"
+    __table_args__ = (UniqueConstraint("query", "area", "page_from", name="uq_work_unit"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    query: Mapped[str] = mapped_column(String(512))
+    area: Mapped[int] = mapped_column(Integer, default=0) #0 - без региона
+    page_from: Mapped[int] = mapped_column(Integer) #первая страница списка
+    page_to: Mapped[int] = mapped_column(Integer) #страница после последней
+    status: Mapped[str] = mapped_column(String(16), default="pending", index=True) #pending / leased / done / skipped / failed
+    owner: Mapped[Optional[str]] = mapped_column(String(256), nullable=True) #воркер-арендатор (хост:pid)
+    lease_until: Mapped[Optional[float]] = mapped_column(Float, nullable=True) #unix time окончания аренды
+    attempts: Mapped[int] = mapped_column(Integer, default=0) #сколько раз единицу брали в работу
+    saved: Mapped[int] = mapped_column(Integer, default=0) #сколько вакансий сохранено
+    error: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+#создает таблицы при первом запуске. create_all не трогает уже существующие таблицы,
+#поэтому колонки и индексы, добавленные в модель позже, досоздаем отдельно
+def init_db(engine):
+    Base.metadata.create_all(engine)
+    _add_missing_columns(engine)
+    _migrate_natural_keys(engine)
+    for table in Base.metadata.sorted_tables: #checkfirst - только если индекса еще нет
+        for idx in table.indexes:
+            idx.create(engine, checkfirst=True)
+
+#добавляет в существующие таблицы новые nullable-колонки модели (ALTER TABLE ... ADD COLUMN)
+def _add_missing_columns(engine):
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing or not col.nullable:
+                    continue
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(engine.dialect)}"))
+
+#переход на устойчивые id справочников (см. ids.py) в базах, созданных до него. Признак старой схемы - нет уникального
+#индекса по названию навыка. Старые id регионов (hash() названия) и работодателей (само название) пересчитываются,
+#дубли регионов и навыков с одинаковым названием схлопываются, ссылки вакансий переводятся на новые id.
+#Строки меняются через "вставить новую - перевести ссылки - удалить старую", чтобы не нарушать внешние ключи
+def _migrate_natural_keys(engine):
+    from .ids import area_id, employer_key
+    insp = inspect(engine)
+    if "uq_skill_name" in {ix["name"] for ix in insp.get_indexes("skills")}:
+        return
+    areas_t, employers_t, skills_t = Area.__table__, Employer.__table__, Skill.__table__
+    vac_t, links_t = Vacancy.__table__, VacancySkill.__table__
+    with engine.begin() as conn:
+        #регионы: одно название - один регион с id из хэша названия
+        new_ids, used = {}, set()
+        for old_id, name in conn.execute(select(areas_t.c.id, areas_t.c.name).order_by(areas_t.c.id)).all():
+            if name not in new_ids:
+                probe = 0
+                while area_id(name, probe = probe) in used:
+                    probe += 1
+                new_ids[name] = area_id(name, probe = probe)
+                used.add(new_ids[name])
+            _move_row(conn, areas_t, vac_t.c.area_id, old_id, new_ids[name], {"name": name})
+        #работодатели: id = хэш названия (id с hh появятся при следующих обходах - в старых данных ссылок не было)
+        for old_id, name in conn.execute(select(employers_t.c.id, employers_t.c.name)).all():
+            _move_row(conn, employers_t, vac_t.c.employer_id, old_id, employer_key(name), {"name": name})
+        #навыки: остается строка с меньшим id, связи дублей переводятся на нее (без повторов пары вакансия-навык)
+        keep = {}
+        for skill_id, name in conn.execute(select(skills_t.c.id, skills_t.c.name).order_by(skills_t.c.id)).all():
+            if name not in keep:
+                keep[name] = skill_id
+                continue
+            target = keep[name]
+            has_target = select(links_t.c.vacancy_db_id).where(links_t.c.skill_id == target).scalar_subquery()
+            conn.execute(delete(links_t).where(links_t.c.skill_id == skill_id, links_t.c.vacancy_db_id.in_(has_target)))
+            conn.execute(update(links_t).where(links_t.c.skill_id == skill_id).values(skill_id = target))
+            conn.execute(delete(skills_t).where(skills_t.c.id == skill_id))
+        for old_index in ("ix_skills_name", "ix_areas_name"): #неуникальные индексы заменяются уникальными (их создаст init_db)
+            if old_index in {ix["name"] for ix in insp.get_indexes(old_index.split("_")[1])}:
+                conn.execute(text(f"DROP INDEX {old_index}"))
+
+#переносит строку справочника со старого id на новый: создает новую (если ее нет), переводит ссылки, удаляет старую.
+#Уникальных индексов по названию на этот момент еще нет, поэтому старая и новая строка могут недолго сосуществовать
+def _move_row(conn, table, ref_col, old_id, new_id, values: dict):
+    if old_id == new_id:
+        return
+    if conn.execute(select(table.c.id).where(table.c.id == new_id)).first() is None:
+        conn.execute(table.insert().values(id = new_id, **values))
+    conn.execute(update(ref_col.table).where(ref_col == old_id).values({ref_col.name: new_id}))
+    conn.execute(delete(table).where(table.c.id == old_id))
@@ -0,0 +1,82 @@
+#parse_pool.py
+#вынос разбора html (BeautifulSoup) из event loop в пул процессов.
+#BeautifulSoup с html.parser - чистый python, и пока он строит дерево для страницы в сотни КБ,
+#event loop стоит и сетевые запросы не двигаются. В пуле процессов разбор идет параллельно на всех ядрах,
+#а http-часть продолжает работать
+from __future__ import annotations
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional, List
+
+from . import metrics
+from .parsing import parse_list_page, parse_vacancy_detail
+from .schemas import VacancyBrief, VacancyDetail
+
+if TYPE_CHECKING: #только для аннотаций: сам пул импортируется по месту, когда задан --parse-workers
+    from concurrent.futures import ProcessPoolExecutor
+
+#функции ниже выполняются в дочерних процессах, поэтому они объявлены на уровне модуля (их можно передать через pickle).
+#вместе с результатом возвращаем процессорное время, потраченное на разбор
+def timed_parse_list_page(html: str, backend: str = "bs4")->tuple[List[VacancyBrief], float]:
+    t0 = time.process_time()
+    briefs = parse_list_page(html, backend)
+    return briefs, time.process_time() - t0
+
+def timed_parse_vacancy_detail(html: str, url: str, brief: VacancyBrief, backend: str = "bs4")->tuple[VacancyDetail, float]:
+    t0 = time.process_time()
+    det = parse_vacancy_detail(html, url, brief, backend)
+    return det, time.process_time() - t0
+
+#счетчики для оценки соотношения CPU/IO (по ним подбирается --parse-workers)
+@dataclass
+class CrawlTimings:
+    net_time: float = 0.0 #суммарное время ожидания http-ответов (по всем запросам)
+    requests: int = 0 #сколько страниц скачано
+    parse_cpu: float = 0.0 #суммарное процессорное время разбора html
+    loop_blocked: float = 0.0 #сколько времени разбор занимал сам event loop (только без пула)
+    parsed: int = 0 #сколько страниц разобрано
+
+    def report(self, wall: float, parse_workers: int):
+        print(f"Сеть: {self.requests} запросов, {self.net_time:.2f} сек ожидания суммарно")
+        print(f"Парсинг: {self.parsed} страниц, {self.parse_cpu:.2f} сек CPU "
+              f"({self.parse_cpu / self.parsed * 1000 if self.parsed else 0:.1f} мс на страницу)")
+        if parse_workers:
+            #сколько ядер в среднем был занят разбор: если близко к parse_workers - пул узкое место
+            print(f"Загрузка пула разбора: {self.parse_cpu / wall if wall else 0:.2f} из {parse_workers} процессов")
+        else:
+            print(f"Event loop занят разбором {self.loop_blocked:.2f} сек из {wall:.2f} сек "
+                  f"({self.loop_blocked / wall * 100 if wall else 0:.0f}%)")
+
+#обертка, которая разбирает страницу либо в пуле процессов, либо прямо в event loop (если пула нет)
+class HtmlParser:
+    def __init__(self, parse_workers: int = 0, backend: str = "bs4"):
+        self.parse_workers = parse_workers
+        self.backend = backend #движок извлечения (см. parsing.PARSER_BACKENDS)
+        self.pool: Optional[ProcessPoolExecutor] = None
+        if parse_workers > 0:
+            from concurrent.futures import ProcessPoolExecutor #импорт по месту: без --parse-workers пул не нужен
+            self.pool = ProcessPoolExecutor(parse_workers)
+        self.timings = CrawlTimings()
+
+    async def _run(self, stage: str, fn, *args):
+        if self.pool is None: #без пула разбор идет синхронно и блокирует event loop
+            t0 = time.perf_counter()
+            res, cpu = fn(*args)
+            self.timings.loop_blocked += time.perf_counter() - t0
+        else:
+            res, cpu = await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+            metrics.get().observe(stage, cpu) #метрики дочернего процесса до нас не доходят - учитываем его CPU здесь
+        self.timings.parse_cpu += cpu
+        self.timings.parsed += 1
+        return res
+
+    async def list_page(self, html: str)->List[VacancyBrief]:
+        return await self._run("parse_list", timed_parse_list_page, html, self.backend)
+
+    async def vacancy_detail(self, html: str, url: str, brief: VacancyBrief)->VacancyDetail:
+        return await self._run("parse_detail", timed_parse_vacancy_detail, html, url, brief, self.backend)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures = True)
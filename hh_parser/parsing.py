@@ -1,98 +1,482 @@
 from __future__ import annotations
+import hashlib
 import re
 from datetime import datetime, timedelta, timezone
-from typing import Optional, List
-from bs4 import BeautifulSoup
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Optional, List, NamedTuple
+from .config import PARSER_BACKENDS
+from .ids import hh_employer_id, hh_area_id
+from .metrics import timed
 from .schemas import VacancyBrief, VacancyDetail
 
 #-------------------------------------HTML-парсинг----------------------------------------------
 VACANCY_ID_RE = re.compile(r"/vacancy/(\d+)") #регулярное выражение, с помощью которого парсер извлекает ID вакансии из ссылки
-SALARY_RE = re.compile(r"(\d[\d\s\u00A0]*)", re.UNICODE) #регулярное выражение для извлечения чисел из текста з/п
 
 #принимает объект BS и возвращает его текстовое содержимое, иначе None
 def text_or_none(node): 
     return node.get_text(strip=True) if node else None
 
-#превращает текст з/п из html hh в структурированные поля 
+#ссылка узла: сам узел - <a href>, или первая ссылка внутри него (по ней достаем id работодателя/региона на hh)
+def href_or_none(node):
+    if not node:
+        return None
+    if node.get("href"):
+        return node.get("href")
+    a = node.find("a", href=True)
+    return a.get("href") if a else None
+
+#-------------------------------------Зарплата и дата публикации--------------------------------
+#Разбираются на каждой вакансии (а при reparse - на сотнях тысяч страниц из архива), но различных строк немного
+#(несколько тысяч), поэтому результат разбора строки кэшируется, а шаблоны скомпилированы заранее: строка з/п
+#просматривается одним findall вместо re.sub на каждое число и нескольких проверок "in"
+NORMALIZE_CACHE_SIZE = 8192 #сколько различных строк з/п и дат помнить
+
+#обозначения валют -> коды валют hh
+CURRENCIES = {
+    "₽": "RUR", "руб": "RUR", "rub": "RUR", "rur": "RUR",
+    "$": "USD", "usd": "USD", "долл": "USD",
+    "€": "EUR", "eur": "EUR", "евро": "EUR",
+    "₸": "KZT", "kzt": "KZT", "тенге": "KZT", "тг": "KZT",
+    "₴": "UAH", "uah": "UAH", "грн": "UAH",
+}
+#вся строка з/п разбирается одним проходом, каждое совпадение - одна из групп:
+#1-2 - число с разделителями разрядов (пробел, неразрывный и узкий неразрывный пробел) и необязательное "от"/"до" перед ним,
+#3 - валюта, 4 - до вычета налогов (gross), 5 - на руки (net). "до" в "до вычета налогов" числом не считается - после него нет цифр
+SALARY_TOKEN_RE = re.compile(
+    r"(?:(?<!\w)(от|до|from|up to|to)\s*)?(\d(?:[\d\s\u00A0\u202F]*\d)?)"
+    r"|(" + "|".join(re.escape(c) for c in sorted(CURRENCIES, key=len, reverse=True)) + r")"
+    r"|(до\s+вычета\s+налогов|\bgross\b)"
+    r"|(на\s+руки|после\s+вычета\s+налогов|\bnet\b)",
+    re.IGNORECASE,
+)
+_FROM, _TO = ("от", "from"), ("до", "to", "up to")
+
+class Salary(NamedTuple):
+    salary_from: Optional[int]
+    salary_to: Optional[int]
+    currency: Optional[str] #код валюты hh (RUR, USD, EUR, KZT, UAH)
+    gross: Optional[bool] #True - до вычета налогов, False - на руки, None - не указано
+
+#разбор текста з/п: "от 100 000 до 150 000 ₽ на руки", "до 3 000 $", "120 000 – 180 000 руб." и тд
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_salary(s: str)->Salary:
+    lo = hi = cur = gross = None
+    plain = [] #числа без "от"/"до"
+    for prefix, num, currency, is_gross, _ in SALARY_TOKEN_RE.findall(s):
+        if num:
+            n = int("".join(num.split())) #убираем разделители разрядов
+            prefix = prefix.lower()
+            if prefix in _FROM:
+                lo = n if lo is None else lo
+            elif prefix in _TO:
+                hi = n if hi is None else hi
+            else:
+                plain.append(n)
+        elif currency:
+            cur = cur or CURRENCIES[currency.lower()]
+        elif gross is None:
+            gross = bool(is_gross)
+    if lo is None and hi is None and plain: #"120 000 – 180 000" - диапазон, одно число - фиксированная з/п
+        lo, hi = plain[0], plain[1] if len(plain) > 1 else plain[0]
+    return Salary(lo, hi, cur, gross)
+
+#превращает текст з/п из html hh в структурированные поля (нижняя, верхняя граница, валюта)
 def parse_salary(s):
     if not s: return None, None, None
-    cur = "RUR" if "руб" in s else None
-    nums = [int(re.sub(r"\D+", "", m)) for m in SALARY_RE.findall(s)] #все числа с учетом пробелов и неразрывных пробелов
-    if "от" in s and nums: 
-        return nums[0], None, cur
-    if "до" in s and nums: 
-        return None, nums[0], cur
-    if len(nums) >= 2: 
-        return nums[0], nums[1], cur
-    return nums[0], nums[0], cur if nums else (None, None, cur)
+    return normalize_salary(s)[:3]
+
+MONTHS = {"января":1, "февраля":2, "марта":3, "апреля":4, "мая":5, "июня":6, "июля":7, "августа":8, "сентября":9, "октября":10, "ноября":11, "декабря":12}
+RELATIVE_DAYS = {"сегодня": 0, "вчера": 1} #сколько дней назад
+RELATIVE_RE = re.compile("|".join(RELATIVE_DAYS))
+DATE_RE = re.compile(r"(\d{1,2})\s+(" + "|".join(MONTHS) + r")(?!\w)(?:\s+(\d{4}))?") #день, месяц, (необязательно) год
+
+#разобранная дата без привязки к текущему моменту (поэтому ее можно кэшировать):
+#(дней назад, None, None, None) для "сегодня"/"вчера", (None, год или None, месяц, день) для даты, None - не распознано
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _date_parts(s: str)->Optional[tuple]:
+    lower = s.lower()
+    m = RELATIVE_RE.search(lower)
+    if m:
+        return RELATIVE_DAYS[m.group(0)], None, None, None
+    m = DATE_RE.search(lower)
+    if m:
+        return None, int(m.group(3)) if m.group(3) else None, MONTHS[m.group(2)], int(m.group(1))
+    return None
 
 #преобразовывает текст даты публикации вакансии из html в datetime с врем. зоной utc
 def parse_published_at(s):
-    if not s: return datetime.now(timezone.utc) #проверяем есть ли вход
-    lower = s.lower()
     now = datetime.now(timezone.utc)
-    if "сегодня" in lower: return now #возвращаем сегодняшнюю дату
-    if "вчера" in lower: return now - timedelta(days=1) #возвращаем вчерашнюю дату
-    m = re.search(r"(\d{1,2})\s+([а-яё]+)\s+(\d{4})?", lower)
-    months = {"января":1, "февраля":2, "марта":3, "апреля":4, "мая":5, "июня":6, "июля":7, "августа":8, "сентября":9, "октября":10, "ноября":11, "декабря":12}
-    if m: #ищем шаблон день+месяц+(опционально год)
-        day, mon = int(m.group(1)), months.get(m.group(2))
-        year = int(m.group(3)) if m.group(3) else now.year
-        if mon: return datetime(year, mon, day, tzinfo=timezone.utc) #возвращает дату в utc
-    return now #возвращаем текущую дату
-
-
-#парсит html в BS (вытаскивает краткие карточки и превращает их в список VacancyBrief)
-def parse_list_page(html: str)->List[VacancyBrief]:
+    parts = _date_parts(s) if s else None
+    if parts is None: return now #даты нет или она не распознана - возвращаем текущую дату
+    days_ago, year, mon, day = parts
+    if days_ago is not None:
+        return now - timedelta(days=days_ago) if days_ago else now
+    try:
+        return datetime(year or now.year, mon, day, tzinfo=timezone.utc) #год не указан - текущий
+    except ValueError: #несуществующая дата ("30 февраля")
+        return now
+
+
+#-------------------------------------Движки извлечения---------------------------------------
+#Все нужные поля на страницах hh помечены атрибутом data-qa, поэтому извлечение вынесено в сменные "движки":
+#bs4    - исходный вариант: полное дерево BeautifulSoup (html.parser) + css-селекторы
+#lxml   - дерево строит libxml2 (C), поиск через XPath. Нужен пакет lxml
+#stream - потоковый разбор стандартным html.parser без построения дерева: собирается текст только нужных data-qa узлов
+#Каждый движок возвращает "сырые" строки (и ссылки работодателя и региона), а VacancyBrief/VacancyDetail собираются ниже общим кодом,
+#поэтому результат у всех движков одинаковый. Список движков (PARSER_BACKENDS) лежит в config.py, чтобы CLI не импортировал
+#парсинг ради --help; bs4 и lxml импортируются по месту, только выбранным движком
+
+#селекторы карточки в списке и полей детальной страницы (в формате data-qa)
+CARD_CLASSES = ("serp-item", "vacancy-serp-item")
+CARD_DATA_QA = "vacancy-serp__vacancy"
+CARD_TITLE_QA = "serp-item__title"
+CARD_FIELDS_QA = {
+    "employer": "vacancy-serp__vacancy-employer",
+    "area": "vacancy-serp__vacancy-address",
+    "pub": "vacancy-serp__vacancy-date",
+}
+DETAIL_FIELDS_QA = {
+    "name": "vacancy-title", #только у тега h1
+    "employer": "vacancy-company-name",
+    "area": "vacancy-view-location",
+    "salary": "vacancy-salary",
+    "salary_view": "vacancy-view-salary",
+    "experience": "vacancy-experience",
+    "employment": "vacancy-view-employment-mode",
+    "schedule": "vacancy-schedule",
+    "pub": "vacancy-view-creation-time",
+}
+SKILL_QA = "skills-element"
+
+#--------bs4--------
+def _list_cards_bs4(html: str):
+    from bs4 import BeautifulSoup #импорт по месту: bs4 нужен только этому движку
     soup = BeautifulSoup(html, "html.parser")
     #используем несколько селекторов сразу, чтобы пережить изменения в верстке
-    cards = soup.select('div.serp-item, div.vacancy-serp-item, div[data-qa="vacancy-serp__vacancy"]') 
-    out = []
+    cards = soup.select('div.serp-item, div.vacancy-serp-item, div[data-qa="vacancy-serp__vacancy"]')
     for card in cards: #в каждой карточке ищем заголовок и ссылку
         title = card.select_one('a[data-qa="serp-item__title"]') #заголовок
         if not title:
             continue
-        url = title["href"].split("?")[0] #из ссылки берем чистый url
+        #вытаскиваем доп. поля. Берем через text_or_none, чтобы не падать, если нет узла
+        emp = card.select_one('[data-qa="vacancy-serp__vacancy-employer"]')
+        area = card.select_one('[data-qa="vacancy-serp__vacancy-address"]')
+        yield (
+            title.get("href"), title.text,
+            text_or_none(emp), text_or_none(area),
+            text_or_none(card.select_one('[data-qa="vacancy-serp__vacancy-date"]')),
+            href_or_none(emp), href_or_none(area),
+        )
+
+def _detail_fields_bs4(html: str)->dict:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser") #парсим html
+    emp = soup.select_one('[data-qa="vacancy-company-name"]')
+    area = soup.select_one('[data-qa="vacancy-view-location"]')
+    return {
+        "name": text_or_none(soup.select_one('h1[data-qa="vacancy-title"]')),
+        "employer": text_or_none(emp),
+        "area": text_or_none(area),
+        "employer_href": href_or_none(emp),
+        "area_href": href_or_none(area),
+        "salary": text_or_none(soup.select_one('[data-qa="vacancy-salary"], [data-qa="vacancy-view-salary"]')), #блок зарплаты
+        "experience": text_or_none(soup.select_one('[data-qa="vacancy-experience"]')),
+        "employment": text_or_none(soup.select_one('[data-qa="vacancy-view-employment-mode"]')),
+        "schedule": text_or_none(soup.select_one('[data-qa="vacancy-schedule"]')),
+        "skills": [t.text.strip() for t in soup.select('[data-qa="skills-element"]')],
+        "pub": text_or_none(soup.select_one('[data-qa="vacancy-view-creation-time"]')),
+    }
+
+#--------lxml--------
+#аналог get_text(strip=True) из BeautifulSoup: склеиваем все текстовые куски узла, обрезая пробелы у каждого
+def _lxml_text(node):
+    return "".join(t.strip() for t in node.itertext()) if node is not None else None
+
+def _lxml_first(root, xpath: str):
+    found = root.xpath(xpath)
+    return found[0] if found else None
+
+def _lxml_href(node):
+    if node is None:
+        return None
+    if node.get("href"):
+        return node.get("href")
+    a = _lxml_first(node, ".//a[@href]")
+    return a.get("href") if a is not None else None
+
+def _list_cards_lxml(html: str):
+    from lxml import html as lxml_html #импорт по месту: lxml нужен только этому движку
+    root = lxml_html.document_fromstring(html)
+    card_cond = " or ".join(
+        [f'contains(concat(" ", normalize-space(@class), " "), " {c} ")' for c in CARD_CLASSES]
+        + [f'@data-qa="{CARD_DATA_QA}"']
+    )
+    for card in root.xpath(f"//div[{card_cond}]"):
+        title = _lxml_first(card, f'.//a[@data-qa="{CARD_TITLE_QA}"]')
+        if title is None:
+            continue
+        nodes = {k: _lxml_first(card, f'.//*[@data-qa="{qa}"]') for k, qa in CARD_FIELDS_QA.items()}
+        yield (
+            title.get("href"), "".join(title.itertext()),
+            *(_lxml_text(n) for n in nodes.values()),
+            _lxml_href(nodes["employer"]), _lxml_href(nodes["area"]),
+        )
+
+def _detail_fields_lxml(html: str)->dict:
+    from lxml import html as lxml_html
+    root = lxml_html.document_fromstring(html)
+    node = lambda qa, tag="*": _lxml_first(root, f'//{tag}[@data-qa="{qa}"]')
+    first = lambda qa, tag="*": _lxml_text(node(qa, tag))
+    q = DETAIL_FIELDS_QA
+    emp, area = node(q["employer"]), node(q["area"])
+    return {
+        "name": first(q["name"], "h1"),
+        "employer": _lxml_text(emp),
+        "area": _lxml_text(area),
+        "employer_href": _lxml_href(emp),
+        "area_href": _lxml_href(area),
+        #первый по порядку в документе из двух вариантов блока зарплаты
+        "salary": _lxml_text(_lxml_first(root, f'//*[@data-qa="{q["salary"]}" or @data-qa="{q["salary_view"]}"]')),
+        "experience": first(q["experience"]),
+        "employment": first(q["employment"]),
+        "schedule": first(q["schedule"]),
+        "skills": ["".join(t.itertext()).strip() for t in root.xpath(f'//*[@data-qa="{SKILL_QA}"]')],
+        "pub": first(q["pub"]),
+    }
+
+#--------stream--------
+#поля, у которых кроме текста нужна ссылка (id работодателя и региона на hh)
+HREF_FIELDS = ("employer", "area")
+
+#теги без закрывающей пары (их не кладем в стек открытых тегов)
+VOID_TAGS = frozenset(("area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"))
+
+#собирает текст одного узла, пока он открыт
+class _Capture:
+    __slots__ = ("depth", "parts")
+    def __init__(self, depth: int):
+        self.depth = depth #глубина стека, на которой узел открылся
+        self.parts: List[str] = []
+
+    def text(self, strip_each: bool)->str:
+        return "".join(p.strip() for p in self.parts) if strip_each else "".join(self.parts)
+
+#потоковый извлекатель: идет по событиям html.parser (тем же, что и bs4), но дерево не строит.
+#Закрывающий тег снимает со стека все теги до ближайшего открытого с тем же именем - так же поступает bs4,
+#поэтому границы узлов на кривой верстке совпадают
+class _DataQaExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: List[str] = []
+        self.active: List[_Capture] = [] #открытые в данный момент узлы, текст которых собираем
+
+    def _open(self)->_Capture:
+        c = _Capture(len(self.stack))
+        self.active.append(c)
+        return c
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS: #<div/> в html.parser - сразу открыт и закрыт
+            self.handle_endtag(tag)
+
+    def handle_starttag(self, tag, attrs):
+        self.on_start(tag, dict(attrs))
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+        else: #у пустого тега текста нет - узел сразу закрыт
+            self._close_to(len(self.stack))
+
+    def handle_endtag(self, tag):
+        if tag not in self.stack: #закрывающий тег без открывающего игнорируем
+            return
+        while self.stack:
+            if self.stack.pop() == tag:
+                break
+        self._close_to(len(self.stack))
+
+    #закрывает все узлы, открытые на глубине depth и глубже
+    def _close_to(self, depth: int):
+        if any(c.depth >= depth for c in self.active):
+            self.active = [c for c in self.active if c.depth < depth]
+        self.on_close(depth)
+
+    def handle_data(self, data):
+        for c in self.active:
+            c.parts.append(data)
+
+    def on_start(self, tag: str, attrs: dict):
+        pass
+
+    def on_close(self, depth: int):
+        pass
+
+    #ссылка для поля: href самого узла или первой ссылки внутри него, пока узел открыт
+    def take_href(self, hrefs: dict, captures: dict, tag: str, attrs: dict):
+        if tag != "a" or not attrs.get("href"):
+            return
+        for key, c in captures.items():
+            if key in HREF_FIELDS and hrefs.get(key) is None and c in self.active:
+                hrefs[key] = attrs["href"]
+
+class _ListExtractor(_DataQaExtractor):
+    def __init__(self):
+        super().__init__()
+        self.cards: List[dict] = [] #все карточки в порядке появления
+        self.open_cards: List[dict] = [] #карточки, внутри которых находимся (бывают вложенные)
+
+    def on_start(self, tag, attrs):
+        if tag == "div" and (attrs.get("data-qa") == CARD_DATA_QA
+                             or set((attrs.get("class") or "").split()) & set(CARD_CLASSES)):
+            card = {"depth": len(self.stack), "hrefs": {}}
+            self.cards.append(card)
+            self.open_cards.append(card)
+        for card in self.open_cards:
+            self.take_href(card["hrefs"], card, tag, attrs)
+        qa = attrs.get("data-qa")
+        if not qa or not self.open_cards:
+            return
+        if qa == CARD_TITLE_QA and tag == "a":
+            key = "title"
+        else:
+            key = next((k for k, v in CARD_FIELDS_QA.items() if v == qa), None)
+        if key is None:
+            return
+        for card in self.open_cards: #как select_one: в каждой карточке берем первое совпадение
+            if key not in card:
+                card[key] = self._open()
+                if key == "title":
+                    card["href"] = attrs.get("href")
+                elif key in HREF_FIELDS:
+                    card["hrefs"][key] = attrs.get("href")
+
+    def on_close(self, depth):
+        self.open_cards = [c for c in self.open_cards if c["depth"] < depth]
+
+def _list_cards_stream(html: str):
+    ex = _ListExtractor()
+    ex.feed(html)
+    ex.close()
+    for card in ex.cards:
+        if "title" not in card:
+            continue
+        yield (
+            card["href"], card["title"].text(strip_each=False),
+            *(card[k].text(strip_each=True) if k in card else None for k in CARD_FIELDS_QA),
+            *(card["hrefs"].get(k) for k in HREF_FIELDS),
+        )
+
+class _DetailExtractor(_DataQaExtractor):
+    def __init__(self):
+        super().__init__()
+        self.fields: dict = {}
+        self.hrefs: dict = {}
+        self.skills: List[_Capture] = []
+        self.qa_to_key = {v: k for k, v in DETAIL_FIELDS_QA.items()}
+
+    def on_start(self, tag, attrs):
+        self.take_href(self.hrefs, self.fields, tag, attrs)
+        qa = attrs.get("data-qa")
+        if not qa:
+            return
+        if qa == SKILL_QA:
+            self.skills.append(self._open())
+            return
+        key = self.qa_to_key.get(qa)
+        if key == "salary_view": #оба варианта блока зарплаты - одно поле, берем первый встретившийся
+            key = "salary"
+        if key is None or key in self.fields or (key == "name" and tag != "h1"):
+            return
+        self.fields[key] = self._open()
+        if key in HREF_FIELDS:
+            self.hrefs[key] = attrs.get("href")
+
+def _detail_fields_stream(html: str)->dict:
+    ex = _DetailExtractor()
+    ex.feed(html)
+    ex.close()
+    out = {k: (ex.fields[k].text(strip_each=True) if k in ex.fields else None) for k in DETAIL_FIELDS_QA if k != "salary_view"}
+    out["skills"] = [c.text(strip_each=False).strip() for c in ex.skills]
+    out["employer_href"], out["area_href"] = ex.hrefs.get("employer"), ex.hrefs.get("area")
+    return out
+
+_LIST_BACKENDS = {"bs4": _list_cards_bs4, "lxml": _list_cards_lxml, "stream": _list_cards_stream}
+_DETAIL_BACKENDS = {"bs4": _detail_fields_bs4, "lxml": _detail_fields_lxml, "stream": _detail_fields_stream}
+
+def _backend(table: dict, backend: str):
+    try:
+        return table[backend]
+    except KeyError:
+        raise ValueError(f"Неизвестный движок парсинга: {backend} (доступны: {', '.join(PARSER_BACKENDS)})") from None
+
+
+#парсит html страницы поиска (вытаскивает краткие карточки и превращает их в список VacancyBrief)
+@timed("parse_list")
+def parse_list_page(html: str, backend: str = "bs4")->List[VacancyBrief]:
+    out = []
+    for href, title, emp, area, pub, emp_href, area_href in _backend(_LIST_BACKENDS, backend)(html):
+        if not href:
+            continue
+        url = href.split("?")[0] #из ссылки берем чистый url
         m = VACANCY_ID_RE.search(url) #извлекаем id вакансии
         if not m: #если не удалось вытащить id - пропускаем карточку
             continue
-        v_id = int(m.group(1)) 
-        #вытаскиваем доп. поля. Берем через text_or_none, чтобы не падать, если нет узла
-        emp = text_or_none(card.select_one('[data-qa="vacancy-serp__vacancy-employer"]'))
-        area = text_or_none(card.select_one('[data-qa="vacancy-serp__vacancy-address"]'))
-        pub = text_or_none(card.select_one('[data-qa="vacancy-serp__vacancy-date"]'))
+        v_id = int(m.group(1))
         #складываем все данные в VacancyBrief и возвроащаем список таких объектов
-        out.append(VacancyBrief(v_id, title.text.strip(), url, emp, area, pub))
-        
+        out.append(VacancyBrief(v_id, title.strip(), url, emp, area, pub, hh_employer_id(emp_href), hh_area_id(area_href)))
+
     return out
 
+#счетчик выдачи "Найдено 12 345 вакансий": число может быть разбито тегами и разделителями разрядов (&nbsp;, узкий пробел)
+FOUND_RE = re.compile(r"Найден[оаы]?\s*(?:<[^>]*>\s*)*(\d(?:[\d\s   ]|&nbsp;|&#160;|&#8239;|&thinsp;)*)")
+_NOT_DIGIT_RE = re.compile(r"&[#\w]+;|\D")
+
+#сколько вакансий hh нашел по запросу (по счетчику на странице поиска). None - счетчика нет (другая верстка или ничего не найдено).
+#Нужен планировщику (planner.py): выдача hh обрезается на SEARCH_RESULTS_CAP, и понять, что запрос не поместился, можно только по счетчику
+def parse_found_count(html: str)->Optional[int]:
+    m = FOUND_RE.search(html)
+    if not m:
+        return None
+    digits = _NOT_DIGIT_RE.sub("", m.group(1))
+    return int(digits) if digits else None
+
+
+#версия разбора детальной страницы: входит в page_hash. Увеличивается при правке селекторов или нормализации полей,
+#иначе обход пропустит неизменившиеся страницы и в БД останутся поля, разобранные старым кодом (или запустить reparse)
+DETAIL_PARSE_VERSION = 1
+
+#отпечаток содержимого детальной страницы: если он и отпечаток карточки совпадают с сохраненными,
+#страницу можно не разбирать и не записывать (см. incremental.unchanged)
+def page_hash(html: str)->str:
+    return hashlib.sha1(f"{DETAIL_PARSE_VERSION}\x1f{html}".encode("utf-8")).hexdigest()
 
 #преобразует html страницу конкретной вакансии в объект VacancyDetail
-def parse_vacancy_detail(html: str, url: str, brief: VacancyBrief)->VacancyDetail:
-    soup = BeautifulSoup(html, "html.parser") #парсим html
-    #Основные поля (название, работодатель, город) берем селекторами со страницы, 
+@timed("parse_detail")
+def parse_vacancy_detail(html: str, url: str, brief: VacancyBrief, backend: str = "bs4")->VacancyDetail:
+    f = _backend(_DETAIL_BACKENDS, backend)(html)
+    #Основные поля (название, работодатель, город) берем со страницы,
     #если ничего нет - подставляем значения из VacancyBrief
-    name = text_or_none(soup.select_one('h1[data-qa="vacancy-title"]')) or brief.name
-    emp = text_or_none(soup.select_one('[data-qa="vacancy-company-name"]')) or brief.employer_name
-    area = text_or_none(soup.select_one('[data-qa="vacancy-view-location"]')) or brief.area_name
-   
-    salary_text = text_or_none(soup.select_one('[data-qa="vacancy-salary"], [data-qa="vacancy-view-salary"]'))  #блок зарплаты 
-    s_from, s_to, s_cur = parse_salary(salary_text) #передаем блок зп в parse_salary
-    
-    #опыт, занятость и график вытаскиваем из соответствующих элементов.
-    experience = text_or_none(soup.select_one('[data-qa="vacancy-experience"]'))
-    employment = text_or_none(soup.select_one('[data-qa="vacancy-view-employment-mode"]'))
-    schedule = text_or_none(soup.select_one('[data-qa="vacancy-schedule"]'))
-    #навыки (собираем все элементы в список строк)
-    skills = [t.text.strip() for t in soup.select('[data-qa="skills-element"]')]
+    name = f["name"] or brief.name
+    emp = f["employer"] or brief.employer_name
+    area = f["area"] or brief.area_name
+    #id работодателя и региона на hh - из ссылок страницы, иначе из карточки (если название то же)
+    emp_id = hh_employer_id(f["employer_href"]) or (brief.employer_id if emp == brief.employer_name else None)
+    area_id = hh_area_id(f["area_href"])
+    if area_id is None and area == brief.area_name:
+        area_id = brief.area_id
+
+    salary = normalize_salary(f["salary"]) if f["salary"] else None #разбираем блок зп
+
     #дата публикации. Берем ее из карточки, если нет - текст из списка
-    pub = text_or_none(soup.select_one('[data-qa="vacancy-view-creation-time"]')) or brief.published_at_text
+    pub = f["pub"] or brief.published_at_text
     published_at = parse_published_at(pub) #приводим дату к datetime utc
 
     m = VACANCY_ID_RE.search(url) #вытаскиваем id вакансии
     v_id = int(m.group(1)) if m else brief.vacancy_id
 
     #возвроащаем полностью заполненный VacancyDetail, который дальше сохраним в БД
-    return VacancyDetail(v_id, name, url, emp, area, published_at, s_from, s_to, s_cur, schedule, employment, experience, skills)
-
-
+    s_from, s_to, s_cur, gross = salary or (None, None, None, None)
+    return VacancyDetail(v_id, name, url, emp, area, published_at, s_from, s_to, s_cur,
+                         f["schedule"], f["employment"], f["experience"], f["skills"], brief.fingerprint(), emp_id, area_id, gross,
+                         page_hash(html))
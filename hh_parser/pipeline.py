@@ -1,25 +1,98 @@
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
 
-from .config import SEARCH_URL
-from .http import get_http_session, http_get, safe_sleep
-from .models import Base
-from .parsing import parse_list_page
+from .config import SEARCH_URL, DEFAULT_PARSER_BACKEND, DEFAULT_DIM_CACHE_SIZE, DEFAULT_RATE, DEFAULT_SINK, DEFAULT_CACHE_NAME, DEFAULT_HTTP_CACHE_MAX_MB
+from . import checkpoint
+from .archive import HtmlArchive
+from .dimcache import DimensionCache
+from .errors import GoneError
+from .incremental import filter_changed, stored_hashes, unchanged
+from .jobs import SearchJob
+from .http import get_http_session, http_get
+from .models import init_db
+from .parsing import parse_list_page, parse_found_count
+from .planner import QueryPlanner, parse_facets
 from .schemas import VacancyBrief
-from .upsert import upsert_vacancy
+from .sinks import Sink, open_sinks
+from .upsert import record_matches
 from .parsing import parse_vacancy_detail
-from tenacity import retry, stop_after_attempt, wait_exponential_jitter
+from .ratelimit import AdaptiveRateLimiter
 
 import requests
 
 #данная функция отвечает за загрузку html-страницы конкретной вакансии с hh и ее разбор через parse_vacancy_detail
-@retry(wait=wait_exponential_jitter(initial=0.5, max=4), stop=stop_after_attempt(5))
-def fetch_vacancy_detail(session: requests.Session, url: str, brief: VacancyBrief):
-    r = session.get(url, timeout=30) #берем html конкретной страницы (с кэшем, если включен)
-    r.raise_for_status() #проверка статуса (выбрасываем исключение, если сервер вернул ошибку)
-    safe_sleep(r) #пауза между запросами
-    return parse_vacancy_detail(r.text, url, brief) #разбираем html и возвращаем VacancyDetail
+#повторы, проверка статуса и пауза между запросами (лимитер) - внутри http_get.
+#stored - сохраненные отпечатки этой вакансии (incremental.stored_hashes): если страница та же, возвращает None без разбора
+def fetch_vacancy_detail(session: requests.Session, url: str, brief: VacancyBrief, backend: str = DEFAULT_PARSER_BACKEND,
+                         limiter: AdaptiveRateLimiter | None = None, archive: HtmlArchive | None = None,
+                         stored: tuple[str, str] | None = None):
+    #берем html конкретной страницы (с кэшем, если включен). r.text декодирует тело при каждом обращении,
+    #поэтому строка берется один раз, а ответ сразу отпускается
+    html = http_get(session, url, limiter=limiter, stage="detail").text
+    if archive is not None: #в архив - до разбора, чтобы страницу можно было разобрать заново, даже если сейчас не вышло
+        archive.put_detail(brief, html)
+    if unchanged(stored, brief, html): #страница не менялась с прошлой записи - разбирать и писать нечего
+        return None
+    return parse_vacancy_detail(html, url, brief, backend) #разбираем html и возвращаем VacancyDetail
+
+#качает одну детальную страницу. Ошибку возвращает, а не бросает: в пуле потоков одна упавшая страница
+#не должна прерывать остальные
+def _fetch_one(http, br: VacancyBrief, backend: str, limiter: AdaptiveRateLimiter, archive: HtmlArchive | None,
+               stored: tuple[str, str] | None = None):
+    try:
+        return fetch_vacancy_detail(http, br.url, br, backend, limiter, archive, stored), None
+    except Exception as e:
+        return None, e
+
+#пул потоков для детальных страниц (--workers). Потоки только качают и разбирают страницы, сессия БД и приемники
+#остаются в основном потоке. При ошибке или Ctrl+C еще не начатые загрузки отменяются
+@contextmanager
+def _fetch_pool(workers: int):
+    if workers <= 1:
+        yield None
+        return
+    pool = ThreadPoolExecutor(workers, thread_name_prefix = "hh-fetch")
+    try:
+        yield pool
+    finally:
+        pool.shutdown(cancel_futures = True)
+
+#качает детальные страницы карточек и сохраняет их через приемник (для db - в текущей транзакции).
+#С пулом страницы качаются параллельно, но результаты разбираются в порядке карточек, так что запись и коммиты
+#идут в том же порядке, что и без пула.
+#Не скачавшиеся страницы не роняют обход, а помечаются в crawl_items на повтор (удаленные - как gone, без повтора).
+#skip_unchanged - не разбирать и не писать страницы, которые совпали с сохраненными (только для приемника db:
+#файловым приемникам нужна каждая запись).
+#Возвращает (сохранено, не скачалось, не изменилось)
+def _fetch_and_store(sess: Session, http, briefs: list[VacancyBrief], backend: str, limiter: AdaptiveRateLimiter,
+                     sink: Sink, archive: HtmlArchive | None = None, pool: ThreadPoolExecutor | None = None,
+                     skip_unchanged: bool = False)->tuple[int, int, int]:
+    stored = stored_hashes(sess, briefs) if skip_unchanged else {} #один запрос по индексу vacancy_id на страницу
+    fetch = lambda br: _fetch_one(http, br, backend, limiter, archive, stored.get(br.vacancy_id))
+    dets = []
+    same = []
+    failed = 0
+    for br, (det, error) in zip(briefs, pool.map(fetch, briefs) if pool is not None else map(fetch, briefs)):
+        if error is None:
+            if det is None:
+                same.append(br.vacancy_id)
+            else:
+                dets.append(det)
+            continue
+        checkpoint.mark_failed(sess, br, error)
+        if not isinstance(error, GoneError):
+            failed += 1
+    saved = sink.write(sess, dets) #сохраняем страницу целиком (в БД - включая работодателей, регионы, навыки)
+    checkpoint.mark_done(sess, [d.vacancy_id for d in dets] + same)
+    return saved, failed, len(same)
+
+#первая страница запроса для планировщика (--split): сколько вакансий нашел hh.
+#Страница остается в http-кэше, и обход подзапроса начнется с попадания
+def _count_found(http, job: SearchJob, per_page: int, limiter: AdaptiveRateLimiter)->int | None:
+    return parse_found_count(http_get(http, SEARCH_URL, job.search_params(0, per_page), limiter, stage="list").text)
 
 #данная функция ходит по страницам поиска, грузит карточки вакансий, извлекает детали и сохраняет в БД
 def crawl_and_store(
@@ -29,24 +102,124 @@ def crawl_and_store(
     per_page: int = 50, #сколько вакансий на странице (обычно от 10 до 100)
     area: int | None = None, #необязательный id региона
     cache_ttl: int = 60, #время жизни кэша запросов в минутах
-    cache_name: str = ".cache/http_cache_bs", #путь к файлу кэша
+    cache_name: str = DEFAULT_CACHE_NAME, #путь к файлу кэша (общий с async, см. httpcache.py)
+    cookies_file: str | None = None, #путь к файлу с куки
+    parser_backend: str = DEFAULT_PARSER_BACKEND, #движок извлечения полей из html (bs4, lxml, stream)
+    dim_cache_size: int = DEFAULT_DIM_CACHE_SIZE, #размер кэша справочников (0 - без кэша)
+    incremental: bool = False, #качать детальные страницы только для новых/изменившихся вакансий
+    rate: float = DEFAULT_RATE, #целевая частота запросов к сайту, запр/сек
+    resume: bool = False, #продолжить прерванный обход с сохраненного места (crawl_state/crawl_items)
+    archive_path: str | None = None, #путь к архиву html (None - не архивировать)
+    sink_spec: str = DEFAULT_SINK, #куда писать вакансии (см. sinks.py)
+    workers: int = 1, #сколько потоков качают детальные страницы (1 - по одной)
+    cache_max_mb: float = DEFAULT_HTTP_CACHE_MAX_MB, #предел размера http-кэша, МБ
+    split: str | None = None, #делить не помещающийся в выдачу запрос на подзапросы по этим фасетам (см. planner.py)
 ):
-    http = get_http_session(cache_name, cache_ttl) #http-сессия с кэшем
+    http = get_http_session(cache_name, cache_ttl, cookies_file, workers, cache_max_mb) #http-сессия с кэшем
+    limiter = AdaptiveRateLimiter(rate) #ограничитель частоты запросов
     engine = create_engine(db_url, future = True) #подключаемся к БД
-    Base.metadata.create_all(engine) #создаем таблицы при первом запуске
+    init_db(engine) #создаем таблицы (и недостающие индексы) при первом запуске
     total = 0
+    skipped = 0
+    same = 0 #страницы, совпавшие с сохраненными (разбор и запись пропущены)
+    jobs = [SearchJob(text, area)]
+    job_pages = {jobs[0]: pages} #сколько страниц пройти в каждом задании (у подзапросов - по счетчику)
+    seen = set() #vacancy_id, уже взятые одним из подзапросов (дедупликация)
+    cards = 0 #сколько карточек пришло со страниц списка по всем подзапросам
+    archive = HtmlArchive(archive_path) if archive_path else None
     
-    with Session(engine) as sess: #открываем транзакцию
-        for p in range(pages): #цикл по страницам
-            html = http_get(http, SEARCH_URL, {"text": text, "page": p, "items_on_page": per_page, "area": area}).text #извлекаем html страницы поиска
-            briefs = parse_list_page(html) #парсим список карточек вакансий
-            if not briefs: #если пусто выходим
-                break;
-
-            for br in briefs: #цикл по карточкам вакансий
-                det = fetch_vacancy_detail(http, br.url, br) #для каждой вакансии грузим детальную страницу
-                upsert_vacancy(sess, det)  #сохраняем (обновляем) в БД, включая работодателя, регион, навыки
-                total += 1
-            sess.commit() #фиксация изменения
-
-        print(f"Сохранено вакансий: {total}")
\ No newline at end of file
+    cache = DimensionCache(dim_cache_size) #кэш имя -> id для работодателей, регионов, навыков
+    #открываем транзакцию, приемники вакансий и пул потоков (по выходу закрывается и http-сессия с файлом кэша)
+    with http, Session(engine) as sess, open_sinks(sink_spec, cache) as sink, _fetch_pool(workers) as pool:
+        cache.attach(sess).warm(sess)
+        skip_unchanged = all(s.name == "db" for s in sink.sinks)
+        if split: #запрос, не помещающийся в выдачу hh, делим на подзапросы (первые страницы проверяются пулом потоков)
+            plan = QueryPlanner(parse_facets(split), per_page, pages).run(
+                jobs, lambda j: _count_found(http, j, per_page, limiter), pool.map if pool is not None else map)
+            plan.report()
+            jobs, job_pages = plan.jobs, plan.pages
+        if resume: #сначала докачиваем хвост прошлого запуска, потом продолжаем со следующей страницы
+            checkpoint.rearm_failed(sess, jobs)
+            items = [br for br, _ in checkpoint.load_items(sess, jobs)]
+            first_pages = {job: checkpoint.start_page(sess, job) for job in jobs}
+            if len(jobs) == 1:
+                first = first_pages[jobs[0]]
+                print(f"Продолжение обхода: в хвосте {len(items)} вакансий, "
+                      + ("выдача уже пройдена" if first is None else f"со страницы {first}"))
+            else:
+                print(f"Продолжение обхода: в хвосте {len(items)} вакансий, подзапросов пройдено "
+                      f"{sum(p is None or p >= job_pages[j] for j, p in first_pages.items())} из {len(jobs)}")
+            seen.update(br.vacancy_id for br in items)
+            saved, failures, n = _fetch_and_store(sess, http, items, parser_backend, limiter, sink, archive, pool, skip_unchanged)
+            total += saved
+            same += n
+            sess.commit()
+        else: #новый обход: прогресс прошлых запусков этого запроса забываем
+            checkpoint.reset(sess, jobs)
+            first_pages, failures = {}, 0
+            sess.commit()
+
+        for job in jobs: #подзапросы по очереди (без --split - один исходный запрос)
+            first = first_pages.get(job, 0)
+            last = job_pages[job]
+            for p in range(first if first is not None else last, last): #цикл по страницам
+                params = job.search_params(p, per_page)
+                html = http_get(http, SEARCH_URL, params, limiter, stage="list").text #извлекаем html страницы поиска
+                if archive is not None:
+                    archive.put_list(SEARCH_URL, params, html)
+                briefs = parse_list_page(html, parser_backend) #парсим список карточек вакансий
+                if not briefs: #если пусто выходим
+                    checkpoint.mark_finished(sess, job)
+                    sess.commit()
+                    break;
+
+                record_matches(sess, [(br.vacancy_id, job) for br in briefs]) #запоминаем, какой запрос нашел вакансии
+                cards += len(briefs)
+                briefs = [br for br in briefs if br.vacancy_id not in seen] #уже взятые другим подзапросом не качаем
+                seen.update(br.vacancy_id for br in briefs)
+                if incremental: #отбрасываем карточки, которые уже сохранены и не менялись
+                    todo = filter_changed(sess, briefs)
+                    skipped += len(briefs) - len(todo)
+                    briefs = todo
+
+                checkpoint.mark_page(sess, job, p, briefs) #страница пройдена, в хвосте остаются только не скачавшиеся
+                #для каждой вакансии грузим детальную страницу
+                saved, failed, n = _fetch_and_store(sess, http, briefs, parser_backend, limiter, sink, archive, pool, skip_unchanged)
+                total += saved
+                same += n
+                failures += failed
+                sess.commit() #фиксация изменения
+
+        #повторные проходы по не скачавшимся страницам (у каждой не больше checkpoint.MAX_ATTEMPTS попыток)
+        while failures:
+            retry = [br for br, _ in checkpoint.load_items(sess, jobs, only_failed = True)]
+            if not retry:
+                break
+            print(f"Повторный проход: {len(retry)} вакансий не скачались")
+            saved, failures, n = _fetch_and_store(sess, http, retry, parser_backend, limiter, sink, archive, pool, skip_unchanged)
+            total += saved
+            same += n
+            sess.commit()
+
+        left = len(checkpoint.load_items(sess, jobs))
+        gone = checkpoint.count_gone(sess, jobs)
+        print(f"Сохранено вакансий: {total}")
+        if len(jobs) > 1:
+            print(f"Подзапросов: {len(jobs)}, карточек в выдаче: {cards}, уникальных вакансий: {len(seen)} "
+                  f"(повторов между подзапросами: {cards - len(seen)})")
+        if incremental:
+            print(f"Пропущено без изменений (детальные страницы не качали): {skipped}")
+        if same:
+            print(f"Страница вакансии не изменилась (разбор и запись пропущены): {same}")
+        if gone:
+            print(f"Удалены с сайта (404/410, не повторялись): {gone}")
+        if left:
+            print(f"Не удалось скачать: {left} вакансий (остались в crawl_items, повторятся при --resume)")
+        cache.report()
+        sink.report()
+        if archive is not None:
+            archive.report()
+            archive.close()
+        http.cache.report()
+        print(f"Лимитер: итоговая частота {limiter.rate:.2f} запр/с, просьб притормозить (429/503): {limiter.throttled}, "
+              f"срабатываний предохранителя: {limiter.breaker.trips}")
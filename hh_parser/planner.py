@@ -0,0 +1,141 @@
+#planner.py
+#планировщик поисковых запросов (--split). hh отдает по одному запросу не больше SEARCH_RESULTS_CAP вакансий:
+#дальше страницы выдачи пустые, и обход широкого запроса ("Python" по Москве) доходил до пустой страницы,
+#молча теряя большую часть вакансий.
+#Планировщик качает первую страницу запроса и читает счетчик "Найдено N вакансий" (parsing.parse_found_count):
+#- N <= SEARCH_RESULTS_CAP - запрос помещается и проходится ровно ceil(N / per_page) страниц (без пустой в конце)
+#- N > SEARCH_RESULTS_CAP - запрос делится на подзапросы по следующему фасету из --split, подзапросы проверяются так же,
+#  пока каждый не поместится
+#- счетчика нет (другая верстка) - запрос проходится как раньше, до пустой страницы, но не дальше --pages
+#Фасеты делят выдачу без пересечений, поэтому вместе подзапросы покрывают весь запрос:
+#- date - окна даты публикации (date_from/date_to): последние SPLIT_DATE_DAYS дней и все, что раньше.
+#  Окно, которое не помещается, делится пополам (не мельче SPLIT_MIN_WINDOW), так что подзапросов столько, сколько нужно
+#- experience, schedule, employment - значения фильтров hh (у вакансии одно значение каждого)
+#Регион и зарплата фасетами не стали: фильтр зарплаты у hh - порог "от" (диапазоны пересекаются, вакансии без зарплаты
+#не попадают ни в один), а для деления региона нужно дерево регионов hh.
+#Первые страницы подзапросов одного уровня качаются одновременно (async - gather, sync - пулом --workers),
+#а при обходе страница 0 подзапроса берется уже из http-кэша. Вакансию, попавшую в два подзапроса
+#(на границе окон или выдача сдвинулась), конвейер качает один раз
+from __future__ import annotations
+import asyncio
+import math
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .config import SEARCH_RESULTS_CAP, SPLIT_FACETS
+from .jobs import SearchJob
+
+SPLIT_DATE_DAYS = 30 #первое окно даты публикации - последние 30 дней (остальное - одним подзапросом "раньше")
+SPLIT_MIN_WINDOW = timedelta(hours=1) #окна мельче часа не делятся - дальше в дело идут следующие фасеты
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S" #формат date_from/date_to в параметрах поиска hh
+
+#значения фильтров hh: каждое значение - отдельный подзапрос
+FACET_VALUES = {
+    "experience": ("noExperience", "between1And3", "between3And6", "moreThan6"),
+    "schedule": ("fullDay", "shift", "flexible", "remote", "flyInFlyOut"),
+    "employment": ("full", "part", "project", "volunteer", "probation"),
+}
+
+#разбирает --split: фасеты через запятую в порядке применения
+def parse_facets(spec: str)->List[str]:
+    facets = list(dict.fromkeys(f.strip() for f in spec.split(",") if f.strip()))
+    bad = [f for f in facets if f not in SPLIT_FACETS]
+    if bad:
+        raise ValueError(f"Неизвестный фасет: {', '.join(bad)} (доступны: {', '.join(SPLIT_FACETS)})")
+    if not facets:
+        raise ValueError("Не указан ни один фасет")
+    return facets
+
+#итог планирования: какие подзапросы обходить и сколько страниц в каждом
+@dataclass
+class SearchPlan:
+    cap: int = SEARCH_RESULTS_CAP
+    roots: List[SearchJob] = field(default_factory=list) #исходные запросы
+    jobs: List[SearchJob] = field(default_factory=list) #подзапросы для обхода (запрос, который поместился, остается как есть)
+    pages: Dict[SearchJob, int] = field(default_factory=dict) #сколько страниц пройти в каждом подзапросе
+    found: Dict[SearchJob, Optional[int]] = field(default_factory=dict) #счетчик каждого проверенного запроса
+    truncated: List[SearchJob] = field(default_factory=list) #не поместились, а делить дальше нечем
+    probes: int = 0 #сколько первых страниц скачано при планировании
+
+    def report(self):
+        total = sum(self.found[j] or 0 for j in self.roots)
+        covered = sum(min(self.found[j], self.cap) for j in self.jobs if self.found[j] is not None)
+        print(f"План запросов: {len(self.roots)} -> {len(self.jobs)} подзапросов, проверено первых страниц: {self.probes}, "
+              f"найдено {total}, в выдачу помещается {covered} ({covered / total * 100 if total else 100:.0f}%), "
+              f"страниц списка: {sum(self.pages.values())}")
+        for job in self.truncated:
+            print(f"Не делится дальше: {job.key} - найдено {self.found[job]}, hh отдаст только {self.cap}")
+
+class QueryPlanner:
+    def __init__(self, facets: List[str], per_page: int, pages: int, cap: int = SEARCH_RESULTS_CAP,
+                 now: Optional[datetime] = None):
+        self.facets = facets
+        self.per_page = max(1, per_page)
+        self.pages = pages #сколько страниц проходить у запроса без счетчика
+        self.cap = cap
+        #границы окон привязаны к началу суток (UTC): в течение дня план тот же, и --resume находит прогресс подзапросов
+        day = (now or datetime.now(timezone.utc)).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        self.since = day - timedelta(days=SPLIT_DATE_DAYS)
+        self.horizon = day + timedelta(days=1) #верхняя граница последнего окна (оно открыто сверху) при делении пополам
+        self.plan = SearchPlan(cap)
+
+    #окна даты публикации для запроса. None - делить по дате уже нечего
+    def _windows(self, job: SearchJob)->Optional[List[SearchJob]]:
+        f = dict(job.filters)
+        if "date_from" not in f and "date_to" not in f:
+            since = self.since.strftime(DATE_FORMAT)
+            return [job.refine(date_from=since), job.refine(date_to=since)]
+        if "date_from" not in f: #все, что раньше первого окна: нижней границы нет, пополам не делится
+            return None
+        lo = datetime.strptime(f["date_from"], DATE_FORMAT)
+        hi = datetime.strptime(f["date_to"], DATE_FORMAT) if "date_to" in f else self.horizon
+        half = (hi - lo) / 2
+        if half < SPLIT_MIN_WINDOW:
+            return None
+        mid = (lo + half // SPLIT_MIN_WINDOW * SPLIT_MIN_WINDOW).strftime(DATE_FORMAT) #граница - по целым часам
+        return [job.refine(date_to=mid), job.refine(date_from=mid)]
+
+    #подзапросы по первому фасету, который к запросу еще можно применить. None - фасеты кончились
+    def _split(self, job: SearchJob)->Optional[List[SearchJob]]:
+        applied = dict(job.filters)
+        for facet in self.facets:
+            if facet == "date":
+                children = self._windows(job)
+                if children:
+                    return children
+            elif facet not in applied:
+                return [job.refine(**{facet: v}) for v in FACET_VALUES[facet]]
+        return None
+
+    #учитывает счетчик запроса: запрос либо идет в план, либо делится. Возвращает подзапросы, которые нужно проверить
+    def visit(self, job: SearchJob, found: Optional[int])->List[SearchJob]:
+        plan = self.plan
+        plan.probes += 1
+        plan.found[job] = found
+        if found is not None and found > self.cap:
+            children = self._split(job)
+            if children:
+                return children
+            plan.truncated.append(job)
+        if found == 0: #пустой подзапрос обходить незачем
+            return []
+        plan.jobs.append(job)
+        plan.pages[job] = self.pages if found is None else math.ceil(min(found, self.cap) / self.per_page)
+        return []
+
+    #планирование уровнями: probe(job) качает первую страницу и возвращает счетчик. map_fn - чем проверять
+    #подзапросы одного уровня (map пула потоков - одновременно)
+    def run(self, roots: Iterable[SearchJob], probe: Callable, map_fn: Callable = map)->SearchPlan:
+        level = self.plan.roots = list(roots)
+        while level:
+            level = [child for job, found in zip(level, list(map_fn(probe, level))) for child in self.visit(job, found)]
+        return self.plan
+
+    #то же для async: подзапросы уровня проверяются одновременно (probe - корутина)
+    async def run_async(self, roots: Iterable[SearchJob], probe: Callable)->SearchPlan:
+        level = self.plan.roots = list(roots)
+        while level:
+            found = await asyncio.gather(*(probe(job) for job in level))
+            level = [child for job, n in zip(level, found) for child in self.visit(job, n)]
+        return self.plan
@@ -0,0 +1,211 @@
+#ratelimit.py
+#адаптивный ограничитель частоты запросов (token bucket + AIMD), общий для синхронного и асинхронного клиента.
+#Вместо фиксированной паузы 0.4 сек после каждого ответа:
+#- запросы идут с целевой частотой rate запр/сек на весь процесс (а не на каждый поток/корутину)
+#- на 429/503 частота умножается на decrease, а при заголовке Retry-After все запросы ставятся на паузу
+#- пока ответы здоровые, частота каждые healthy_streak ответов растет на increase, пока не вернется к целевой
+#- ответы из кэша токен не тратят
+#- предохранитель (CircuitBreaker): если доля ошибок резко выросла (капча, бан, сайт лежит), весь обход встает на паузу
+from __future__ import annotations
+import asyncio
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from .config import DEFAULT_RATE
+from . import metrics
+from .errors import is_error_status
+
+#коды, по которым сервер просит притормозить
+THROTTLE_STATUSES = frozenset((429, 503))
+
+#разбирает Retry-After: число секунд или http-дата. Возвращает паузу в секундах (или None)
+def parse_retry_after(value: Optional[str])->Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+#предохранитель (circuit breaker): если за последние window секунд ошибок (таймауты, обрывы, 403, 429, 5xx) стало
+#не меньше threshold от всех ответов, все запросы ставятся на паузу cooldown секунд - вместо тысяч заведомо
+#неудачных запросов. Если сразу после паузы он срабатывает снова, пауза удваивается (до max_cooldown)
+class CircuitBreaker:
+    def __init__(
+        self,
+        threshold: float = 0.5, #доля ошибок, при которой срабатывает (0 - выключен)
+        window: float = 30.0, #окно подсчета, сек
+        min_requests: int = 20, #меньше ответов в окне - не срабатывает (одна ошибка из двух - не повод)
+        cooldown: float = 30.0, #пауза после срабатывания, сек
+        max_cooldown: float = 600.0, #предел для удвоения паузы
+        verbose: bool = True,
+    ):
+        self.threshold = threshold
+        self.window = window
+        self.min_requests = min_requests
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.verbose = verbose
+
+        self._lock = threading.Lock()
+        self._events: deque[tuple[float, bool]] = deque() #(время, ошибка ли)
+        self._errors = 0
+        self._cooldown = cooldown
+        self._recheck_until = 0.0 #до этого момента повторное срабатывание удваивает паузу
+        self.open_until = 0.0
+        self.trips = 0 #сколько раз срабатывал
+
+    def record(self, error: bool):
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now < self.open_until: #ответы на запросы, отправленные до паузы, уже ничего не решают
+                return
+            self._events.append((now, error))
+            self._errors += error
+            while self._events and self._events[0][0] < now - self.window:
+                _, e = self._events.popleft()
+                self._errors -= e
+            n = len(self._events)
+            if n >= self.min_requests and self._errors / n >= self.threshold:
+                self._trip(now, self._errors / n)
+
+    def _trip(self, now: float, ratio: float):
+        self._cooldown = min(self.max_cooldown, self._cooldown * 2) if now < self._recheck_until else self.base_cooldown
+        self.open_until = now + self._cooldown
+        self._recheck_until = self.open_until + self.window
+        self._events.clear()
+        self._errors = 0
+        self.trips += 1
+        if self.verbose:
+            print(f"Предохранитель: ошибок {ratio:.0%} за {self.window:.0f} сек, обход на паузе {self._cooldown:.0f} сек")
+
+    def pause_left(self)->float:
+        return max(0.0, self.open_until - time.monotonic())
+
+class AdaptiveRateLimiter:
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE, #целевая частота, запр/сек (выше нее не разгоняемся)
+        min_rate: float = 0.2, #ниже этой частоты не опускаемся
+        burst: float = 1.0, #сколько токенов может накопиться в простое
+        decrease: float = 0.5, #во сколько раз снижаем частоту на 429/503
+        increase: float = 0.25, #на сколько запр/сек поднимаем частоту после серии здоровых ответов
+        healthy_streak: int = 20, #длина серии здоровых ответов
+        verbose: bool = True, #печатать изменения частоты
+        breaker: Optional[CircuitBreaker] = None, #предохранитель (по умолчанию - с настройками по умолчанию)
+    ):
+        self.target_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst
+        self.decrease = decrease
+        self.increase = increase
+        self.healthy_streak = healthy_streak
+        self.verbose = verbose
+        self.breaker = breaker if breaker is not None else CircuitBreaker(verbose=verbose)
+
+        self._lock = threading.Lock() #общий лимитер используется из нескольких потоков
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._paused_until = 0.0
+        self._cooldown_until = 0.0 #до этого момента повторные 429/503 частоту не снижают
+        self._streak = 0
+        self.throttled = 0 #сколько раз сервер просил притормозить
+
+    #резервирует токен и возвращает, сколько нужно подождать до его появления.
+    #токены могут уйти в минус - это очередь из уже зарезервированных запросов
+    def reserve(self)->float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now, self.breaker.open_until - now)
+
+    #сколько осталось до конца паузы, объявленной сервером (Retry-After) или предохранителем
+    def pause_left(self)->float:
+        return max(0.0, self._paused_until - time.monotonic(), self.breaker.pause_left())
+
+    #запрос не дошел до ответа (таймаут, обрыв соединения) - для предохранителя это ошибка
+    def on_error(self):
+        self.breaker.record(True)
+
+    #учитывает ответ сервера (только не из кэша) и подстраивает частоту
+    def on_response(self, status: int, retry_after: Optional[str] = None):
+        self.breaker.record(is_error_status(status))
+        with self._lock:
+            if status in THROTTLE_STATUSES:
+                self.throttled += 1
+                self._streak = 0
+                now = time.monotonic()
+                pause = parse_retry_after(retry_after)
+                self._paused_until = max(self._paused_until, now + (pause if pause is not None else 0.0))
+                #запросы, которые уже были в полете, тоже получат 429 - снижаем частоту один раз на "волну"
+                if now < self._cooldown_until:
+                    return
+                old = self.rate
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._cooldown_until = now + max(pause or 0.0, 1 / self.rate)
+                self._log(f"сервер ответил {status}, частота {old:.2f} -> {self.rate:.2f} запр/с"
+                          + (f", пауза {pause:.1f} сек" if pause else ""))
+                return
+            if status >= 500: #прочие 5xx частоту не трогают, но и разгоняться не дают
+                self._streak = 0
+                return
+            self._streak += 1
+            if self._streak >= self.healthy_streak and self.rate < self.target_rate:
+                self._streak = 0
+                self.rate = min(self.target_rate, self.rate + self.increase)
+                self._log(f"ответы в норме, частота -> {self.rate:.2f} запр/с")
+
+    def _log(self, msg: str):
+        if self.verbose:
+            print(f"Лимитер: {msg}")
+
+    #синхронные ожидания (для requests)
+    def wait_pause(self):
+        left = self.pause_left()
+        if left > 0:
+            metrics.get().observe("ratelimit_wait", left)
+            time.sleep(left)
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            metrics.get().observe("ratelimit_wait", delay)
+            time.sleep(delay)
+
+    #асинхронные ожидания (для aiohttp): усыпляют только текущую задачу
+    async def wait_pause_async(self):
+        left = self.pause_left()
+        if left > 0:
+            metrics.get().observe("ratelimit_wait", left)
+            await asyncio.sleep(left)
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        if delay > 0:
+            metrics.get().observe("ratelimit_wait", delay)
+            await asyncio.sleep(delay)
+
+#общий для процесса лимитер: им пользуются http_get и http_get_async, если свой не передан
+_default_limiter: Optional[AdaptiveRateLimiter] = None
+
+def get_default_limiter()->AdaptiveRateLimiter:
+    global _default_limiter
+    if _default_limiter is None:
+        _default_limiter = AdaptiveRateLimiter()
+    return _default_limiter
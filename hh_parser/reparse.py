@@ -0,0 +1,110 @@
+#reparse.py
+#пересборка таблицы vacancies из архива html (см. archive.py) без обращения к сети.
+#Нужна, когда hh поменял верстку и селекторы в parsing.py поправлены: вместо нового обхода
+#последняя скачанная версия каждой вакансии разбирается заново на всех ядрах и записывается через upsert_vacancies.
+#запуск: python -m hh_parser.reparse --archive .cache/html_archive.sqlite --db sqlite:///hh_bs.sqlite3
+from __future__ import annotations
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+from typing import List, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from .archive import HtmlArchive
+from .config import DEFAULT_DB_URL, DEFAULT_ARCHIVE_PATH, DEFAULT_PARSER_BACKEND, DEFAULT_DIM_CACHE_SIZE
+from .dimcache import DimensionCache
+from .models import init_db
+from .parsing import PARSER_BACKENDS, parse_vacancy_detail
+from .schemas import VacancyBrief, VacancyDetail
+from .upsert import upsert_vacancies
+
+CHUNK = 200 #сколько вакансий отдаем процессу за раз (и пишем одной пачкой)
+REPORT_ERRORS = 5 #сколько неразобранных страниц показать в отчете (с ошибкой), остальные только считаются
+
+#выполняется в дочернем процессе: каждый открывает архив сам (соединение sqlite через pickle не передать).
+#Возвращает разобранные вакансии, число страниц, которые не разобрались, и первые из них: (hash, url, ошибка).
+#Ошибка передается строкой (repr, как в crawl_items.error): не всякое исключение переживет pickle между процессами
+def _parse_chunk(archive_path: str, items: List[tuple[str, str, VacancyBrief]], backend: str
+                 )->tuple[List[VacancyDetail], int, List[tuple[str, str, str]]]:
+    arch = HtmlArchive(archive_path, readonly=True)
+    out, failed, errors = [], 0, []
+    try:
+        for h, url, brief in items:
+            try:
+                out.append(parse_vacancy_detail(arch.get(h), url, brief, backend))
+            except Exception as e:
+                failed += 1
+                if len(errors) < REPORT_ERRORS:
+                    errors.append((h, url, repr(e)[:512]))
+    finally:
+        arch.conn.close()
+    return out, failed, errors
+
+def _chunks(it, size: int):
+    it = iter(it)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+def reparse(
+    archive_path: str, #путь к архиву html
+    db_url: str, #куда писать вакансии
+    workers: Optional[int] = None, #сколько процессов (по умолчанию - все ядра, 0 - без пула)
+    parser_backend: str = DEFAULT_PARSER_BACKEND, #движок извлечения полей из html
+    dim_cache_size: int = DEFAULT_DIM_CACHE_SIZE, #размер кэша справочников
+)->int:
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    arch = HtmlArchive(archive_path, readonly=True)
+    items = list(arch.latest_details())
+    arch.conn.close()
+
+    engine = create_engine(db_url, future = True)
+    init_db(engine)
+    total, failed, errors = 0, 0, []
+    start = time.perf_counter()
+    with Session(engine) as sess:
+        cache = DimensionCache(dim_cache_size).attach(sess).warm(sess)
+        chunks = _chunks(items, CHUNK)
+        if workers > 0:
+            pool = ProcessPoolExecutor(workers)
+            results = pool.map(_parse_chunk, repeat(archive_path), chunks, repeat(parser_backend))
+        else:
+            pool = None
+            results = (_parse_chunk(archive_path, c, parser_backend) for c in chunks)
+        try:
+            for dets, bad, bad_pages in results: #пока пишем одну пачку, процессы разбирают следующие
+                total += upsert_vacancies(sess, dets, cache)
+                failed += bad
+                errors.extend(bad_pages[:REPORT_ERRORS - len(errors)])
+                sess.commit()
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures = True)
+
+    wall = time.perf_counter() - start
+    print(f"Пересобрано вакансий из архива: {total} из {len(items)} за {wall:.2f} сек "
+          f"({total / wall if wall else 0:.0f} вак/сек, процессов: {workers or 1})")
+    if failed:
+        print(f"Не удалось разобрать: {failed}" + (f", первые {len(errors)}:" if failed > len(errors) else ":"))
+        for h, url, error in errors: #hash - ключ страницы в архиве (blobs), по нему ее можно достать и разобрать вручную
+            print(f"  {url} (страница {h[:12]}): {error}")
+    cache.report()
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Пересборка вакансий из архива html без сети")
+    parser.add_argument("--archive", default=DEFAULT_ARCHIVE_PATH, help="Путь к архиву html (см. --archive у hh_parser.main)")
+    parser.add_argument("--db", default=DEFAULT_DB_URL)
+    parser.add_argument("--workers", type=int, default=None, help="Сколько процессов под разбор (по умолчанию все ядра, 0 - без пула)")
+    parser.add_argument("--parser", dest="parser_backend", choices=PARSER_BACKENDS, default=DEFAULT_PARSER_BACKEND)
+    parser.add_argument("--dim-cache-size", type=int, default=DEFAULT_DIM_CACHE_SIZE)
+    args = parser.parse_args()
+    if not os.path.exists(args.archive):
+        parser.error(f"архив не найден: {args.archive}")
+    reparse(args.archive, args.db, args.workers, args.parser_backend, args.dim_cache_size)
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,58 @@
 from __future__ import annotations
 from dataclasses import dataclass #для упрощенного написания классов (чтобы не писать __init__ и тд)
+import hashlib
+import sys
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, Tuple
 
 #--------------------------------Дата-классы --------------------------------------
+#В больших обходах в памяти одновременно десятки тысяч карточек и вакансий (очереди конвейера, хвост crawl_items,
+#пачки записи), поэтому записи компактные:
+#- slots=True - без __dict__ у каждого объекта
+#- повторяющиеся строки (работодатель, регион, формат работы, опыт, валюта, навыки) интернируются:
+#  на весь процесс хранится одна копия "Москва" или "Python", а не по копии на вакансию
+#- навыки - кортеж, а не список
 
-@dataclass
+#интернирует строку (None и пустая строка остаются как есть)
+def _intern(s: Optional[str])->Optional[str]:
+    return sys.intern(s) if s else s
+
+class _Record:
+    __slots__ = ()
+
+    #pickle (пул процессов разбора) передает значения полей по порядку, а при распаковке вызывается __init__:
+    #строки интернируются заново уже в принимающем процессе
+    def __reduce__(self):
+        return type(self), tuple(getattr(self, f) for f in self.__dataclass_fields__)
+
+@dataclass(slots=True)
 #данный класс контейнер данных, который описывает короткую карточку вакансии из общего списка на hh
-class VacancyBrief:
+class VacancyBrief(_Record):
     vacancy_id: int #уникальный id вакансии
     name: str #название вакансии
     url: str #прямая ссылка на страницу вакансии
     employer_name: Optional[str] #название работодателя
     area_name: Optional[str] #название региона
     published_at_text: Optional[str] #текст даты публикации
+    employer_id: Optional[str] = None #id работодателя на hh (из ссылки /employer/<id>), если есть
+    area_id: Optional[int] = None #id региона на hh, если есть в ссылке
 
-@dataclass
+    def __post_init__(self):
+        self.employer_name = _intern(self.employer_name)
+        self.area_name = _intern(self.area_name)
+        self.published_at_text = _intern(self.published_at_text)
+        self.employer_id = _intern(self.employer_id)
+
+    #отпечаток карточки из списка: если он совпадает с сохраненным в БД, вакансия не менялась
+    #и детальную страницу можно не качать (режим --incremental)
+    def fingerprint(self)->str:
+        raw = "\x1f".join(str(x or "") for x in (self.vacancy_id, self.name, self.employer_name, self.published_at_text))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+@dataclass(slots=True)
 #данный класс представляет полное описание вакансии, получаемое с внутренней страницы вакансии
 #https://hh.ru/vacancy/<id>
-class VacancyDetail:
+class VacancyDetail(_Record):
     vacancy_id: int
     name: str
     url: str
@@ -27,8 +61,23 @@ class VacancyDetail:
     published_at: datetime
     salary_from: Optional[int] #нижняя граница з/п
     salary_to: Optional[int] #верхняя граница з/п
-    salary_currency: Optional[str] #RUR, руб
+    salary_currency: Optional[str] #код валюты hh: RUR, USD, EUR, KZT, UAH
     schedule: Optional[str] #формат работы (полный, удален. и тд)
     employment: Optional[str] #тип занятости (полная, частичная)
     experience: Optional[str] #опыт
-    skills: List[str] #список ключевых навыков
+    skills: Tuple[str, ...] #ключевые навыки
+    list_fingerprint: Optional[str] = None #отпечаток карточки из списка (VacancyBrief.fingerprint)
+    employer_id: Optional[str] = None #id работодателя на hh (см. ids.py)
+    area_id: Optional[int] = None #id региона на hh
+    salary_gross: Optional[bool] = None #з/п до вычета налогов (True), на руки (False), не указано (None)
+    detail_hash: Optional[str] = None #sha1 html детальной страницы (parsing.page_hash)
+
+    def __post_init__(self):
+        self.employer_name = _intern(self.employer_name)
+        self.area_name = _intern(self.area_name)
+        self.salary_currency = _intern(self.salary_currency)
+        self.schedule = _intern(self.schedule)
+        self.employment = _intern(self.employment)
+        self.experience = _intern(self.experience)
+        self.employer_id = _intern(self.employer_id)
+        self.skills = tuple(map(sys.intern, self.skills))
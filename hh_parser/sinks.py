@@ -0,0 +1,192 @@
+#sinks.py
+#куда пишутся разобранные вакансии. Аналитике нужны только плоские записи вакансий, а путь через ORM
+#и последующее чтение pandas'ом (open_bd.py) для этого дорогой. Поэтому запись вынесена в сменные приемники:
+#- db      - как раньше, upsert_vacancies в БД (--db) вместе с работодателями, регионами и навыками
+#- ndjson  - по JSON-объекту на строку (.gz - со сжатием), файл дописывается
+#- parquet - колоночный Parquet (нужен пакет pyarrow), каждая пачка - отдельная row group
+#- arrow   - Arrow IPC stream (тоже pyarrow)
+#Пачки пишутся по мере готовности детальных страниц и сразу уходят на диск, так что память не растет с числом страниц.
+#БД из --db при этом нужна всегда: в ней хранится служебное состояние обхода (crawl_state, crawl_items, vacancy_queries)
+#
+#--sink db,ndjson:out/vacancies.ndjson.gz,parquet:out/vacancies.parquet
+from __future__ import annotations
+import dataclasses
+import gzip
+import json
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from .dimcache import DimensionCache
+from .schemas import VacancyDetail
+from .upsert import upsert_vacancies
+
+SINK_KINDS = ("db", "ndjson", "parquet", "arrow")
+
+#плоская запись вакансии для файловых приемников
+def vacancy_record(d: VacancyDetail)->dict:
+    rec = dataclasses.asdict(d)
+    rec["published_at"] = d.published_at.isoformat() if d.published_at else None
+    return rec
+
+class Sink:
+    name = "sink"
+
+    def __init__(self):
+        self.rows = 0 #сколько вакансий записано
+
+    #пишет пачку вакансий. sess - служебная сессия обхода (нужна только приемнику db, коммитит ее обход)
+    def write(self, sess: Session, details: List[VacancyDetail])->int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close() #parquet без закрытия остается без футера, поэтому закрываем и при ошибке
+
+class DbSink(Sink):
+    name = "db"
+
+    def __init__(self, cache: Optional[DimensionCache] = None):
+        super().__init__()
+        self.cache = cache
+
+    def write(self, sess: Session, details: List[VacancyDetail])->int:
+        n = upsert_vacancies(sess, details, self.cache) #сохраняем (обновляем) в БД, включая работодателей, регионы, навыки
+        self.rows += n
+        return n
+
+class NdjsonSink(Sink):
+    name = "ndjson"
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        #файл дописывается: повторные обходы добавляют строки (последняя версия вакансии - ниже)
+        self.f = gzip.open(path, "at", encoding="utf-8") if path.endswith(".gz") else open(path, "a", encoding="utf-8")
+
+    def write(self, sess: Session, details: List[VacancyDetail])->int:
+        self.f.writelines(json.dumps(vacancy_record(d), ensure_ascii=False) + "\n" for d in details)
+        self.f.flush()
+        self.rows += len(details)
+        return len(details)
+
+    def close(self):
+        self.f.close()
+
+#parquet и arrow пишутся через pyarrow (необязательная зависимость, импортируется только при выборе такого приемника)
+def _arrow_schema():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError("Для приемников parquet/arrow нужен пакет pyarrow (pip install pyarrow)") from None
+    return pa, pa.schema([
+        ("vacancy_id", pa.int64()),
+        ("name", pa.string()),
+        ("url", pa.string()),
+        ("employer_name", pa.string()),
+        ("area_name", pa.string()),
+        ("published_at", pa.timestamp("us", tz="UTC")),
+        ("salary_from", pa.int64()),
+        ("salary_to", pa.int64()),
+        ("salary_currency", pa.string()),
+        ("schedule", pa.string()),
+        ("employment", pa.string()),
+        ("experience", pa.string()),
+        ("skills", pa.list_(pa.string())),
+        ("list_fingerprint", pa.string()),
+        ("employer_id", pa.string()),
+        ("area_id", pa.int64()),
+        ("salary_gross", pa.bool_()),
+        ("detail_hash", pa.string()),
+    ])
+
+class _ArrowSink(Sink):
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.pa, self.schema = _arrow_schema()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.writer = self._open()
+
+    def _open(self):
+        raise NotImplementedError
+
+    def write(self, sess: Session, details: List[VacancyDetail])->int:
+        if not details:
+            return 0
+        cols = {f: [getattr(d, f) for d in details] for f in self.schema.names}
+        self.writer.write_table(self.pa.Table.from_pydict(cols, schema=self.schema)) #пачка сразу уходит на диск
+        self.rows += len(details)
+        return len(details)
+
+    def close(self):
+        self.writer.close()
+
+#Parquet нельзя дописать, поэтому файл перезаписывается при каждом запуске
+class ParquetSink(_ArrowSink):
+    name = "parquet"
+
+    def _open(self):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(self.path, self.schema, compression="zstd")
+
+class ArrowSink(_ArrowSink):
+    name = "arrow"
+
+    def _open(self):
+        return self.pa.ipc.new_stream(self.path, self.schema)
+
+#несколько приемников сразу (например, БД и parquet)
+class MultiSink(Sink):
+    def __init__(self, sinks: List[Sink]):
+        super().__init__()
+        self.sinks = sinks
+
+    #обход считает сохраненными вакансии первого приемника
+    def write(self, sess: Session, details: List[VacancyDetail])->int:
+        written = [s.write(sess, details) for s in self.sinks]
+        self.rows += written[0]
+        return written[0]
+
+    def close(self):
+        for s in self.sinks:
+            s.close()
+
+    def report(self):
+        if len(self.sinks) > 1 or self.sinks[0].name != "db":
+            print("Приемники: " + ", ".join(
+                f"{s.name} {s.rows}" + (f" ({s.path})" if hasattr(s, "path") else "") for s in self.sinks))
+
+#разбирает --sink: список через запятую, у файловых приемников путь после двоеточия
+def parse_sink_spec(spec: str)->List[tuple[str, Optional[str]]]:
+    out = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        kind, _, path = part.partition(":")
+        if kind not in SINK_KINDS:
+            raise ValueError(f"Неизвестный приемник: {kind} (доступны: {', '.join(SINK_KINDS)})")
+        if kind != "db" and not path:
+            raise ValueError(f"Для приемника {kind} нужен путь: {kind}:ФАЙЛ")
+        out.append((kind, path or None))
+    if not out:
+        raise ValueError("Не указан ни один приемник")
+    return out
+
+def open_sinks(spec: str, cache: Optional[DimensionCache] = None)->MultiSink:
+    sinks: List[Sink] = []
+    for kind, path in parse_sink_spec(spec):
+        if kind == "db":
+            sinks.append(DbSink(cache))
+        elif kind == "ndjson":
+            sinks.append(NdjsonSink(path))
+        elif kind == "parquet":
+            sinks.append(ParquetSink(path))
+        else:
+            sinks.append(ArrowSink(path))
+    return MultiSink(sinks)
@@ -1,9 +1,14 @@
 from __future__ import annotations
-from sqlalchemy import select
+from typing import Iterable, List, Optional
+from sqlalchemy import select, insert, delete
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects import sqlite, postgresql
 
-from .models import Employer, Area, Skill, Vacancy, VacancySkill
+from .models import Employer, Area, Skill, Vacancy, VacancySkill, VacancyQuery
 from .schemas import VacancyDetail
+from .dimcache import DimensionCache
+from .ids import area_id, employer_key
+from . import metrics
 
 #=============================================================================================
 #Операции записи в БД
@@ -12,8 +17,16 @@ from .schemas import VacancyDetail
 #если нет - создают новый и возвращают его
 #=============================================================================================
 
+#если имя есть в кэше справочников - достаем строку по первичному ключу (в пределах сессии это identity map, без запроса)
+def _cached_get(sess: Session, model, kind, name):
+    id_ = kind.get(name)
+    return sess.get(model, id_) if id_ is not None else None
+
 #сохраняет навыки в базу
-def upsert_skill(sess: Session, name: str)->Skill:
+def upsert_skill(sess: Session, name: str, cache: Optional[DimensionCache] = None)->Skill:
+    s = _cached_get(sess, Skill, cache.skills, name) if cache else None
+    if s:
+        return s
     #строим sql-запрос, который проверяет есть ли навык
     s = sess.execute(select(Skill).where(Skill.name == name)).scalar_one_or_none()
 
@@ -22,54 +35,69 @@ def upsert_skill(sess: Session, name: str)->Skill:
     s = Skill(name=name) #иначе создаем новый объект
     sess.add(s) #добавляем в текущую транзакцию
     sess.flush() #по факту выполняет SQL INSERT, чтобы получить id из БД
+    if cache:
+        cache.remember(cache.skills, {name: s.id})
 
     return s
 
-#сохраняет работодателя в базу
-def upsert_employer(sess: Session, name: str | None):
+#сохраняет работодателя в базу. hh_id - id работодателя на hh из ссылки, если он известен
+def upsert_employer(sess: Session, name: str | None, cache: Optional[DimensionCache] = None, hh_id: str | None = None):
     if not name: #проверяем передано ли имя
         return None
-    e = sess.get(Employer, name) #пытаемся найти работодателя в базе
+    key = employer_key(name, hh_id) #id на hh или хэш названия (см. ids.py)
+    e = _cached_get(sess, Employer, cache.employers, key) if cache else None #у работодателя ключ кэша - сам id
     if e:
         return e
-    e = Employer(id=name, name=name) #если не нашли создаем нового
-    sess.add(e) #добавляем новый объект в сессию, но не коммитим (коммит будет позже при sess.commit())
+    e = sess.get(Employer, key) #пытаемся найти работодателя в базе (поиск идет по первичному ключу)
+    if not e:
+        e = Employer(id=key, name=name) #если не нашли создаем нового
+        sess.add(e) #добавляем новый объект в сессию, но не коммитим (коммит будет позже при sess.commit())
+    if cache:
+        cache.remember(cache.employers, {key: key})
 
     return e
 
 #сохраняет город/регион в базу
-def upsert_area(sess: Session, name: str | None):
+def upsert_area(sess: Session, name: str | None, cache: Optional[DimensionCache] = None, hh_id: int | None = None):
     if not name:
         return None
-    a = sess.execute(select(Area).where(Area.name == name)).scalar_one_or_none()
+    a = _cached_get(sess, Area, cache.areas, name) if cache else None
     if a:
         return a
-    #если не нашли создаем новый объект
-    #тут используется конструкция для генерации уникального числового id на основе хэша имени
-    a = Area(id=abs(hash(name)) % (10**9), name=name) 
-    sess.add(a)
+    a = sess.execute(select(Area).where(Area.name == name)).scalar_one_or_none() #поиск по уникальному индексу
+    if not a:
+        #если не нашли создаем новый объект (id с hh или устойчивый хэш; при совпадении хэша с чужим id - следующий)
+        probe = 0
+        while sess.get(Area, area_id(name, hh_id, probe)) is not None:
+            probe += 1
+        a = Area(id=area_id(name, hh_id, probe), name=name) 
+        sess.add(a)
+    if cache:
+        cache.remember(cache.areas, {name: a.id})
 
     return a
 
 #сохраняет запись вакансии и связанные сущности (работодатель, регион, навыки) в базу 
-def upsert_vacancy(sess: Session, d: VacancyDetail):
+@metrics.timed("upsert_row")
+def upsert_vacancy(sess: Session, d: VacancyDetail, cache: Optional[DimensionCache] = None):
+    metrics.get().inc("rows_written", 1, "upsert_row")
     #делаем upsert зависимостей (эти объекты потом прикрепятся к вакансии)
-    e = upsert_employer(sess, d.employer_name)
-    a = upsert_area(sess, d.area_name)
+    e = upsert_employer(sess, d.employer_name, cache, d.employer_id)
+    a = upsert_area(sess, d.area_name, cache, d.area_id)
     #поиск существующей вакансии по уникальному id
     v = sess.execute(select(Vacancy).where(Vacancy.vacancy_id == d.vacancy_id)).scalar_one_or_none()
 
     if v: #если нашли, то обновляем все простые поля и FK-ссылки
-        v.name, v.published_at, v.salary_from, v.salary_to, v.salary_currency = (
-            d.name, d.published_at, d.salary_from, d.salary_to, d.salary_currency
+        v.name, v.published_at, v.salary_from, v.salary_to, v.salary_currency, v.salary_gross = (
+            d.name, d.published_at, d.salary_from, d.salary_to, d.salary_currency, d.salary_gross
         )
-        v.schedule, v.employment, v.experience, v.url, v.employer, v.area = (
-            d.schedule, d.employment, d.experience, d.url, e, a
+        v.schedule, v.employment, v.experience, v.url, v.employer, v.area, v.list_fingerprint, v.detail_hash = (
+            d.schedule, d.employment, d.experience, d.url, e, a, d.list_fingerprint, d.detail_hash
         )
         #навыки пересобираем с нуля, благодаря cascade="all, delete-orphan" старые связи удаляются безопасно и создаются актуальные
         v.skills.clear()
         for s in d.skills:
-            v.skills.append(VacancySkill(skill=upsert_skill(sess, s)))
+            v.skills.append(VacancySkill(skill=upsert_skill(sess, s, cache)))
         return v
 
     #если не нашли - создаем новую Vacancy
@@ -80,17 +108,196 @@ def upsert_vacancy(sess: Session, d: VacancyDetail):
         salary_from = d.salary_from,
         salary_to = d.salary_to,
         salary_currency = d.salary_currency,
+        salary_gross = d.salary_gross,
         schedule = d.schedule,
         employment = d.employment,
         experience = d.experience,
         url = d.url,
+        list_fingerprint = d.list_fingerprint,
+        detail_hash = d.detail_hash,
         employer = e,
         area = a
     )
     for s in d.skills:
-        v.skills.append(VacancySkill(skill=upsert_skill(sess, s)))
+        v.skills.append(VacancySkill(skill=upsert_skill(sess, s, cache)))
     sess.add(v) #добавляем новый объект (commit выполнится снаружи)
 
     return v
 
 
+#=============================================================================================
+#Пакетная запись
+#upsert_vacancy делает по несколько запросов на каждую вакансию и каждый навык (~700 обращений к БД на страницу).
+#upsert_vacancies принимает сразу пачку VacancyDetail и обходится несколькими запросами на всю пачку:
+#справочники (работодатели, регионы, навыки) разрешаются через IN (...), недостающие вставляются одним INSERT,
+#вакансии пишутся через INSERT ... ON CONFLICT DO UPDATE (SQLite и PostgreSQL),
+#а связи вакансия-навык обновляются по разнице множеств вместо "удалить все и вставить заново"
+#=============================================================================================
+IN_CHUNK = 500 #сколько значений передаем в один IN (...) (ограничение на число параметров в SQLite)
+ROWS_CHUNK = 50 #сколько строк вставляем одним INSERT
+AREA_PROBES = 8 #сколько следующих кандидатов id пробовать, если хэш названия региона совпал с id другого региона
+
+#поля вакансии, которые обновляются при повторной загрузке
+VACANCY_FIELDS = ("name", "published_at", "salary_from", "salary_to", "salary_currency", "salary_gross",
+                  "schedule", "employment", "experience", "url", "employer_id", "area_id", "list_fingerprint", "detail_hash")
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+#возвращает insert c поддержкой ON CONFLICT для текущей БД (или None, если диалект его не умеет)
+def _dialect_insert(sess: Session, model):
+    name = sess.get_bind().dialect.name
+    if name == "sqlite":
+        return sqlite.insert(model)
+    if name == "postgresql":
+        return postgresql.insert(model)
+    return None
+
+#находит id по натуральному ключу для всех имен сразу: {name: id}
+def _select_ids(sess: Session, key_col, id_col, names: Iterable[str])->dict:
+    found = {}
+    for chunk in _chunks(list(names), IN_CHUNK):
+        for name, id_ in sess.execute(select(key_col, id_col).where(key_col.in_(chunk))):
+            found.setdefault(name, id_)
+    return found
+
+#вставляет недостающие строки справочника; если строку успел вставить кто-то другой - пропускаем (ON CONFLICT DO NOTHING)
+def insert_missing(sess: Session, model, rows: List[dict]):
+    if not rows:
+        return
+    for chunk in _chunks(rows, ROWS_CHUNK):
+        stmt = _dialect_insert(sess, model)
+        if stmt is not None:
+            sess.execute(stmt.values(chunk).on_conflict_do_nothing())
+        else:
+            sess.execute(insert(model), chunk)
+
+#общая схема разрешения справочника: кэш -> IN (...) в БД -> вставка недостающих -> перечитать их id
+def _resolve(sess: Session, names: set, cache: Optional[DimensionCache], kind_name: str,
+             key_col, id_col, model, make_row)->dict:
+    if cache:
+        kind = getattr(cache, kind_name)
+        result, names = cache.lookup(kind, names)
+    else:
+        result = {}
+    if not names:
+        return result
+    found = _select_ids(sess, key_col, id_col, names)
+    missing = names - found.keys()
+    if missing:
+        insert_missing(sess, model, [make_row(n) for n in missing])
+        found.update(_select_ids(sess, key_col, id_col, missing)) #перечитываем реальные id (строку мог вставить и другой процесс)
+    if cache:
+        cache.remember(kind, found)
+    result.update(found)
+    return result
+
+#pairs - (название, id на hh или None). Id работодателя известен заранее (см. ids.py), поэтому запрос к БД нужен
+#только чтобы вставить недостающих. Возвращает {ключ работодателя: id}
+def resolve_employers(sess: Session, pairs: Iterable[tuple], cache: Optional[DimensionCache] = None)->dict:
+    names = {employer_key(n, hh_id): n for n, hh_id in pairs if n}
+    return _resolve(sess, set(names), cache, "employers",
+                    Employer.id, Employer.id, Employer, lambda k: {"id": k, "name": names[k]})
+
+#pairs - (название, id на hh или None). Натуральный ключ региона - название. Возвращает {название: id}
+def resolve_areas(sess: Session, pairs: Iterable[tuple], cache: Optional[DimensionCache] = None)->dict:
+    hh_ids = {}
+    for n, hh_id in pairs:
+        if n and hh_ids.get(n) is None:
+            hh_ids[n] = hh_id
+    result = _resolve(sess, set(hh_ids), cache, "areas",
+                      Area.name, Area.id, Area, lambda n: {"id": area_id(n, hh_ids[n]), "name": n})
+    missing = hh_ids.keys() - result.keys() #вставка не прошла из-за занятого id (названия нет - значит конфликт по id)
+    for probe in range(1, AREA_PROBES + 1):
+        if not missing:
+            break
+        insert_missing(sess, Area, [{"id": area_id(n, probe = probe), "name": n} for n in missing])
+        found = _select_ids(sess, Area.name, Area.id, missing)
+        if cache:
+            cache.remember(cache.areas, found)
+        result.update(found)
+        missing -= found.keys()
+    return result
+
+def resolve_skills(sess: Session, names: Iterable[str], cache: Optional[DimensionCache] = None)->dict:
+    #id навыков выдает БД (autoincrement)
+    return _resolve(sess, set(names), cache, "skills",
+                    Skill.name, Skill.id, Skill, lambda n: {"name": n})
+
+#синхронизирует связи вакансия-навык: удаляем лишние, добавляем недостающие, остальные не трогаем
+def _sync_vacancy_skills(sess: Session, wanted: dict):
+    existing = {}
+    for chunk in _chunks(list(wanted), IN_CHUNK):
+        for link_id, v_id, s_id in sess.execute(
+            select(VacancySkill.id, VacancySkill.vacancy_db_id, VacancySkill.skill_id)
+            .where(VacancySkill.vacancy_db_id.in_(chunk))
+        ):
+            existing[(v_id, s_id)] = link_id
+
+    desired = {(v_id, s_id) for v_id, skill_ids in wanted.items() for s_id in skill_ids}
+    stale = [link_id for pair, link_id in existing.items() if pair not in desired]
+    for chunk in _chunks(stale, IN_CHUNK):
+        sess.execute(delete(VacancySkill).where(VacancySkill.id.in_(chunk)))
+    new_rows = [{"vacancy_db_id": v, "skill_id": s} for v, s in desired - existing.keys()]
+    for chunk in _chunks(new_rows, ROWS_CHUNK):
+        sess.execute(insert(VacancySkill), chunk)
+
+#сохраняет пачку вакансий со всеми связанными сущностями. Возвращает число записанных вакансий
+#cache - кэш справочников на весь обход (см. dimcache.py), без него каждое имя ищется в БД
+@metrics.timed("upsert_batch")
+def upsert_vacancies(sess: Session, details: Iterable[VacancyDetail], cache: Optional[DimensionCache] = None)->int:
+    by_id = {d.vacancy_id: d for d in details} #дубликаты внутри пачки схлопываем (побеждает последний)
+    if not by_id:
+        return 0
+    metrics.get().inc("rows_written", len(by_id), "upsert_batch")
+
+    stmt = _dialect_insert(sess, Vacancy)
+    if stmt is None: #для прочих БД остается построчный путь
+        for d in by_id.values():
+            upsert_vacancy(sess, d, cache)
+        sess.flush()
+        return len(by_id)
+
+    sess.flush() #если в сессии что-то висит от построчных upsert'ов - отправляем это раньше пакетных запросов
+    employers = resolve_employers(sess, ((d.employer_name, d.employer_id) for d in by_id.values()), cache)
+    areas = resolve_areas(sess, ((d.area_name, d.area_id) for d in by_id.values()), cache)
+    skills = resolve_skills(sess, (s for d in by_id.values() for s in d.skills), cache)
+
+    rows = [{
+        "vacancy_id": d.vacancy_id,
+        "name": d.name,
+        "published_at": d.published_at,
+        "salary_from": d.salary_from,
+        "salary_to": d.salary_to,
+        "salary_currency": d.salary_currency,
+        "salary_gross": d.salary_gross,
+        "schedule": d.schedule,
+        "employment": d.employment,
+        "experience": d.experience,
+        "url": d.url,
+        "employer_id": employers.get(employer_key(d.employer_name, d.employer_id)),
+        "area_id": areas.get(d.area_name),
+        "list_fingerprint": d.list_fingerprint,
+        "detail_hash": d.detail_hash,
+    } for d in by_id.values()]
+    for chunk in _chunks(rows, ROWS_CHUNK):
+        ins = _dialect_insert(sess, Vacancy).values(chunk)
+        sess.execute(ins.on_conflict_do_update(
+            index_elements=[Vacancy.vacancy_id],
+            set_={f: ins.excluded[f] for f in VACANCY_FIELDS},
+        ))
+
+    db_ids = _select_ids(sess, Vacancy.vacancy_id, Vacancy.id, by_id.keys()) #vacancy_id hh -> id строки в БД
+    _sync_vacancy_skills(sess, {
+        db_ids[v_id]: {skills[s] for s in d.skills} for v_id, d in by_id.items()
+    })
+    return len(by_id)
+
+#запоминает, какие запросы нашли вакансии: пары (vacancy_id, SearchJob). Уже записанные пары пропускаются.
+#Подзапросы планировщика (--split) записываются под исходным запросом: фильтры - деталь обхода, а не то, что искали
+def record_matches(sess: Session, matches: Iterable)->int:
+    rows = [{"vacancy_id": v_id, "query": text, "area": area}
+            for v_id, text, area in dict.fromkeys((v_id, job.text, job.area or 0) for v_id, job in matches)]
+    insert_missing(sess, VacancyQuery, rows)
+    return len(rows)
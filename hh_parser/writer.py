@@ -0,0 +1,149 @@
+#writer.py
+#запись в БД в отдельном потоке для async-конвейера.
+#Раньше store-воркер вызывал upsert_vacancies и commit прямо в корутине: пока шла запись страницы,
+#event loop стоял, а вместе с ним и все запросы в полете (на удаленном PostgreSQL паузы заметные).
+#Теперь все, что пишет в БД во время обхода (вакансии через приемники, отметки в crawl_items/crawl_state,
+#совпадения запрос-вакансия), уходит в очередь, которую разбирает один поток со своей сессией:
+#- записи копятся в пачку и фиксируются, когда пачка набралась (batch_size) или прошло flush_interval секунд
+#- очередь ограничена: если БД не успевает, put() ждет места, не блокируя event loop, и память не растет
+#- операции выполняются строго в порядке поступления (страница отмечается в хвосте раньше, чем ее вакансии удаляются из него)
+from __future__ import annotations
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from . import checkpoint
+from .config import DEFAULT_FLUSH_INTERVAL
+from .dimcache import DimensionCache
+from .schemas import VacancyBrief, VacancyDetail
+from .sinks import Sink
+
+_STOP = object()
+
+#не скачавшаяся страница: отмечается в crawl_items как failed (или gone)
+@dataclass
+class _Fail:
+    brief: VacancyBrief
+    error: BaseException
+
+#операция с сессией записи: fn(sess, *args)
+@dataclass
+class _Call:
+    fn: Callable
+    args: tuple
+
+#точка синхронизации: поток фиксирует все, что было до нее, и отдает число сохраненных вакансий
+@dataclass
+class _Barrier:
+    done: Future
+
+class DbWriter:
+    def __init__(self, engine, sink: Sink, cache: Optional[DimensionCache] = None, batch_size: int = 50,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, maxsize: Optional[int] = None):
+        self.engine = engine
+        self.sink = sink
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.q: queue.Queue = queue.Queue(maxsize = maxsize or self.batch_size * 4)
+        self.saved = 0 #сколько вакансий записано за все время
+        self.commits = 0
+        self.error: Optional[BaseException] = None #ошибка потока записи (пробрасывается в конвейер)
+        self.thread = threading.Thread(target = self._run, name = "db-writer", daemon = True)
+        self.thread.start()
+
+    #------------------------------ сторона event loop ------------------------------
+    async def _put(self, item):
+        if self.error is not None:
+            raise self.error
+        try:
+            self.q.put_nowait(item)
+        except queue.Full: #БД отстает - ждем места в очереди в отдельном потоке, event loop продолжает работать
+            await asyncio.to_thread(self.q.put, item)
+
+    async def write(self, det: VacancyDetail):
+        await self._put(det)
+
+    async def fail(self, brief: VacancyBrief, error: BaseException):
+        await self._put(_Fail(brief, error))
+
+    #произвольная операция с сессией записи (отметки checkpoint, record_matches): выполнится как fn(sess, *args).
+    #Аргументы передаются явно, а не замыканием, потому что выполняется она позже и в другом потоке
+    async def call(self, fn: Callable, *args):
+        await self._put(_Call(fn, args))
+
+    #дожидается, пока все поставленное раньше будет зафиксировано. Возвращает число сохраненных вакансий
+    async def sync(self)->int:
+        fut: Future = Future()
+        await self._put(_Barrier(fut))
+        return await asyncio.wrap_future(fut)
+
+    #фиксирует остаток и останавливает поток. Ошибку записи не бросает - ее получает sync() или put()
+    async def close(self):
+        if self.thread.is_alive():
+            await asyncio.to_thread(self.q.put, _STOP)
+            await asyncio.to_thread(self.thread.join)
+
+    #------------------------------ поток записи ------------------------------
+    def _run(self):
+        batch: List[VacancyDetail] = []
+        failed: List[_Fail] = []
+        dirty = False #есть незафиксированные операции
+        deadline = None
+        item = None
+        try:
+            with Session(self.engine) as sess:
+                if self.cache is not None:
+                    self.cache.attach(sess) #кэш справочников дальше используется только из этого потока
+                while True:
+                    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    try:
+                        item = self.q.get(timeout = timeout)
+                    except queue.Empty: #прошло flush_interval - фиксируем то, что есть
+                        item = None
+                    if item is _STOP:
+                        self._flush(sess, batch, failed)
+                        return
+                    if isinstance(item, VacancyDetail):
+                        batch.append(item)
+                    elif isinstance(item, _Fail):
+                        failed.append(item)
+                    elif isinstance(item, _Call):
+                        item.fn(sess, *item.args)
+                    if item is not None and not isinstance(item, _Barrier):
+                        dirty = True
+                        if deadline is None:
+                            deadline = time.monotonic() + self.flush_interval
+                    if len(batch) >= self.batch_size or item is None or isinstance(item, _Barrier):
+                        if dirty:
+                            self._flush(sess, batch, failed)
+                            batch, failed, dirty, deadline = [], [], False, None
+                        if isinstance(item, _Barrier):
+                            item.done.set_result(self.saved)
+        except BaseException as e:
+            self.error = e
+            if isinstance(item, _Barrier) and not item.done.done():
+                item.done.set_exception(e)
+            if item is not _STOP:
+                self._drain(e)
+
+    def _flush(self, sess: Session, batch: List[VacancyDetail], failed: List[_Fail]):
+        self.saved += self.sink.write(sess, batch) #сохраняем пачку (в БД - включая работодателей, регионы, навыки)
+        checkpoint.mark_done(sess, [d.vacancy_id for d in batch])
+        for f in failed:
+            checkpoint.mark_failed(sess, f.brief, f.error)
+        sess.commit()
+        self.commits += 1
+
+    #после ошибки поток больше не пишет, но разбирает очередь до конца: ждущим sync() отдаем ошибку,
+    #а put() не зависает на полной очереди
+    def _drain(self, e: BaseException):
+        while (item := self.q.get()) is not _STOP:
+            if isinstance(item, _Barrier):
+                item.done.set_exception(e)
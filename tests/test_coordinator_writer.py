@@ -0,0 +1,69 @@
+#test_coordinator_writer.py
+#воркер распределенного обхода пересоздает упавший поток записи в БД: одна временная ошибка ("database is locked")
+#не должна прогонять всю очередь единиц до failed. Сеть не нужна: вместо обхода страниц единица только пишет через DbWriter
+import asyncio
+import sqlite3
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from hh_parser import coordinator
+from hh_parser.jobs import SearchJob
+from hh_parser.models import WorkUnit
+from hh_parser.writer import DbWriter
+
+def _noop(sess):
+    pass
+
+@pytest.fixture
+def queue_db(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path / 'queue.db'}"
+    engine = coordinator.make_engine(db_url)
+    coordinator.init_db(engine)
+    coordinator.plan(engine, [SearchJob("python", 1)], pages = 3, unit_pages = 1)
+    calls = []
+
+    #единица без сети: операция через поток записи и ожидание ее фиксации
+    async def run_unit(c, unit, per_page, concurrency, prefetch):
+        calls.append(unit.id)
+        await c.writer.call(_noop)
+        await c.writer.sync()
+        return 0, False
+
+    monkeypatch.setattr(coordinator, "_run_unit", run_unit)
+    return db_url, engine, calls
+
+def _fail_flush(monkeypatch, times: int):
+    flush = DbWriter._flush
+    left = [times]
+
+    def failing(self, sess, batch, failed):
+        if left[0] > 0:
+            left[0] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return flush(self, sess, batch, failed)
+
+    monkeypatch.setattr(DbWriter, "_flush", failing)
+
+def _units(engine)->list:
+    with Session(engine) as sess:
+        return sess.execute(select(WorkUnit.id, WorkUnit.status, WorkUnit.attempts).order_by(WorkUnit.id)).all()
+
+def _work(db_url, tmp_path):
+    return asyncio.run(coordinator.work_async(db_url, owner = "test", cache_name = str(tmp_path / "cache")))
+
+def test_writer_restarts_after_transient_error(queue_db, tmp_path, monkeypatch):
+    db_url, engine, calls = queue_db
+    _fail_flush(monkeypatch, 1)
+    _work(db_url, tmp_path)
+    assert calls == [1, 1, 2, 3] #упавшая единица повторена с новым потоком записи, остальные прошли с первого раза
+    assert [(s, a) for _, s, a in _units(engine)] == [("done", 2), ("done", 1), ("done", 1)]
+
+def test_worker_stops_when_writes_keep_failing(queue_db, tmp_path, monkeypatch):
+    db_url, engine, calls = queue_db
+    _fail_flush(monkeypatch, 100)
+    with pytest.raises(sqlite3.OperationalError):
+        _work(db_url, tmp_path)
+    assert len(calls) == coordinator.WRITER_RESTARTS + 1
+    assert _units(engine)[-1][1:] == ("pending", 0) #до последней единицы воркер не дошел
@@ -0,0 +1,26 @@
+#test_http_cache.py
+#sync- и async-сессия по умолчанию открывают один и тот же файл http-кэша (config.DEFAULT_CACHE_NAME):
+#страница, сохраненная одной, - попадание для другой
+import asyncio
+
+from hh_parser.async_http import get_http_session_async
+from hh_parser.config import DEFAULT_CACHE_NAME
+from hh_parser.http import get_http_session
+from hh_parser.httpcache import cache_path
+
+URL = "http://stand.local/vacancy/1"
+
+def test_sessions_share_default_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    sync = get_http_session()
+    sync.cache.put(URL, None, 200, {"Content-Type": "text/html; charset=utf-8"}, "<html>ок</html>".encode("utf-8"))
+
+    async def read():
+        async with await get_http_session_async() as http:
+            resp = await http.get(URL)
+            return http.cache.path, resp.from_cache, await resp.text()
+
+    path, from_cache, text = asyncio.run(read())
+    sync.close()
+    assert path == sync.cache.path == cache_path(DEFAULT_CACHE_NAME)
+    assert from_cache and text == "<html>ок</html>"
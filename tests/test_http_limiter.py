@@ -0,0 +1,90 @@
+#test_http_limiter.py
+#токен лимитера берется до отправки запроса (и перед каждым повтором), а не после ответа;
+#ответ из кэша токен не тратит. Сеть не нужна: транспорт подменен заглушкой, которая пишет события в общий журнал
+import asyncio
+
+import requests
+from requests.adapters import BaseAdapter
+from tenacity import wait_none
+
+from hh_parser.async_http import CachedAsyncSession, _BufferedResponse, http_get_async
+from hh_parser.http import CachedHttpSession, http_get
+from hh_parser.httpcache import HttpCache
+from hh_parser.ratelimit import AdaptiveRateLimiter, CircuitBreaker
+
+URL = "http://stand.local/vacancy/1"
+
+#лимитер, который вместо ожидания пишет в журнал
+class RecordingLimiter(AdaptiveRateLimiter):
+    def __init__(self, log: list):
+        super().__init__(rate=1000, verbose=False, breaker=CircuitBreaker(threshold=0))
+        self.log = log
+
+    def acquire(self):
+        self.log.append("acquire")
+
+    async def acquire_async(self):
+        self.log.append("acquire")
+
+    def on_response(self, status, retry_after=None):
+        self.log.append(f"response {status}")
+
+#транспорт requests: отдает статусы по очереди и пишет "send"
+class ScriptedAdapter(BaseAdapter):
+    def __init__(self, log: list, statuses: list):
+        super().__init__()
+        self.log, self.statuses = log, statuses
+
+    def send(self, request, **kwargs):
+        self.log.append("send")
+        r = requests.Response()
+        r.status_code = self.statuses.pop(0)
+        r.url = request.url
+        r._content = b"<html></html>"
+        r.request = request
+        return r
+
+    def close(self):
+        pass
+
+#то же для async: внутренняя сессия CachedAsyncSession
+class ScriptedAsyncSession:
+    def __init__(self, log: list, statuses: list):
+        self.log, self.statuses = log, statuses
+
+    async def get(self, url, params=None, headers=None):
+        self.log.append("send")
+        return _BufferedResponse(url, self.statuses.pop(0), {}, b"<html></html>", False)
+
+    async def close(self):
+        pass
+
+def test_sync_acquires_before_each_send(tmp_path):
+    log = []
+    session = CachedHttpSession(HttpCache(str(tmp_path / "cache"), 3600))
+    session.mount("http://", ScriptedAdapter(log, [503, 200]))
+    limiter = RecordingLimiter(log)
+    get = http_get.retry_with(wait=wait_none())
+    get(session, URL, limiter=limiter)
+    assert log == ["acquire", "send", "response 503", "acquire", "send", "response 200"]
+    log.clear()
+    assert get(session, URL, limiter=limiter).from_cache
+    assert log == [] #ответ из кэша токен не тратит
+    session.close()
+
+def test_async_acquires_before_each_send(tmp_path, monkeypatch):
+    log = []
+    monkeypatch.setattr("hh_parser.async_http.wait_exponential_jitter", lambda **kw: wait_none())
+    limiter = RecordingLimiter(log)
+
+    async def run():
+        session = CachedAsyncSession(ScriptedAsyncSession(log, [503, 200]), HttpCache(str(tmp_path / "cache"), 3600))
+        await http_get_async(session, URL, limiter=limiter)
+        first = list(log)
+        log.clear()
+        await http_get_async(session, URL, limiter=limiter)
+        await session.close()
+        return first
+
+    assert asyncio.run(run()) == ["acquire", "send", "response 503", "acquire", "send", "response 200"]
+    assert log == []
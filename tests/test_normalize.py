@@ -0,0 +1,76 @@
+#test_normalize.py
+#разбор з/п и даты публикации на фикстурах bench/normalize_cases.json (их же сверяет bench --only normalize).
+#Строки, разбор которых был исправлен при переписывании нормализаторов (помечены "fixed"), перечислены здесь явно:
+#если кто-то поправит фикстуру или вернет прежнее поведение, тест упадет
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from hh_parser.parsing import _date_parts, normalize_salary, parse_published_at, parse_salary
+
+CASES = json.loads((Path(__file__).resolve().parent.parent / "bench" / "normalize_cases.json").read_text(encoding="utf-8"))
+
+#исправленные строки з/п: (от, до, валюта, до вычета налогов)
+FIXED_SALARY = {
+    "от 100 000 до 150 000 руб. до вычета налогов": (100000, 150000, "RUR", True),
+    "от 100\u202f000 до 150\u202f000 ₽ на руки": (100000, 150000, "RUR", False), #узкий неразрывный пробел в разрядах
+    "от 100 000 ₽ до вычета налогов": (100000, None, "RUR", True),
+    "150 000 ₽ до вычета налогов": (150000, 150000, "RUR", True),
+    "до 3 000 $": (None, 3000, "USD", None),
+    "от 2 500 до 4 000 USD gross": (2500, 4000, "USD", True),
+    "от 2 000 € на руки": (2000, None, "EUR", False),
+    "от 400 000 ₸ на руки": (400000, None, "KZT", False),
+    "до 900 000 тенге": (None, 900000, "KZT", None),
+    "от 30 000 грн.": (30000, None, "UAH", None),
+    "з/п не указана": (None, None, None, None),
+}
+#исправленные даты: разобранные части (дней назад, год, месяц, день) и что вернет parse_published_at
+FIXED_DATES = {
+    "12 марта": ((None, None, 3, 12), "--03-12"),
+    "7\xa0октября": ((None, None, 10, 7), "--10-07"), #&nbsp; между днем и месяцем
+    "30 февраля 2024 ": ((None, 2024, 2, 30), "now"), #несуществующая дата - текущий момент
+}
+
+#ожидаемая дата из фикстуры: today/yesterday/now, YYYY-MM-DD или --MM-DD (текущий год)
+def _assert_date(got: datetime, expect: str):
+    now = datetime.now(timezone.utc)
+    if expect in ("today", "now", "yesterday"):
+        target = now - timedelta(days=1) if expect == "yesterday" else now
+        assert abs((target - got).total_seconds()) < 60
+        return
+    if expect.startswith("--"):
+        expect = f"{now.year}{expect[1:]}"
+    assert got.tzinfo is not None
+    assert got.date().isoformat() == expect
+
+@pytest.mark.parametrize("case", CASES["salary"], ids=lambda c: c["text"] or "<empty>")
+def test_salary_cases(case):
+    expect = tuple(case["expect"])
+    assert (tuple(normalize_salary(case["text"])) if case["text"] else (None,) * 4) == expect
+    assert parse_salary(case["text"]) == (expect[:3] if case["text"] else (None, None, None))
+
+@pytest.mark.parametrize("case", CASES["published"], ids=lambda c: c["text"] or "<empty>")
+def test_published_cases(case):
+    _assert_date(parse_published_at(case["text"]), case["expect"])
+
+def test_fixed_cases_are_explicit():
+    assert {c["text"] for c in CASES["salary"] if "fixed" in c} == set(FIXED_SALARY)
+    assert {c["text"] for c in CASES["published"] if "fixed" in c} == set(FIXED_DATES)
+
+@pytest.mark.parametrize("text", FIXED_SALARY)
+def test_fixed_salary(text):
+    assert normalize_salary(text) == FIXED_SALARY[text]
+
+@pytest.mark.parametrize("text", FIXED_DATES)
+def test_fixed_dates(text):
+    parts, expect = FIXED_DATES[text]
+    assert _date_parts(text) == parts
+    _assert_date(parse_published_at(text), expect)
+
+def test_date_parts():
+    assert _date_parts("Сегодня") == (0, None, None, None)
+    assert _date_parts("вчера") == (1, None, None, None)
+    assert _date_parts("Вакансия опубликована 12 марта 2024 в Москве") == (None, 2024, 3, 12)
+    assert _date_parts("недавно") is None
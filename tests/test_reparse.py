@@ -0,0 +1,47 @@
+#test_reparse.py
+#пересборка из архива: страницы, которые не разобрались, попадают в отчет с адресом и ошибкой, а не только в счетчик
+from pathlib import Path
+
+import pytest
+
+from hh_parser import reparse
+from hh_parser.archive import HtmlArchive
+from hh_parser.parsing import parse_list_page
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+@pytest.fixture
+def archive_path(tmp_path)->str:
+    path = str(tmp_path / "archive.sqlite")
+    briefs = {b.vacancy_id: b for b in parse_list_page((FIXTURES / "list_python_moscow.html").read_text(encoding="utf-8"))}
+    arch = HtmlArchive(path, codec="gzip")
+    for v_id in (98765432, 97000111, 96555000):
+        arch.put_detail(briefs[v_id], (FIXTURES / f"vacancy_{v_id}.html").read_text(encoding="utf-8"))
+    arch.close()
+    return path
+
+def test_reparse_writes_vacancies(archive_path, tmp_path, capsys):
+    assert reparse.reparse(archive_path, f"sqlite:///{tmp_path / 'out.db'}", workers = 0) == 3
+    assert "Не удалось разобрать" not in capsys.readouterr().out
+
+def test_reparse_reports_failed_pages(archive_path, tmp_path, capsys, monkeypatch):
+    parse = reparse.parse_vacancy_detail
+
+    def flaky(html, url, brief, backend):
+        if brief.vacancy_id == 97000111:
+            raise KeyError("vacancy-title")
+        return parse(html, url, brief, backend)
+
+    monkeypatch.setattr(reparse, "parse_vacancy_detail", flaky)
+    assert reparse.reparse(archive_path, f"sqlite:///{tmp_path / 'out.db'}", workers = 0) == 2
+    out = capsys.readouterr().out
+    assert "Не удалось разобрать: 1:" in out
+    assert "https://hh.ru/vacancy/97000111 (страница " in out and "KeyError('vacancy-title')" in out
+
+def test_reparse_report_is_capped(archive_path, tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(reparse, "REPORT_ERRORS", 2)
+    #неизвестный движок - все страницы не разбираются, в отчете только первые REPORT_ERRORS
+    assert reparse.reparse(archive_path, f"sqlite:///{tmp_path / 'out.db'}", workers = 0, parser_backend = "nope") == 0
+    out = capsys.readouterr().out
+    assert "Не удалось разобрать: 3, первые 2:" in out
+    assert out.count("Неизвестный движок парсинга") == 2
@@ -0,0 +1,57 @@
+#test_resume_ids.py
+#карточка, восстановленная из crawl_items (--resume, повторы) или из архива (reparse), дает те же id работодателя и
+#региона, что и карточка прямо со страницы списка. На vacancy_96555000.html ссылок на работодателя и регион нет,
+#id с hh есть только в карточке
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from hh_parser import checkpoint
+from hh_parser.archive import HtmlArchive
+from hh_parser.ids import area_id, employer_key
+from hh_parser.jobs import SearchJob
+from hh_parser.models import init_db
+from hh_parser.parsing import parse_list_page, parse_vacancy_detail
+
+FIXTURES = Path(__file__).parent / "fixtures"
+VACANCY_ID = 96555000
+URL = f"https://hh.ru/vacancy/{VACANCY_ID}"
+
+def _fresh():
+    briefs = parse_list_page((FIXTURES / "list_python_moscow.html").read_text(encoding="utf-8"))
+    return briefs, next(b for b in briefs if b.vacancy_id == VACANCY_ID)
+
+def _detail(brief):
+    d = parse_vacancy_detail((FIXTURES / f"vacancy_{VACANCY_ID}.html").read_text(encoding="utf-8"), URL, brief)
+    return employer_key(d.employer_name, d.employer_id), area_id(d.area_name, d.area_id)
+
+def test_fresh_crawl_uses_card_ids():
+    _, brief = _fresh()
+    assert (brief.employer_id, brief.area_id) == ("9498120", 1)
+    assert _detail(brief) == ("9498120", 1)
+
+def test_resumed_crawl_keeps_card_ids():
+    briefs, brief = _fresh()
+    engine = create_engine("sqlite://")
+    init_db(engine)
+    job = SearchJob("python", 1)
+    with Session(engine) as sess:
+        checkpoint.mark_page(sess, job, 0, briefs)
+        sess.commit()
+    with Session(engine) as sess: #новый запуск с --resume
+        restored = {br.vacancy_id: br for br, _ in checkpoint.load_items(sess, [job])}
+    assert restored[VACANCY_ID] == brief
+    assert _detail(restored[VACANCY_ID]) == _detail(brief)
+
+def test_reparse_keeps_card_ids(tmp_path):
+    _, brief = _fresh()
+    arch = HtmlArchive(str(tmp_path / "archive.sqlite"), codec="gzip")
+    arch.put_detail(brief, (FIXTURES / f"vacancy_{VACANCY_ID}.html").read_text(encoding="utf-8"))
+    arch.close()
+    arch = HtmlArchive(str(tmp_path / "archive.sqlite"), readonly=True)
+    (_, url, restored), = arch.latest_details()
+    arch.conn.close()
+    assert url == URL
+    assert restored == brief
+    assert _detail(restored) == _detail(brief)
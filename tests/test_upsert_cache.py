@@ -0,0 +1,55 @@
+#test_upsert_cache.py
+#построчная запись (upsert_employer/upsert_area) пользуется кэшем справочников так же, как пакетная (_resolve):
+#после commit повторное имя находится в кэше, а id совпадают с теми, что выдает пакетный путь
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from hh_parser.dimcache import DimensionCache
+from hh_parser.models import init_db
+from hh_parser.upsert import resolve_areas, resolve_employers, upsert_area, upsert_employer
+
+def _session()->Session:
+    engine = create_engine("sqlite://")
+    init_db(engine)
+    return Session(engine)
+
+def test_row_upsert_fills_cache():
+    sess = _session()
+    cache = DimensionCache().attach(sess)
+    e = upsert_employer(sess, "Яндекс", cache, "1740")
+    a = upsert_area(sess, "Москва", cache, 1)
+    upsert_area(sess, "Казань", cache) #регион без id на hh - хэш названия
+    sess.commit()
+    assert cache.employers.get("1740") == e.id == "1740"
+    assert cache.areas.get("Москва") == a.id == 1
+    assert cache.areas.get("Казань") is not None
+
+    #уже существующие строки (найденные select'ом, а не вставленные) тоже попадают в кэш
+    other = DimensionCache().attach(sess)
+    upsert_employer(sess, "Яндекс", other, "1740")
+    upsert_area(sess, "Москва", other)
+    sess.commit()
+    assert other.employers.get("1740") == "1740"
+    assert other.areas.get("Москва") == 1
+
+def test_row_upsert_hits_cache():
+    sess = _session()
+    cache = DimensionCache().attach(sess)
+    upsert_employer(sess, "Ромашка", cache)
+    upsert_area(sess, "Москва", cache, 1)
+    sess.commit()
+    misses = (cache.employers.misses, cache.areas.misses)
+    e = upsert_employer(sess, "Ромашка", cache)
+    a = upsert_area(sess, "Москва", cache)
+    assert (cache.employers.misses, cache.areas.misses) == misses
+    assert (cache.employers.hits, cache.areas.hits) == (1, 1)
+    #те же ключи, что у пакетного пути
+    assert resolve_employers(sess, [("Ромашка", None)]) == {e.id: e.id}
+    assert resolve_areas(sess, [("Москва", None)]) == {"Москва": a.id}
+
+def test_row_upsert_rollback_drops_pending():
+    sess = _session()
+    cache = DimensionCache().attach(sess)
+    upsert_area(sess, "Москва", cache, 1)
+    sess.rollback()
+    assert cache.areas.get("Москва") is None